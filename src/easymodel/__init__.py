@@ -1,12 +1,36 @@
 from __future__ import absolute_import
 
 from .treemodel import *
+from .journal import *
 from .cascade import *
 from .widgetdelegate import *
+from .loader import *
+from .asyncdata import *
+from .prefetch import *
+from .processing import *
+from .sqlmodel import *
+from .filesystem import *
+from .streammodel import *
+from .flatmodel import *
+from .subtreemodel import *
+from .snapshot import *
+from .remote import *
 
 __all__ = [treemodel.__all__ +
+           journal.__all__ +
            cascade.__all__ +
-           widgetdelegate.__all__]
+           widgetdelegate.__all__ +
+           loader.__all__ +
+           asyncdata.__all__ +
+           prefetch.__all__ +
+           processing.__all__ +
+           sqlmodel.__all__ +
+           filesystem.__all__ +
+           streammodel.__all__ +
+           flatmodel.__all__ +
+           subtreemodel.__all__ +
+           snapshot.__all__ +
+           remote.__all__]
 
 __author__ = 'David Zuber'
 __email__ = 'zuber.david@gmx.de'
@@ -0,0 +1,420 @@
+"""This module provides item data that computes expensive values in background threads.
+
+Subclass :class:`AsyncItemData` and implement :meth:`AsyncItemData.compute`
+and :meth:`ItemData.column_count`. When a view asks for a value the first time,
+the item data returns a placeholder and queues the computation in a
+:class:`QtCore.QThreadPool`. The result is cached on the item data.
+Finished computations are collected by an :class:`AsyncDataDispatcher` and
+delivered to the models in batches, so the views receive only a few coalesced
+:data:`QtCore.QAbstractItemModel.dataChanged` signals::
+
+  class FileItemData(easymodel.AsyncItemData):
+      def __init__(self, path):
+          super(FileItemData, self).__init__()
+          self.path = path
+
+      def column_count(self):
+          return 2
+
+      def is_async(self, column, role):
+          return column == 1 and role == QtCore.Qt.DisplayRole
+
+      def sync_data(self, column, role):
+          if column == 0 and role == QtCore.Qt.DisplayRole:
+              return self.path
+
+      def compute(self, column, role):
+          return md5sum(self.path)
+
+      def placeholder(self, column, role):
+          return 'computing...'
+
+"""
+import abc
+import logging
+import threading
+
+from PySide import QtCore
+
+from easymodel.treemodel import ItemData
+
+__all__ = ['AsyncDataDispatcher', 'AsyncItemData']
+
+log = logging.getLogger(__name__)
+
+
+class AsyncDataDispatcher(QtCore.QObject):
+    """Runs the computations of :class:`AsyncItemData` in a thread pool
+    and delivers the results in batches in the GUI thread.
+
+    Results that finish within the batch interval are stored on their item data
+    and emitted with :meth:`TreeModel.items_data_changed`.
+    """
+
+    _instance = None
+    _finished = QtCore.Signal()
+
+    def __init__(self, parent=None, pool=None, interval=50):
+        """Initialize a new dispatcher
+
+        :param parent: the parent object
+        :type parent: :class:`QtCore.QObject`
+        :param pool: the thread pool to use. If None use the global instance.
+        :type pool: :class:`QtCore.QThreadPool` | None
+        :param interval: the time in milliseconds to collect results before they are delivered
+        :type interval: :class:`int`
+        :raises: None
+        """
+        super(AsyncDataDispatcher, self).__init__(parent)
+        self._pool = pool or QtCore.QThreadPool.globalInstance()
+        self._lock = threading.Lock()
+        self._results = []
+        self._runnables = set()
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(interval)
+        self._timer.timeout.connect(self.deliver)
+        self._finished.connect(self._schedule, QtCore.Qt.QueuedConnection)
+
+    @classmethod
+    def instance(cls, ):
+        """Return the default dispatcher
+
+        It is created on the first call, so call it in the GUI thread.
+
+        :returns: the default dispatcher
+        :rtype: :class:`AsyncDataDispatcher`
+        :raises: None
+        """
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def submit(self, itemdata, column, role):
+        """Compute the value of the item data for the given column and role in the thread pool
+
+        :param itemdata: the item data
+        :type itemdata: :class:`AsyncItemData`
+        :param column: the data column
+        :type column: int
+        :param role: the data role
+        :type role: QtCore.Qt.ItemDataRole
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        runnable = _ComputeRunnable(self, itemdata, column, role)
+        runnable.setAutoDelete(False)
+        self._runnables.add(runnable)
+        self._pool.start(runnable)
+
+    def _add_result(self, runnable, value):
+        """Store the result of the runnable. Called in the worker thread.
+
+        :param runnable: the finished runnable
+        :type runnable: :class:`_ComputeRunnable`
+        :param value: the computed value
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        with self._lock:
+            self._results.append((runnable, value))
+            first = len(self._results) == 1
+        if first:
+            self._finished.emit()
+
+    def _schedule(self, ):
+        """Start the timer for delivering the results
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def deliver(self, ):
+        """Store all finished results on their item data and notify the models
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._timer.stop()
+        with self._lock:
+            results = self._results
+            self._results = []
+        changes = {}
+        for runnable, value in results:
+            self._runnables.discard(runnable)
+            itemdata = runnable.itemdata
+            if runnable.failed:
+                itemdata._discard_pending(runnable.column, runnable.role, runnable.generation)
+                continue
+            if not itemdata._set_result(runnable.column, runnable.role, value, runnable.generation):
+                continue
+            item = itemdata.treeitem()
+            for model in (item.get_models() if item is not None else ()):
+                changes.setdefault(model, []).append((item, runnable.column, runnable.column))
+        for model, modelchanges in changes.items():
+            model.items_data_changed(modelchanges)
+
+    def wait(self, msecs=-1):
+        """Wait until all computations in the pool are done
+
+        The results are delivered once the event loop runs again or
+        :meth:`AsyncDataDispatcher.deliver` is called.
+
+        :param msecs: the maximum time to wait or -1 to wait forever
+        :type msecs: :class:`int`
+        :returns: True, if all computations are done
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        return self._pool.waitForDone(msecs)
+
+
+class _ComputeRunnable(QtCore.QRunnable):
+    """Runnable that calls :meth:`AsyncItemData.compute`
+    """
+
+    def __init__(self, dispatcher, itemdata, column, role):
+        """Initialize a new runnable
+
+        :param dispatcher: the dispatcher that receives the result
+        :type dispatcher: :class:`AsyncDataDispatcher`
+        :param itemdata: the item data
+        :type itemdata: :class:`AsyncItemData`
+        :param column: the data column
+        :type column: int
+        :param role: the data role
+        :type role: QtCore.Qt.ItemDataRole
+        :raises: None
+        """
+        super(_ComputeRunnable, self).__init__()
+        self.dispatcher = dispatcher
+        self.itemdata = itemdata
+        self.column = column
+        self.role = role
+        self.generation = itemdata._generation
+        self.failed = False
+
+    def run(self, ):
+        """Compute the value and hand it to the dispatcher
+
+        If the computation raises an exception, it is logged and nothing gets cached,
+        so the value is computed again when it is requested the next time.
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        try:
+            value = self.itemdata.compute(self.column, self.role)
+        except Exception:
+            log.exception("Computing the data of column %s for role %s failed.", self.column, self.role)
+            value = None
+            self.failed = True
+        self.dispatcher._add_result(self, value)
+
+
+class AsyncItemData(ItemData):
+    """Abstract item data that computes expensive values in a thread pool
+
+    Implement :meth:`AsyncItemData.compute` and :meth:`ItemData.column_count`.
+    By default all values for :data:`QtCore.Qt.DisplayRole` are computed asynchronously.
+    Reimplement :meth:`AsyncItemData.is_async` to change that and :meth:`AsyncItemData.sync_data`
+    for the values that are cheap.
+
+    The tree item of the item data has to be in a model, so the views get notified.
+    """
+
+    def __init__(self, dispatcher=None):
+        """Initialize a new async item data
+
+        :param dispatcher: the dispatcher for the computations.
+                           If None use :meth:`AsyncDataDispatcher.instance`.
+        :type dispatcher: :class:`AsyncDataDispatcher` | None
+        :raises: None
+        """
+        super(AsyncItemData, self).__init__()
+        self._dispatcher = dispatcher
+        self._treeitem = None
+        self._cache = {}
+        self._pending = set()
+        self._generation = 0
+
+    def set_treeitem(self, item):
+        """Remember the tree item for notifying its model about finished computations
+
+        :param item: the tree item
+        :type item: :class:`TreeItem`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._treeitem = item
+
+    def copy(self, ):
+        """Return a copy with its own cache
+
+        Computations that are still pending are not copied.
+        The copy computes them again when they are requested.
+
+        :returns: the copy
+        :rtype: :class:`AsyncItemData`
+        :raises: None
+        """
+        data = super(AsyncItemData, self).copy()
+        data._treeitem = None
+        data._cache = dict(self._cache)
+        data._pending = set()
+        return data
+
+    def treeitem(self, ):
+        """Return the tree item that uses this item data
+
+        :returns: the tree item or None
+        :rtype: :class:`TreeItem` | None
+        :raises: None
+        """
+        return self._treeitem
+
+    def data(self, column, role):
+        """Return the data for the specified column and role
+
+        Returns the cached value. If there is none, queue the computation
+        and return a placeholder.
+
+        :param column: the data column
+        :type column: int
+        :param role: the data role
+        :type role: QtCore.Qt.ItemDataRole
+        :returns: data depending on the role
+        :rtype:
+        :raises: None
+        """
+        if not self.is_async(column, role):
+            return self.sync_data(column, role)
+        key = (column, role)
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        if key not in self._pending:
+            self._pending.add(key)
+            dispatcher = self._dispatcher or AsyncDataDispatcher.instance()
+            dispatcher.submit(self, column, role)
+        return self.placeholder(column, role)
+
+    def is_async(self, column, role):
+        """Return True if the value for the given column and role should be computed asynchronously
+
+        The default returns True for :data:`QtCore.Qt.DisplayRole`.
+
+        :param column: the data column
+        :type column: int
+        :param role: the data role
+        :type role: QtCore.Qt.ItemDataRole
+        :returns: True, if the value is computed in the thread pool
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        return role == QtCore.Qt.DisplayRole
+
+    def sync_data(self, column, role):
+        """Return the data for values that are not computed asynchronously
+
+        The default returns None.
+
+        :param column: the data column
+        :type column: int
+        :param role: the data role
+        :type role: QtCore.Qt.ItemDataRole
+        :returns: data depending on the role
+        :rtype:
+        :raises: None
+        """
+        return None
+
+    @abc.abstractmethod
+    def compute(self, column, role):  # pragma: no cover
+        """Compute the value for the given column and role
+
+        This gets called in a worker thread. Do not touch the model or any widgets.
+
+        :param column: the data column
+        :type column: int
+        :param role: the data role
+        :type role: QtCore.Qt.ItemDataRole
+        :returns: the value
+        :rtype:
+        :raises: None
+        """
+        pass
+
+    def placeholder(self, column, role):
+        """Return the value that is shown while the computation is running
+
+        The default returns None.
+
+        :param column: the data column
+        :type column: int
+        :param role: the data role
+        :type role: QtCore.Qt.ItemDataRole
+        :returns: the placeholder
+        :rtype:
+        :raises: None
+        """
+        return None
+
+    def invalidate(self, ):
+        """Clear the cache, so all values get computed again when they are requested
+
+        Results of computations that are still running are discarded.
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._cache.clear()
+        self._pending.clear()
+        self._generation += 1
+
+    def _set_result(self, column, role, value, generation):
+        """Cache the value if it was requested since the last invalidation
+
+        :param column: the data column
+        :type column: int
+        :param role: the data role
+        :type role: QtCore.Qt.ItemDataRole
+        :param value: the computed value
+        :param generation: the number of invalidations when the computation was requested
+        :type generation: :class:`int`
+        :returns: True, if the value was stored
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        key = (column, role)
+        if generation != self._generation or key not in self._pending:
+            return False
+        self._pending.discard(key)
+        self._cache[key] = value
+        return True
+
+    def _discard_pending(self, column, role, generation):
+        """Forget a failed computation, so it gets requested again
+
+        :param column: the data column
+        :type column: int
+        :param role: the data role
+        :type role: QtCore.Qt.ItemDataRole
+        :param generation: the number of invalidations when the computation was requested
+        :type generation: :class:`int`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if generation == self._generation:
+            self._pending.discard((column, role))
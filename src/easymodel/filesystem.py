@@ -0,0 +1,326 @@
+"""This module provides item data for browsing the file system lazily.
+
+Directories are only listed when a view expands them. The listing happens
+with :func:`os.scandir` in the thread pool of a :class:`TreeLoader` and the
+entries are inserted into the model in batches. The size and modification
+time of every entry are read in the worker thread while listing and are
+cached on the item data, so the GUI thread never touches the file system::
+
+  root = easymodel.TreeItem(easymodel.FileItemData('/mnt/projects', headers=['Name', 'Size', 'Modified']))
+  model = easymodel.TreeModel(root)
+  view.setModel(model)
+
+"""
+import datetime
+import os
+import stat
+
+from PySide import QtCore
+
+from easymodel.loader import TreeLoader
+from easymodel.treemodel import ItemData, TreeItem
+
+__all__ = ['FileItemData']
+
+
+class _Entry(object):
+    """Minimal replacement for :class:`os.DirEntry` if :func:`os.scandir` is not available
+    """
+
+    def __init__(self, directory, name):
+        """Initialize a new entry
+
+        :param directory: the listed directory
+        :type directory: :class:`str`
+        :param name: the name of the entry
+        :type name: :class:`str`
+        :raises: None
+        """
+        self.name = name
+        self.path = os.path.join(directory, name)
+        self._stat = None
+
+    def stat(self, follow_symlinks=True):
+        """Return the cached result of :func:`os.stat` or :func:`os.lstat`
+
+        :param follow_symlinks: if False, do not follow symbolic links
+        :type follow_symlinks: :class:`bool`
+        :returns: the stat result
+        :rtype: :class:`os.stat_result`
+        :raises: :class:`OSError`
+        """
+        if self._stat is None:
+            self._stat = os.stat(self.path) if follow_symlinks else os.lstat(self.path)
+        return self._stat
+
+    def is_dir(self, ):
+        """Return True if the entry is a directory
+
+        :returns: True, if directory
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        return os.path.isdir(self.path)
+
+
+def _scandir(path):
+    """Return the entries of the directory
+
+    Uses :func:`os.scandir` if available.
+
+    :param path: the directory
+    :type path: :class:`str`
+    :returns: the entries
+    :rtype: iterable of :class:`os.DirEntry`
+    :raises: :class:`OSError`
+    """
+    scandir = getattr(os, 'scandir', None)
+    if scandir is not None:
+        return scandir(path)
+    return [_Entry(path, name) for name in os.listdir(path)]
+
+
+class FileItemData(ItemData):
+    """Item data for a file or directory
+
+    The columns are the name, the size in bytes and the modification time.
+    Directories can fetch their children. They are listed in a background thread.
+    Directories come first, then files, each sorted by name.
+
+    To use it as the root of a model, pass headers. The root will then
+    return the headers as data and list the directory as top level items.
+
+    If a directory cannot be listed, the :class:`OSError` is stored and emitted
+    with :data:`LoadJob.failed`. See :meth:`FileItemData.error`.
+    The tool tip of the name shows the error.
+    """
+
+    _default_loader = None
+    """The loader for item data that was created without one"""
+
+    def __init__(self, path, isdir=None, size=None, mtime=None, loader=None, headers=None, batchsize=1000):
+        """Initialize a new item data for the given path
+
+        :param path: the path of the file or directory
+        :type path: :class:`str`
+        :param isdir: True for directories. If None, it is checked.
+        :type isdir: :class:`bool` | None
+        :param size: the size in bytes
+        :type size: :class:`int` | None
+        :param mtime: the modification time in seconds since the epoch
+        :type mtime: :class:`float` | None
+        :param loader: the loader for listing directories. Children use the same loader.
+                       If None, a loader is created when a directory is listed the first time.
+        :type loader: :class:`TreeLoader` | None
+        :param headers: the headers if the item data is used for a root item
+        :type headers: list of :class:`str` | None
+        :param batchsize: the maximum number of entries that are inserted at once
+        :type batchsize: :class:`int`
+        :raises: None
+        """
+        super(FileItemData, self).__init__()
+        self._path = path
+        self._isdir = os.path.isdir(path) if isdir is None else isdir
+        self._size = size
+        self._mtime = mtime
+        self._loader = loader
+        self._headers = headers
+        self._batchsize = batchsize
+        self._listed = False
+        self._job = None
+        self._error = None
+
+    def data(self, column, role):
+        """Return the data for the specified column and role
+
+        :param column: the data column
+        :type column: int
+        :param role: the data role
+        :type role: QtCore.Qt.ItemDataRole
+        :returns: the name, size or modification time for the display role,
+                  the listing error for the tool tip role of the name
+        :rtype: :class:`str` | :class:`int` | None
+        :raises: None
+        """
+        if role == QtCore.Qt.ToolTipRole and column == 0 and self._headers is None and self._error is not None:
+            return str(self._error)
+        if role != QtCore.Qt.DisplayRole:
+            return
+        if self._headers is not None:
+            if 0 <= column < len(self._headers):
+                return self._headers[column]
+            return
+        if column == 0:
+            return os.path.basename(self._path.rstrip(os.sep)) or self._path
+        if column == 1:
+            return None if self._isdir else self._size
+        if column == 2 and self._mtime is not None:
+            return datetime.datetime.fromtimestamp(self._mtime).strftime('%Y-%m-%d %H:%M')
+
+    def column_count(self, ):
+        """Return 3 for name, size and modification time
+
+        :returns: the number of columns
+        :rtype: int
+        :raises: None
+        """
+        return 3
+
+    def internal_data(self, ):
+        """Return the path
+
+        :returns: the path
+        :rtype: :class:`str`
+        :raises: None
+        """
+        return self._path
+
+    def is_dir(self, ):
+        """Return True if the path is a directory
+
+        :returns: True, if directory
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        return self._isdir
+
+    def error(self, ):
+        """Return the error of the last listing of the directory
+
+        :returns: the error or None if the listing did not fail
+        :rtype: :class:`OSError` | None
+        :raises: None
+        """
+        return self._error
+
+    def can_fetch_more(self, item):
+        """Return True if this is a directory that has not been listed yet
+
+        :param item: the tree item that holds this item data
+        :type item: :class:`TreeItem`
+        :returns: True, if the directory can be listed
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        return self._isdir and not self._listed
+
+    def fetch_more(self, item):
+        """List the directory in a background thread and add the entries to the item
+
+        :param item: the tree item that holds this item data
+        :type item: :class:`TreeItem`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if not self.can_fetch_more(item):
+            return
+        self._listed = True
+        self._error = None
+        self._job = self.loader().load(item, self._build)
+        self._job.failed.connect(self._job_failed)
+        self._job.finished.connect(self._job_finished)
+
+    def can_unload(self, item):
+        """Return True if the directory is listed completely
+
+        :param item: the tree item that holds this item data
+        :type item: :class:`TreeItem`
+        :returns: True, if the children can be unloaded
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        return self._isdir and self._listed and self._job is None
+
+    def unload(self, item):
+        """Allow listing the directory again
+
+        :param item: the tree item that holds this item data
+        :type item: :class:`TreeItem`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._listed = False
+
+    def loader(self, ):
+        """Return the loader that lists the directories
+
+        :returns: the loader
+        :rtype: :class:`TreeLoader`
+        :raises: None
+        """
+        if self._loader is None:
+            if FileItemData._default_loader is None:
+                FileItemData._default_loader = TreeLoader()
+            self._loader = FileItemData._default_loader
+        return self._loader
+
+    def cancel(self, ):
+        """Cancel the listing of the directory. It can be listed again afterwards.
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if self._job is not None:
+            self._job.cancel()
+
+    def _job_failed(self, error):
+        """Store the error of the listing
+
+        :param error: the error of the listing
+        :type error: :class:`OSError`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._error = error
+
+    def _job_finished(self, ):
+        """Allow listing again if the job got cancelled
+
+        Entries that were already added get removed again.
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if self._job.is_cancelled():
+            item = self._job.parentitem
+            item._remove_children(0, item.child_count())
+            self._listed = False
+        self._job = None
+
+    def _build(self, job):
+        """List the directory and yield batches of detached tree items
+
+        This runs in a worker thread.
+
+        :param job: the running job
+        :type job: :class:`LoadJob`
+        :returns: lists of tree items
+        :rtype: generator
+        :raises: :class:`OSError` if the directory cannot be listed
+        """
+        entries = []
+        for entry in _scandir(self._path):
+            if job.is_cancelled():
+                return
+            try:
+                st = entry.stat(follow_symlinks=False)
+                isdir = stat.S_ISDIR(st.st_mode) or (stat.S_ISLNK(st.st_mode) and entry.is_dir())
+                entries.append((not isdir, entry.name, entry.path, isdir, st.st_size, st.st_mtime))
+            except OSError:
+                entries.append((True, entry.name, entry.path, False, None, None))
+        entries.sort()
+        total = len(entries)
+        for start in range(0, total, self._batchsize):
+            if job.is_cancelled():
+                return
+            batch = []
+            for isfile, name, path, isdir, size, mtime in entries[start:start + self._batchsize]:
+                data = FileItemData(path, isdir, size, mtime, loader=self._loader, batchsize=self._batchsize)
+                batch.append(TreeItem(data))
+            yield batch
+            job.report_progress(min(start + self._batchsize, total), total)
@@ -0,0 +1,608 @@
+"""This module provides a flat model that shows the expanded rows of a tree model.
+
+:class:`QtGui.QTreeView` keeps layout information for every expanded row. With
+hundreds of thousands of rows this gets slow. The :class:`FlatTreeModel` flattens
+a :class:`TreeModel` into a list of the rows that are currently visible.
+The depth of every row is available with :data:`DEPTH_ROLE`, so a delegate can indent it,
+and the rows can be shown in a :class:`QtGui.QListView` with uniform item sizes::
+
+  flat = easymodel.FlatTreeModel(model)
+  view = QtGui.QListView()
+  view.setUniformItemSizes(True)
+  view.setModel(flat)
+  view.doubleClicked.connect(flat.toggle)
+
+Expanding and collapsing a row as well as inserting, removing and moving items in the
+source model only inserts, removes or moves the affected rows.
+"""
+from PySide import QtCore
+
+__all__ = ['DEPTH_ROLE', 'EXPANDED_ROLE', 'HAS_CHILDREN_ROLE', 'FlatTreeModel']
+
+
+DEPTH_ROLE = QtCore.Qt.UserRole + 2
+""":data:`QtCore.Qt.ItemDataRole` to retrieve the depth of a row in a :class:`FlatTreeModel`.
+Top level rows have depth 0."""
+EXPANDED_ROLE = QtCore.Qt.UserRole + 3
+""":data:`QtCore.Qt.ItemDataRole` to retrieve whether a row in a :class:`FlatTreeModel` is expanded."""
+HAS_CHILDREN_ROLE = QtCore.Qt.UserRole + 4
+""":data:`QtCore.Qt.ItemDataRole` to retrieve whether a row in a :class:`FlatTreeModel`
+has children or can fetch them."""
+
+
+class FlatTreeModel(QtCore.QAbstractItemModel):
+    """A flat model with the visible rows of a :class:`TreeModel` in depth-first order
+
+    Top level rows are always visible. The children of a row are visible if the row is expanded.
+    The expanded state of rows is kept when an ancestor gets collapsed.
+    Items that can fetch more get fetched when they are expanded. If the source model
+    has a node budget, it gets told about expanded and collapsed rows.
+    See :meth:`TreeModel.set_node_budget`.
+
+    Changing the layout or the columns of the source model rebuilds the rows.
+    """
+
+    def __init__(self, source, parent=None):
+        """Initialize a new flat model for the given tree model
+
+        :param source: the tree model to flatten
+        :type source: :class:`TreeModel`
+        :param parent: the parent object
+        :type parent: :class:`QtCore.QObject`
+        :raises: None
+        """
+        super(FlatTreeModel, self).__init__(parent)
+        self._source = source
+        self._expanded = set()
+        self._rows, self._depths = self._flatten(source.root.childItems, 0)
+        self._positions = {}
+        """The visible items mapped to their row. Rows after :attr:`_valid` might be outdated."""
+        self._valid = 0
+        self._index_rows()
+        source.rowsInserted.connect(self._rows_inserted)
+        source.rowsAboutToBeRemoved.connect(self._rows_about_to_be_removed)
+        source.dataChanged.connect(self._data_changed)
+        source.headerDataChanged.connect(self.headerDataChanged.emit)
+        source.rowsMoved.connect(self._rows_moved)
+        source.layoutChanged.connect(self.rebuild)
+        source.columnsInserted.connect(self.rebuild)
+        source.columnsRemoved.connect(self.rebuild)
+        source.modelReset.connect(self._source_reset)
+
+    @property
+    def source(self, ):
+        """Return the tree model that is flattened
+
+        :returns: the source model
+        :rtype: :class:`TreeModel`
+        :raises: None
+        """
+        return self._source
+
+    def _flatten(self, items, depth):
+        """Return the given items and their visible descendants in depth-first order
+
+        :param items: the items
+        :type items: list of :class:`TreeItem`
+        :param depth: the depth of the items
+        :type depth: :class:`int`
+        :returns: the rows and their depths
+        :rtype: :class:`tuple` of two lists
+        :raises: None
+        """
+        rows = []
+        depths = []
+        expanded = self._expanded
+        stack = [(item, depth) for item in reversed(items)]
+        while stack:
+            item, d = stack.pop()
+            rows.append(item)
+            depths.append(d)
+            if item in expanded:
+                stack.extend((child, d + 1) for child in reversed(item.childItems))
+        return rows, depths
+
+    def _row_of(self, item):
+        """Return the row of the item or None if it is not visible
+
+        :param item: the item
+        :type item: :class:`TreeItem`
+        :returns: the row
+        :rtype: :class:`int` | None
+        :raises: None
+        """
+        positions = self._positions
+        row = positions.get(item)
+        rows = self._rows
+        if row is None or (row < len(rows) and rows[row] is item):
+            return row
+        # the row moved, renumber the rows after the first change up to the item
+        for row in range(self._valid, len(rows)):
+            i = rows[row]
+            positions[i] = row
+            if i is item:
+                break
+        self._valid = row + 1
+        return row
+
+    def _index_rows(self, ):
+        """Map all rows to their position
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._positions = dict((item, row) for row, item in enumerate(self._rows))
+        self._valid = len(self._rows)
+
+    def _invalidate(self, row):
+        """Mark the positions of the given row and all rows after it as outdated
+
+        :param row: the first row that changed
+        :type row: :class:`int`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._valid = min(self._valid, row)
+
+    def _end(self, row):
+        """Return the row after the last visible descendant of the given row
+
+        :param row: the row
+        :type row: :class:`int`
+        :returns: the end of the subtree
+        :rtype: :class:`int`
+        :raises: None
+        """
+        depths = self._depths
+        depth = depths[row]
+        end = row + 1
+        n = len(depths)
+        while end < n and depths[end] > depth:
+            end += 1
+        return end
+
+    def _is_open(self, item):
+        """Return True if the children of the item are visible
+
+        :param item: the item
+        :type item: :class:`TreeItem`
+        :returns: True, if the item is the root or expanded and visible
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        if item is self._source.root:
+            return True
+        return item in self._expanded and self._row_of(item) is not None
+
+    def _insert(self, row, rows, depths):
+        """Insert the rows before the given row
+
+        :param row: the row to insert before
+        :type row: :class:`int`
+        :param rows: the items to insert
+        :type rows: list of :class:`TreeItem`
+        :param depths: the depths of the items
+        :type depths: list of :class:`int`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if not rows:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), row, row + len(rows) - 1)
+        self._rows[row:row] = rows
+        self._depths[row:row] = depths
+        positions = self._positions
+        for i, item in enumerate(rows, row):
+            positions[item] = i
+        if self._valid >= row:
+            self._valid = row + len(rows)
+        self.endInsertRows()
+
+    def _remove(self, start, end):
+        """Remove the rows from start up to but not including end
+
+        :param start: the first row
+        :type start: :class:`int`
+        :param end: the row after the last row
+        :type end: :class:`int`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if end <= start:
+            return
+        self.beginRemoveRows(QtCore.QModelIndex(), start, end - 1)
+        positions = self._positions
+        for item in self._rows[start:end]:
+            del positions[item]
+        del self._rows[start:end]
+        del self._depths[start:end]
+        self._invalidate(start)
+        self.endRemoveRows()
+
+    def _source_item(self, index):
+        """Return the item for the given source index
+
+        :param index: the source index
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: the item or the root for an invalid index
+        :rtype: :class:`TreeItem`
+        :raises: None
+        """
+        return self._source.item_of_index(index)
+
+    def _rows_inserted(self, parent, first, last):
+        """Insert the new items if their parent is expanded
+
+        :param parent: the source parent index
+        :type parent: :class:`QtCore.QModelIndex`
+        :param first: the first inserted row
+        :type first: :class:`int`
+        :param last: the last inserted row
+        :type last: :class:`int`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        parentitem = self._source_item(parent)
+        if not self._is_open(parentitem):
+            return
+        if parentitem is self._source.root:
+            depth = 0
+            parentrow = -1
+        else:
+            parentrow = self._row_of(parentitem)
+            depth = self._depths[parentrow] + 1
+        if first:
+            row = self._end(self._row_of(parentitem.childItems[first - 1]))
+        else:
+            row = parentrow + 1
+        rows, depths = self._flatten(parentitem.childItems[first:last + 1], depth)
+        self._insert(row, rows, depths)
+        if parentrow >= 0 and first == 0:
+            # the parent might not have shown a branch indicator before
+            self._row_changed(parentrow)
+
+    def _rows_about_to_be_removed(self, parent, first, last):
+        """Remove the rows of the items and forget their expanded state
+
+        :param parent: the source parent index
+        :type parent: :class:`QtCore.QModelIndex`
+        :param first: the first removed row
+        :type first: :class:`int`
+        :param last: the last removed row
+        :type last: :class:`int`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        parentitem = self._source_item(parent)
+        removed = parentitem.childItems[first:last + 1]
+        if self._is_open(parentitem):
+            start = self._row_of(removed[0])
+            self._remove(start, self._end(self._row_of(removed[-1])))
+        stack = list(removed)
+        while stack:
+            item = stack.pop()
+            self._expanded.discard(item)
+            stack.extend(item.childItems)
+
+    def _rows_moved(self, parent, start, end, destination, row):
+        """Move the rows of the moved items
+
+        Moves between different parents are handled as a removal and an insertion.
+
+        :param parent: the source parent index before the move
+        :type parent: :class:`QtCore.QModelIndex`
+        :param start: the first moved row
+        :type start: :class:`int`
+        :param end: the last moved row
+        :type end: :class:`int`
+        :param destination: the source parent index after the move
+        :type destination: :class:`QtCore.QModelIndex`
+        :param row: the row before which the items were inserted
+        :type row: :class:`int`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        parentitem = self._source_item(parent)
+        destitem = self._source_item(destination)
+        count = end - start + 1
+        if destitem is parentitem and row > start:
+            row -= count
+        moved = destitem.childItems[row:row + count]
+        if destitem is not parentitem:
+            if self._is_open(parentitem):
+                self._remove(self._row_of(moved[0]), self._end(self._row_of(moved[-1])))
+            self._rows_inserted(destination, row, row + count - 1)
+            return
+        if not self._is_open(parentitem):
+            return
+        first = self._row_of(moved[0])
+        last = self._end(self._row_of(moved[-1]))
+        siblings = parentitem.childItems
+        if row + count < len(siblings):
+            target = self._row_of(siblings[row + count])
+        elif parentitem is self._source.root:
+            target = len(self._rows)
+        else:
+            target = self._end(self._row_of(parentitem))
+        if first <= target <= last:
+            return
+        self.beginMoveRows(QtCore.QModelIndex(), first, last - 1, QtCore.QModelIndex(), target)
+        rows = self._rows[first:last]
+        depths = self._depths[first:last]
+        del self._rows[first:last]
+        del self._depths[first:last]
+        if target > first:
+            target -= last - first
+        self._rows[target:target] = rows
+        self._depths[target:target] = depths
+        self._invalidate(min(first, target))
+        self.endMoveRows()
+
+    def _data_changed(self, topleft, bottomright, *args):
+        """Forward data changes of visible items
+
+        :param topleft: the top left source index
+        :type topleft: :class:`QtCore.QModelIndex`
+        :param bottomright: the bottom right source index
+        :type bottomright: :class:`QtCore.QModelIndex`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        parentitem = self._source_item(topleft.parent())
+        if not self._is_open(parentitem):
+            return
+        rows = [self._row_of(child) for child in parentitem.childItems[topleft.row():bottomright.row() + 1]]
+        rows = [r for r in rows if r is not None]
+        if rows:
+            self.dataChanged.emit(self.index(min(rows), topleft.column()),
+                                  self.index(max(rows), bottomright.column()))
+
+    def _row_changed(self, row):
+        """Emit :data:`QtCore.QAbstractItemModel.dataChanged` for all columns of the row
+
+        :param row: the row
+        :type row: :class:`int`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self.dataChanged.emit(self.index(row, 0), self.index(row, max(0, self.columnCount() - 1)))
+
+    def _source_reset(self, ):
+        """Forget the expanded state and rebuild the rows
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._expanded.clear()
+        self.rebuild()
+
+    def rebuild(self, *args):
+        """Compute all rows again and reset the model
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self.beginResetModel()
+        self._rows, self._depths = self._flatten(self._source.root.childItems, 0)
+        self._index_rows()
+        self.endResetModel()
+
+    def item(self, row):
+        """Return the item of the given row
+
+        :param row: the row
+        :type row: :class:`int`
+        :returns: the item
+        :rtype: :class:`TreeItem`
+        :raises: :class:`IndexError`
+        """
+        return self._rows[row]
+
+    def map_to_source(self, index):
+        """Return the index of the source model for the given index
+
+        :param index: the index of this model
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: the source index
+        :rtype: :class:`QtCore.QModelIndex`
+        :raises: None
+        """
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        return self._source.index_of_item(self._rows[index.row()], index.column())
+
+    def map_from_source(self, index):
+        """Return the index of this model for the given source index
+
+        :param index: the index of the source model
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: the index or an invalid index if the row is not visible
+        :rtype: :class:`QtCore.QModelIndex`
+        :raises: None
+        """
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        row = self._row_of(self._source.item_of_index(index))
+        if row is None:
+            return QtCore.QModelIndex()
+        return self.index(row, index.column())
+
+    def is_expanded(self, index):
+        """Return True if the row of the index is expanded
+
+        :param index: the index
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: True, if expanded
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        return index.isValid() and self._rows[index.row()] in self._expanded
+
+    def set_expanded(self, index, expanded):
+        """Expand or collapse the row of the index
+
+        Expanding inserts the visible descendants below the row.
+        Collapsing removes them.
+
+        :param index: the index
+        :type index: :class:`QtCore.QModelIndex`
+        :param expanded: True to expand, False to collapse
+        :type expanded: :class:`bool`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if not index.isValid():
+            return
+        row = index.row()
+        item = self._rows[row]
+        if expanded == (item in self._expanded):
+            return
+        source = self._source
+        if expanded:
+            self._expanded.add(item)
+            rows, depths = self._flatten(item.childItems, self._depths[row] + 1)
+            self._insert(row + 1, rows, depths)
+            self._row_changed(row)
+            sourceindex = source.index_of_item(item)
+            if item.can_fetch_more():
+                source.fetchMore(sourceindex)
+            if hasattr(source, 'index_expanded'):
+                source.index_expanded(sourceindex)
+        else:
+            self._expanded.discard(item)
+            self._remove(row + 1, self._end(row))
+            self._row_changed(row)
+            if hasattr(source, 'index_collapsed'):
+                source.index_collapsed(source.index_of_item(item))
+
+    def toggle(self, index):
+        """Expand the row of the index if it is collapsed and collapse it otherwise
+
+        :param index: the index
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self.set_expanded(index, not self.is_expanded(index))
+
+    def index(self, row, column, parent=None):
+        """Return the index for the given row and column
+
+        :param row: the row of the item
+        :type row: int
+        :param column: the column for the item
+        :type column: int
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: the index of the item
+        :rtype: :class:`QtCore.QModelIndex`
+        :raises: None
+        """
+        if parent is None:
+            parent = QtCore.QModelIndex()
+        if not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index):
+        """Return an invalid index because the model is flat
+
+        :param index: the index
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: an invalid index
+        :rtype: :class:`QtCore.QModelIndex`
+        :raises: None
+        """
+        return QtCore.QModelIndex()
+
+    def rowCount(self, parent=None):
+        """Return the number of visible rows
+
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: the row count for the invalid parent. 0 otherwise.
+        :rtype: int
+        :raises: None
+        """
+        if parent is not None and parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def columnCount(self, parent=None):
+        """Return the column count of the source model
+
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: the column count
+        :rtype: int
+        :raises: None
+        """
+        return self._source.columnCount(QtCore.QModelIndex())
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        """Return the data of the source item for the given index and role
+
+        :param index: the index
+        :type index: :class:`QtCore.QModelIndex`
+        :param role: the data role
+        :type role: QtCore.Qt.ItemDataRole
+        :returns: some data depending on the role
+        :raises: None
+        """
+        if not index.isValid():
+            return
+        row = index.row()
+        item = self._rows[row]
+        if role == DEPTH_ROLE:
+            return self._depths[row]
+        if role == EXPANDED_ROLE:
+            return item in self._expanded
+        if role == HAS_CHILDREN_ROLE:
+            return bool(item.childItems) or item.can_fetch_more()
+        return self._source.item_data(item, index.column(), role)
+
+    def flags(self, index):
+        """Return the flags of the source item for the given index
+
+        :param index: the index to query
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: the flags
+        :rtype: QtCore.Qt.ItemFlags
+        :raises: None
+        """
+        if not index.isValid():
+            return QtCore.Qt.NoItemFlags
+        itemdata = self._rows[index.row()].itemdata()
+        if itemdata is None:
+            return QtCore.Qt.NoItemFlags
+        return itemdata.flags(index.column())
+
+    def headerData(self, section, orientation, role):
+        """Return the header data of the source model
+
+        :param section: the section in the header view
+        :type section: int
+        :param orientation: vertical or horizontal orientation
+        :type orientation: :data:`QtCore.Qt.Vertical` | :data:`QtCore.Qt.Horizontal`
+        :param role: the data role.
+        :type role: :data:`QtCore.Qt.ItemDataRole`
+        :returns: data for the header
+        :raises: None
+        """
+        if orientation == QtCore.Qt.Horizontal:
+            return self._source.headerData(section, orientation, role)
+        if role == QtCore.Qt.DisplayRole:
+            return str(section + 1)
@@ -0,0 +1,226 @@
+"""This module provides a journal of the changes of a tree model for consumers that are no views.
+
+Caches and exporters can follow a :class:`TreeModel` without connecting to Qt signals.
+Every structural change and data change is appended as a :class:`ChangeRecord` with
+an increasing sequence number. Readers fetch all records since their last read at once::
+
+  reader = model.journal().reader()
+  ...
+  for record in reader.read():
+      if record.kind == 'insert':
+          parent = model.item_for_id(record.parentid)
+
+Items are referenced by their :meth:`TreeItem.item_id`. Records are only kept
+while there are readers. Once all readers read them, they are discarded.
+The journal does not depend on Qt, so readers can live in other threads.
+"""
+import collections
+import threading
+import weakref
+
+__all__ = ['ChangeRecord', 'ChangeJournal', 'JournalReader']
+
+
+ChangeRecord = collections.namedtuple('ChangeRecord', ['sequence', 'kind', 'parentid', 'first', 'last', 'itemids'])
+"""A change of the hierarchy
+
+:sequence: the sequence number. Every record has a higher number than the one before.
+:kind: ``'insert'``, ``'remove'``, ``'move'``, ``'data'`` or ``'reset'``
+:parentid: the id of the parent item. For ``'data'`` the parent of the changed item
+           or None for the root. For ``'reset'`` the id of the new root.
+:first: the first row. For ``'move'`` the row of the moved item, for ``'data'`` the first changed column.
+:last: the last row. For ``'move'`` the destination row like :meth:`TreeModel.move_item`,
+       for ``'data'`` the last changed column.
+:itemids: the ids of the inserted, removed, moved or changed items. Empty for ``'reset'``.
+"""
+
+
+class ChangeJournal(object):
+    """An append-only sequence of :class:`ChangeRecord` instances
+
+    Records are only stored while there are readers.
+    Use :meth:`ChangeJournal.reader` to read the journal.
+    """
+
+    def __init__(self, ):
+        """Initialize a new empty journal
+
+        :raises: None
+        """
+        self._records = []
+        self._sequence = 0
+        """The sequence number of the last record"""
+        self._readers = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    @property
+    def sequence(self, ):
+        """Return the sequence number of the last record
+
+        :returns: the sequence number. 0 if nothing was recorded yet.
+        :rtype: :class:`int`
+        :raises: None
+        """
+        return self._sequence
+
+    @property
+    def active(self, ):
+        """Return True if there are readers, so changes have to be recorded
+
+        :returns: True, if changes get recorded
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        return bool(self._readers)
+
+    def record(self, kind, parentid, first, last, itemids):
+        """Append a record if there are readers
+
+        :param kind: the kind of change. See :class:`ChangeRecord`.
+        :type kind: :class:`str`
+        :param parentid: the id of the parent
+        :type parentid: :class:`int` | None
+        :param first: the first row or column
+        :type first: :class:`int`
+        :param last: the last row or column
+        :type last: :class:`int`
+        :param itemids: the ids of the items
+        :type itemids: list of :class:`int`
+        :returns: the new record or None if there are no readers
+        :rtype: :class:`ChangeRecord` | None
+        :raises: None
+        """
+        if not self._readers:
+            return
+        with self._lock:
+            self._sequence += 1
+            record = ChangeRecord(self._sequence, kind, parentid, first, last, itemids)
+            self._records.append(record)
+        return record
+
+    def read(self, since, limit=None):
+        """Return the records after the given sequence number
+
+        :param since: the sequence number of the last record that was read
+        :type since: :class:`int`
+        :param limit: the maximum number of records. If None, return all.
+        :type limit: :class:`int` | None
+        :returns: the records in order
+        :rtype: list of :class:`ChangeRecord`
+        :raises: :class:`ValueError` if records after since were discarded already
+        """
+        with self._lock:
+            records = self._records
+            first = records[0].sequence if records else self._sequence + 1
+            if since < first - 1:
+                raise ValueError("The records after %s were discarded." % since)
+            start = since - first + 1
+            end = len(records) if limit is None else start + limit
+            return records[start:end]
+
+    def reader(self, ):
+        """Return a new reader that reads all records from now on
+
+        :returns: the reader
+        :rtype: :class:`JournalReader`
+        :raises: None
+        """
+        with self._lock:
+            reader = JournalReader(self, self._sequence)
+            self._readers.add(reader)
+        return reader
+
+    def remove_reader(self, reader):
+        """Stop keeping records for the given reader
+
+        Readers that get garbage collected are removed automatically.
+
+        :param reader: the reader
+        :type reader: :class:`JournalReader`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        with self._lock:
+            self._readers.discard(reader)
+        self.compact()
+
+    def compact(self, ):
+        """Discard the records that all readers read already
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        with self._lock:
+            records = self._records
+            if not records:
+                return
+            positions = [reader.position for reader in self._readers]
+            done = min(positions) if positions else self._sequence
+            count = done - records[0].sequence + 1
+            if count > 0:
+                del records[:count]
+
+    def __len__(self, ):
+        """Return the number of stored records
+
+        :returns: the number of records
+        :rtype: :class:`int`
+        :raises: None
+        """
+        return len(self._records)
+
+
+class JournalReader(object):
+    """Reads the records of a :class:`ChangeJournal` in order
+
+    The journal keeps the records until every reader read them.
+    Call :meth:`JournalReader.close` or drop the reader if you are not interested anymore.
+    """
+
+    def __init__(self, journal, position):
+        """Initialize a new reader. Use :meth:`ChangeJournal.reader` instead.
+
+        :param journal: the journal to read
+        :type journal: :class:`ChangeJournal`
+        :param position: the sequence number of the last record that counts as read
+        :type position: :class:`int`
+        :raises: None
+        """
+        self._journal = journal
+        self.position = position
+        """The sequence number of the last record that was read"""
+
+    def read(self, limit=None):
+        """Return the records since the last read and discard the ones all readers read
+
+        :param limit: the maximum number of records. If None, return all.
+        :type limit: :class:`int` | None
+        :returns: the records in order
+        :rtype: list of :class:`ChangeRecord`
+        :raises: None
+        """
+        records = self._journal.read(self.position, limit)
+        if records:
+            self.position = records[-1].sequence
+            self._journal.compact()
+        return records
+
+    def pending(self, ):
+        """Return the number of records that were not read yet
+
+        :returns: the number of records
+        :rtype: :class:`int`
+        :raises: None
+        """
+        return self._journal.sequence - self.position
+
+    def close(self, ):
+        """Stop reading, so the journal does not keep records for this reader
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._journal.remove_reader(self)
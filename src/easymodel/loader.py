@@ -0,0 +1,313 @@
+"""This module provides classes for building tree items in background threads.
+
+:class:`TreeItem` hierarchies that are not attached to a model can be
+created in any thread. The :class:`TreeLoader` runs a builder function in a
+:class:`QtCore.QThreadPool`. The builder creates detached tree items and the
+loader attaches them to a parent item in the GUI thread.
+
+A builder is a function that takes a :class:`LoadJob`. It either returns a list
+of detached tree items or yields several such lists. Each list is inserted
+with :meth:`TreeItem.add_children`, so the views get notified once per list.
+The builder can report progress with :meth:`LoadJob.report_progress` and should
+stop early when :meth:`LoadJob.is_cancelled` returns True::
+
+  def build(job):
+      names = list_projects()
+      for i, name in enumerate(names):
+          if job.is_cancelled():
+              return
+          item = easymodel.TreeItem(ProjectItemData(name))
+          # children can be added freely because the item is detached
+          load_shots(item)
+          yield [item]
+          job.report_progress(i + 1, len(names))
+
+  loader = easymodel.TreeLoader()
+  job = loader.load(model.root, build)
+  job.progress.connect(progressbar.setValue)
+  # cancel it when the user navigates away
+  job.cancel()
+
+"""
+import threading
+import types
+
+from PySide import QtCore
+
+__all__ = ['LoadJob', 'TreeLoader']
+
+
+class LoadJob(QtCore.QObject):
+    """A job that runs a builder function in a worker thread
+    and adds the created items to a parent item in the GUI thread.
+
+    Create jobs via :meth:`TreeLoader.load`.
+    """
+
+    progress = QtCore.Signal(int, int)
+    """This signal is emitted in the GUI thread with the number of finished
+    steps and the total number of steps that the builder reported."""
+    finished = QtCore.Signal()
+    """This signal is emitted when the builder finished and all items are added
+    or when the job was cancelled."""
+    failed = QtCore.Signal(object)
+    """This signal is emitted with the exception that the builder raised."""
+
+    _progressed = QtCore.Signal(int, int)
+    _delivered = QtCore.Signal(object)
+    _done = QtCore.Signal(object)
+
+    def __init__(self, parentitem, builder, parent=None):
+        """Initialize a new job that adds the items of the builder to the parent item
+
+        :param parentitem: the item to add the built children to
+        :type parentitem: :class:`TreeItem`
+        :param builder: a function that takes this job and returns or yields
+                        lists of detached :class:`TreeItem`
+        :type builder: callable
+        :param parent: the parent object
+        :type parent: :class:`QtCore.QObject`
+        :raises: None
+        """
+        super(LoadJob, self).__init__(parent)
+        self._parentitem = parentitem
+        self._builder = builder
+        self._cancelled = threading.Event()
+        self._running = False
+        self._progressed.connect(self._on_progressed, QtCore.Qt.QueuedConnection)
+        self._delivered.connect(self._on_delivered, QtCore.Qt.QueuedConnection)
+        self._done.connect(self._on_done, QtCore.Qt.QueuedConnection)
+
+    @property
+    def parentitem(self, ):
+        """Return the item that receives the built children
+
+        :returns: the parent item
+        :rtype: :class:`TreeItem`
+        :raises: None
+        """
+        return self._parentitem
+
+    def cancel(self, ):
+        """Cancel the job
+
+        Items that have not been added yet are discarded.
+        The builder should check :meth:`LoadJob.is_cancelled` to stop early.
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._cancelled.set()
+
+    def is_cancelled(self, ):
+        """Return True if the job was cancelled
+
+        This is safe to call from the worker thread.
+
+        :returns: True, if cancelled
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        return self._cancelled.is_set()
+
+    def is_running(self, ):
+        """Return True if the job has been started and is not finished yet
+
+        :returns: True, if running
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        return self._running
+
+    def report_progress(self, done, total):
+        """Report the progress of the builder
+
+        This is safe to call from the worker thread.
+        :data:`LoadJob.progress` is emitted in the GUI thread.
+
+        :param done: the number of finished steps
+        :type done: :class:`int`
+        :param total: the total number of steps
+        :type total: :class:`int`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._progressed.emit(done, total)
+
+    def run(self, ):
+        """Run the builder and hand over the items to the GUI thread
+
+        This gets called in the worker thread.
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        error = None
+        try:
+            result = self._builder(self)
+            if not isinstance(result, types.GeneratorType):
+                result = [result]
+            for items in result:
+                if self.is_cancelled():
+                    break
+                if items:
+                    self._delivered.emit(list(items))
+        except Exception as e:
+            error = e
+        self._done.emit(error)
+
+    def _on_progressed(self, done, total):
+        """Emit the progress in the GUI thread
+
+        :param done: the number of finished steps
+        :type done: :class:`int`
+        :param total: the total number of steps
+        :type total: :class:`int`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if not self.is_cancelled():
+            self.progress.emit(done, total)
+
+    def _on_delivered(self, items):
+        """Add the items to the parent in the GUI thread
+
+        :param items: detached tree items
+        :type items: list of :class:`TreeItem`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if not self.is_cancelled():
+            self._parentitem.add_children(items)
+
+    def _on_done(self, error):
+        """Finish the job in the GUI thread
+
+        :param error: the exception of the builder or None
+        :type error: :class:`Exception` | None
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._running = False
+        if error is not None:
+            self.failed.emit(error)
+        self.finished.emit()
+
+
+class _Runnable(QtCore.QRunnable):
+    """Runnable that calls :meth:`LoadJob.run`
+    """
+
+    def __init__(self, job):
+        """Initialize a new runnable for the given job
+
+        :param job: the job to run
+        :type job: :class:`LoadJob`
+        :raises: None
+        """
+        super(_Runnable, self).__init__()
+        self.job = job
+
+    def run(self, ):
+        """Run the job
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self.job.run()
+
+
+class TreeLoader(QtCore.QObject):
+    """Runs builders in a thread pool and adds the built items in the GUI thread.
+
+    See the module documentation for an example.
+    """
+
+    def __init__(self, parent=None, pool=None):
+        """Initialize a new loader that uses the given pool
+
+        :param parent: the parent object
+        :type parent: :class:`QtCore.QObject`
+        :param pool: the thread pool to use. If None use the global instance.
+        :type pool: :class:`QtCore.QThreadPool` | None
+        :raises: None
+        """
+        super(TreeLoader, self).__init__(parent)
+        self._pool = pool or QtCore.QThreadPool.globalInstance()
+        self._jobs = []
+
+    @property
+    def jobs(self, ):
+        """Return the jobs that are not finished yet
+
+        :returns: the running jobs
+        :rtype: list of :class:`LoadJob`
+        :raises: None
+        """
+        return list(self._jobs)
+
+    def load(self, parentitem, builder):
+        """Run the builder in the thread pool and add its items to the parent item
+
+        :param parentitem: the item to add the built children to
+        :type parentitem: :class:`TreeItem`
+        :param builder: a function that takes the job and returns or yields
+                        lists of detached :class:`TreeItem`
+        :type builder: callable
+        :returns: the started job
+        :rtype: :class:`LoadJob`
+        :raises: None
+        """
+        job = LoadJob(parentitem, builder, self)
+        job.finished.connect(lambda: self._remove_job(job))
+        self._jobs.append(job)
+        job._running = True
+        job._runnable = _Runnable(job)
+        job._runnable.setAutoDelete(False)
+        self._pool.start(job._runnable)
+        return job
+
+    def cancel(self, parentitem=None):
+        """Cancel all jobs or only the jobs that load children of the given item
+
+        :param parentitem: the item whose jobs get cancelled. If None, cancel all.
+        :type parentitem: :class:`TreeItem` | None
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        for job in self._jobs:
+            if parentitem is None or job.parentitem is parentitem:
+                job.cancel()
+
+    def wait(self, msecs=-1):
+        """Wait until all jobs in the pool are done
+
+        The items are added once the event loop processes the queued results.
+
+        :param msecs: the maximum time to wait or -1 to wait forever
+        :type msecs: :class:`int`
+        :returns: True, if all jobs are done
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        return self._pool.waitForDone(msecs)
+
+    def _remove_job(self, job):
+        """Forget the finished job
+
+        :param job: the finished job
+        :type job: :class:`LoadJob`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if job in self._jobs:
+            self._jobs.remove(job)
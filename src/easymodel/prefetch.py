@@ -0,0 +1,155 @@
+"""This module provides a helper that tells a model which rows a view is about to display.
+
+Item data that is backed by a database or another slow backend usually loads
+its data when :meth:`ItemData.data` is called. Views ask for one cell at a time,
+so this results in one query per row. A :class:`ViewPrefetcher` watches the viewport
+of a view and calls :meth:`TreeModel.prefetch` with the visible rows right before
+the view paints them. :meth:`TreeModel.prefetch` groups the item data by class and
+calls :meth:`ItemData.prefetch`, where one query can load all of them::
+
+  class ShotItemData(easymodel.ItemData):
+      @classmethod
+      def prefetch(cls, itemdatas):
+          missing = [d for d in itemdatas if d.row is None]
+          rows = db.load_shots([d.shotid for d in missing])
+          for d in missing:
+              d.row = rows[d.shotid]
+
+  view = QtGui.QTreeView()
+  view.setModel(model)
+  prefetcher = easymodel.ViewPrefetcher(view)
+
+"""
+from PySide import QtCore
+
+__all__ = ['ViewPrefetcher']
+
+
+class ViewPrefetcher(QtCore.QObject):
+    """Calls :meth:`TreeModel.prefetch` for the rows that are visible in a view
+
+    The visible rows are computed before the viewport gets painted, but only if
+    the view scrolled, got resized or the model changed since the last time.
+    If the model of the view is a proxy model, the indexes are mapped to the source model.
+    """
+
+    def __init__(self, view, lookahead=10, parent=None):
+        """Initialize a new prefetcher for the given view
+
+        :param view: the view to watch
+        :type view: :class:`QtGui.QAbstractItemView`
+        :param lookahead: the number of rows below the viewport to prefetch as well
+        :type lookahead: :class:`int`
+        :param parent: the parent object. If None, use the view.
+        :type parent: :class:`QtCore.QObject` | None
+        :raises: None
+        """
+        super(ViewPrefetcher, self).__init__(parent or view)
+        self._view = view
+        self._model = None
+        self._dirty = True
+        self.lookahead = lookahead
+        """The number of rows below the viewport that get prefetched as well"""
+        view.viewport().installEventFilter(self)
+        view.verticalScrollBar().valueChanged.connect(self.invalidate)
+        if hasattr(view, 'expanded'):
+            view.expanded.connect(self.invalidate)
+            view.collapsed.connect(self.invalidate)
+
+    def invalidate(self, *args):
+        """Compute the visible rows again before the next paint
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._dirty = True
+
+    def eventFilter(self, obj, event):
+        """Prefetch the visible rows before the viewport gets painted
+
+        :param obj: the watched viewport
+        :type obj: :class:`QtGui.QWidget`
+        :param event: the event
+        :type event: :class:`QtCore.QEvent`
+        :returns: False, so the event gets handled by the viewport
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        if event.type() == QtCore.QEvent.Paint:
+            self._check_model()
+            if self._dirty:
+                self.prefetch_visible()
+        elif event.type() == QtCore.QEvent.Resize:
+            self._dirty = True
+        return False
+
+    def _check_model(self, ):
+        """Connect to the model of the view, if the view has a new model
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        model = self._view.model()
+        if model is self._model:
+            return
+        signals = ('rowsInserted', 'rowsRemoved', 'rowsMoved', 'layoutChanged', 'modelReset')
+        if self._model is not None:
+            for s in signals:
+                getattr(self._model, s).disconnect(self.invalidate)
+        self._model = model
+        if model is not None:
+            for s in signals:
+                getattr(model, s).connect(self.invalidate)
+        self._dirty = True
+
+    def visible_indexes(self, ):
+        """Return the indexes in column 0 for the visible rows and the lookahead rows
+
+        :returns: the indexes from top to bottom
+        :rtype: list of :class:`QtCore.QModelIndex`
+        :raises: None
+        """
+        view = self._view
+        model = view.model()
+        if model is None:
+            return []
+        height = view.viewport().height()
+        index = view.indexAt(QtCore.QPoint(1, 1))
+        if not index.isValid():
+            return []
+        index = index.sibling(index.row(), 0)
+        indexes = []
+        if hasattr(view, 'indexBelow'):
+            extra = self.lookahead
+            while index.isValid():
+                if view.visualRect(index).top() > height:
+                    if extra <= 0:
+                        break
+                    extra -= 1
+                indexes.append(index)
+                index = view.indexBelow(index)
+            return indexes
+        parent = index.parent()
+        last = view.indexAt(QtCore.QPoint(1, height - 1))
+        rowcount = model.rowCount(parent)
+        lastrow = last.row() if last.isValid() else rowcount - 1
+        lastrow = min(lastrow + self.lookahead, rowcount - 1)
+        return [model.index(row, 0, parent) for row in range(index.row(), lastrow + 1)]
+
+    def prefetch_visible(self, ):
+        """Call :meth:`TreeModel.prefetch` for the visible rows
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._dirty = False
+        indexes = self.visible_indexes()
+        model = self._view.model()
+        while model is not None and not hasattr(model, 'prefetch') and hasattr(model, 'mapToSource'):
+            indexes = [model.mapToSource(i) for i in indexes]
+            model = model.sourceModel()
+        if model is not None and hasattr(model, 'prefetch'):
+            model.prefetch(indexes)
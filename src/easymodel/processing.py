@@ -0,0 +1,256 @@
+"""This module provides a way to compute a column for a whole tree in other processes.
+
+Threads do not help for CPU heavy work because of the global interpreter lock.
+A :class:`ColumnComputation` traverses a :class:`TreeModel`, collects the
+:meth:`TreeItem.internal_data` of the items and sends them in chunks to a
+:class:`concurrent.futures.ProcessPoolExecutor`. The function and the internal data
+have to be picklable. Results of a chunk are written back with :meth:`TreeItem.set_data`
+in the GUI thread and the views get notified once per chunk::
+
+  def checksum(payload):
+      return hashlib.md5(payload[2]).hexdigest()
+
+  computation = easymodel.ColumnComputation(model, checksum, column=3)
+  computation.progress.connect(progressbar.setValue)
+  computation.start()
+
+On python 2 the ``futures`` backport is needed for the default executor.
+"""
+from PySide import QtCore
+
+__all__ = ['ColumnComputation']
+
+
+def _compute_chunk(func, payloads):
+    """Call func for every payload
+
+    This runs in the worker process.
+
+    :param func: the picklable function
+    :type func: callable
+    :param payloads: the internal data of the items
+    :type payloads: list
+    :returns: the results
+    :rtype: list
+    :raises: None
+    """
+    return [func(p) for p in payloads]
+
+
+class ColumnComputation(QtCore.QObject):
+    """Computes the values of a column for all items of a model in a process pool
+
+    Each value is computed by calling the function with the internal data of an item.
+    By default the result is written back with :meth:`TreeItem.set_data`
+    using :data:`QtCore.Qt.EditRole`. Pass a ``store`` function to change that.
+    The views get notified about the changed column of the stored items in any case.
+    """
+
+    progress = QtCore.Signal(int, int)
+    """This signal is emitted with the number of finished items and the total number of items."""
+    finished = QtCore.Signal()
+    """This signal is emitted when all chunks are done or when the computation was cancelled."""
+    failed = QtCore.Signal(object)
+    """This signal is emitted with the exception when a chunk failed. The other chunks continue."""
+
+    _chunk_done = QtCore.Signal(object)
+
+    def __init__(self, model, func, column, chunksize=100, executor=None,
+                 accept=None, store=None, parent=None):
+        """Initialize a new computation
+
+        :param model: the model with the items
+        :type model: :class:`TreeModel`
+        :param func: a picklable function that gets the internal data of an item
+                     and returns the value for the column.
+        :type func: callable
+        :param column: the column for the values
+        :type column: :class:`int`
+        :param chunksize: the number of items that are sent to a process at once
+        :type chunksize: :class:`int`
+        :param executor: the executor to use. If None, create a
+                         :class:`concurrent.futures.ProcessPoolExecutor` and shut it down when finished.
+        :type executor: :class:`concurrent.futures.Executor` | None
+        :param accept: a function that returns True for items that should be computed.
+                       If None, compute all items except the root.
+        :type accept: callable | None
+        :param store: a function that gets an item and the computed value and stores it.
+        :type store: callable | None
+        :param parent: the parent object
+        :type parent: :class:`QtCore.QObject`
+        :raises: None
+        """
+        super(ColumnComputation, self).__init__(parent)
+        self._model = model
+        self._func = func
+        self._column = column
+        self._chunksize = max(1, chunksize)
+        self._executor = executor
+        self._ownexecutor = executor is None
+        self._accept = accept
+        self._store = store or self._default_store
+        self._notify = store is not None
+        """True, if the store function does not notify the models itself"""
+        self._futures = []
+        self._pending = 0
+        self._done = 0
+        self._total = 0
+        self._cancelled = False
+        self._run = 0
+        """The number of the current run, to ignore chunks of a previous run"""
+        self._chunk_done.connect(self._on_chunk_done, QtCore.Qt.QueuedConnection)
+
+    def _default_store(self, item, value):
+        """Store the value with :meth:`TreeItem.set_data` and :data:`QtCore.Qt.EditRole`
+
+        :param item: the item
+        :type item: :class:`TreeItem`
+        :param value: the computed value
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        item.set_data(self._column, value, QtCore.Qt.EditRole)
+
+    def _collect(self, ):
+        """Return all items of the model that should be computed
+
+        :returns: the items in depth-first order
+        :rtype: list of :class:`TreeItem`
+        :raises: None
+        """
+        items = []
+        stack = list(reversed(self._model.root.childItems))
+        while stack:
+            item = stack.pop()
+            stack.extend(reversed(item.childItems))
+            if item.itemdata() is None:
+                continue
+            if self._accept is None or self._accept(item):
+                items.append(item)
+        return items
+
+    def start(self, ):
+        """Traverse the model and submit the chunks to the executor
+
+        A computation can be started again after it finished or was cancelled.
+        Chunks of the previous run are ignored then.
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._run += 1
+        self._cancelled = False
+        self._futures = []
+        self._pending = 0
+        items = self._collect()
+        self._total = len(items)
+        self._done = 0
+        if not items:
+            self._finish()
+            return
+        if self._executor is None:
+            from concurrent import futures
+            self._executor = futures.ProcessPoolExecutor()
+        for start in range(0, len(items), self._chunksize):
+            chunk = items[start:start + self._chunksize]
+            payloads = [item.internal_data() for item in chunk]
+            future = self._executor.submit(_compute_chunk, self._func, payloads)
+            future.items = chunk
+            future.run = self._run
+            self._pending += 1
+            self._futures.append(future)
+            future.add_done_callback(self._chunk_done.emit)
+
+    def cancel(self, ):
+        """Cancel all chunks that have not started yet and ignore running ones
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._cancelled = True
+        for future in self._futures:
+            future.cancel()
+
+    def is_cancelled(self, ):
+        """Return True if the computation was cancelled
+
+        :returns: True, if cancelled
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        return self._cancelled
+
+    def is_running(self, ):
+        """Return True if there are chunks that are not delivered yet
+
+        :returns: True, if running
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        return self._pending > 0
+
+    def _on_chunk_done(self, future):
+        """Store the results of the chunk and notify the model in the GUI thread
+
+        :param future: the finished future
+        :type future: :class:`concurrent.futures.Future`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if future.run != self._run:
+            return
+        self._pending -= 1
+        if not self._cancelled and not future.cancelled():
+            error = future.exception()
+            if error is not None:
+                self.failed.emit(error)
+            else:
+                self._store_chunk(future.items, future.result())
+                self._done += len(future.items)
+                self.progress.emit(self._done, self._total)
+        if not self._pending:
+            self._finish()
+
+    def _store_chunk(self, items, values):
+        """Store the values of a chunk and notify every model once
+
+        :param items: the items of the chunk
+        :type items: list of :class:`TreeItem`
+        :param values: the computed values
+        :type values: list
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        models = self._model.root.get_models() or [self._model]
+        for model in models:
+            model.hold_updates()
+        try:
+            changes = []
+            for item, value in zip(items, values):
+                self._store(item, value)
+                if self._notify and self._model in item.get_models():
+                    changes.append((item, self._column, self._column))
+            if changes:
+                for model in models:
+                    model.items_data_changed(changes)
+        finally:
+            for model in models:
+                model.release_updates()
+
+    def _finish(self, ):
+        """Release the executor if it was created by this computation and emit finished
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._futures = []
+        if self._ownexecutor and self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self.finished.emit()
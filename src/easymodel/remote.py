@@ -0,0 +1,586 @@
+"""This module provides a server and a client model to browse a tree from another process.
+
+A backend process owns the :class:`TreeItem` hierarchy and serves it with a :class:`TreeServer`.
+GUI processes connect a :class:`RemoteTreeModel`, which loads children and data in pages
+when a view asks for them and keeps them in least recently used caches::
+
+  # backend process
+  server = easymodel.TreeServer(root, address='/tmp/tree.sock', family='AF_UNIX')
+  server.start()
+  with server.lock:
+      # change the hierarchy while no request is answered
+      root.child(0).add_child(item)
+
+  # gui process
+  model = easymodel.RemoteTreeModel('/tmp/tree.sock')
+  view.setModel(model)
+
+The server can also answer a single :mod:`multiprocessing` connection, e.g. one end of a
+:func:`multiprocessing.Pipe`, with :meth:`TreeServer.handle`.
+
+Items are identified by their :meth:`TreeItem.item_id`. Only the root has the id 0.
+Every message contains a list of calls, so the missing pages of a whole viewport
+are loaded with one round trip.
+See :meth:`RemoteTreeModel.prefetch`. The data is pickled, so it has to be picklable.
+If answering a batch fails, the exception is sent back and raised by :meth:`RemoteTreeModel.request`.
+
+The server does not notify clients about changes. Call :meth:`RemoteTreeModel.refresh`
+to load everything again.
+"""
+import threading
+from multiprocessing import connection as mpconnection
+
+from PySide import QtCore
+
+from easymodel.sqlmodel import _LRUCache
+from easymodel.treemodel import TreeItem
+
+__all__ = ['TreeServer', 'RemoteTreeModel']
+
+
+class TreeServer(object):
+    """Serves a :class:`TreeItem` hierarchy to :class:`RemoteTreeModel` clients
+
+    Every connection is answered in its own thread.
+    Hold :attr:`TreeServer.lock` while changing the hierarchy.
+    The root has the id 0.
+    """
+
+    def __init__(self, root, address=None, family=None, authkey=None):
+        """Initialize a new server for the given root
+
+        :param root: the root of the hierarchy
+        :type root: :class:`TreeItem`
+        :param address: the address to listen on. If None, :meth:`TreeServer.handle` has to be
+                        used with existing connections.
+        :type address: :class:`str` | :class:`tuple` | None
+        :param family: the socket family, e.g. ``'AF_UNIX'``. If None, it is deduced from the address.
+        :type family: :class:`str` | None
+        :param authkey: the key that clients have to authenticate with
+        :type authkey: :class:`bytes` | None
+        :raises: None
+        """
+        self._root = root
+        self.lock = threading.RLock()
+        """Held while a batch of calls is answered"""
+        self._listener = None
+        if address is not None:
+            self._listener = mpconnection.Listener(address, family, authkey=authkey)
+        self._closed = False
+
+    @property
+    def address(self, ):
+        """Return the address the server listens on
+
+        :returns: the address or None if the server does not listen
+        :rtype: :class:`str` | :class:`tuple` | None
+        :raises: None
+        """
+        if self._listener is not None:
+            return self._listener.address
+
+    def id_of_item(self, item):
+        """Return the id of the given item
+
+        :param item: an item of the hierarchy
+        :type item: :class:`TreeItem`
+        :returns: the id. 0 for the root.
+        :rtype: :class:`int`
+        :raises: None
+        """
+        if item is self._root:
+            return 0
+        return item.item_id()
+
+    def item_of_id(self, nodeid):
+        """Return the item with the given id
+
+        :param nodeid: the id
+        :type nodeid: :class:`int`
+        :returns: the item or None if the id is unknown or the item is not in the hierarchy anymore
+        :rtype: :class:`TreeItem` | None
+        :raises: None
+        """
+        if not nodeid:
+            return self._root
+        item = TreeItem.item_for_id(nodeid)
+        if item is None:
+            return
+        i = item
+        while i._parent is not None:
+            i = i._parent
+        if i is not self._root:
+            return
+        return item
+
+    def _values(self, item, roles):
+        """Return the data of all columns for the given roles
+
+        :param item: the item
+        :type item: :class:`TreeItem`
+        :param roles: the data roles
+        :type roles: list of :data:`QtCore.Qt.ItemDataRole`
+        :returns: one list with the data of every column per role
+        :rtype: list of list
+        :raises: None
+        """
+        columns = range(self._root.column_count())
+        return [[item.data(column, role) for column in columns] for role in roles]
+
+    def header(self, roles):
+        """Return the column count, the number of top level items and the header data
+
+        :param roles: the data roles
+        :type roles: list of :data:`QtCore.Qt.ItemDataRole`
+        :returns: the column count, the row count and the header data per role
+        :rtype: :class:`tuple`
+        :raises: None
+        """
+        root = self._root
+        return root.column_count(), root.child_count(), self._values(root, roles)
+
+    def page(self, parentid, start, count, roles):
+        """Return the ids, child counts and data of some children of the given parent
+
+        :param parentid: the id of the parent
+        :type parentid: :class:`int`
+        :param start: the first row
+        :type start: :class:`int`
+        :param count: the maximum number of rows
+        :type count: :class:`int`
+        :param roles: the data roles
+        :type roles: list of :data:`QtCore.Qt.ItemDataRole`
+        :returns: a tuple of id, child count and data for every row or None if the parent is unknown
+        :rtype: list of :class:`tuple` | None
+        :raises: None
+        """
+        parent = self.item_of_id(parentid)
+        if parent is None:
+            return
+        return [(self.id_of_item(item), item.child_count(), self._values(item, roles))
+                for item in parent.childItems[start:start + count]]
+
+    def node(self, nodeid, roles):
+        """Return the parent id, row, child count and data of the given item
+
+        :param nodeid: the id of the item
+        :type nodeid: :class:`int`
+        :param roles: the data roles
+        :type roles: list of :data:`QtCore.Qt.ItemDataRole`
+        :returns: a tuple of parent id, row, child count and data or None if the item is unknown
+        :rtype: :class:`tuple` | None
+        :raises: None
+        """
+        item = self.item_of_id(nodeid)
+        if item is None or item is self._root:
+            return
+        parent = item.parent()
+        return self.id_of_item(parent), item.row(), item.child_count(), self._values(item, roles)
+
+    def data(self, nodeid, column, role):
+        """Return the data of the given item
+
+        :param nodeid: the id of the item
+        :type nodeid: :class:`int`
+        :param column: the column
+        :type column: :class:`int`
+        :param role: the data role
+        :type role: :data:`QtCore.Qt.ItemDataRole`
+        :returns: the data or None if the item is unknown
+        :raises: None
+        """
+        item = self.item_of_id(nodeid)
+        if item is not None:
+            return item.data(column, role)
+
+    def answer(self, calls):
+        """Answer a batch of calls
+
+        Every call is a tuple of the name of a method and its arguments.
+        Supported are ``header``, ``page``, ``node`` and ``data``.
+
+        :param calls: the calls
+        :type calls: list of :class:`tuple`
+        :returns: the results in the same order
+        :rtype: list
+        :raises: :class:`ValueError` for unknown methods
+        """
+        methods = {'header': self.header, 'page': self.page, 'node': self.node, 'data': self.data}
+        results = []
+        with self.lock:
+            for call in calls:
+                method = methods.get(call[0])
+                if method is None:
+                    raise ValueError("Unknown call %r." % (call[0],))
+                results.append(method(*call[1:]))
+        return results
+
+    def handle(self, conn):
+        """Answer the requests of the given connection until it gets closed
+
+        Every reply is a tuple of the exception that answering raised or None and the results.
+
+        :param conn: the connection to a client
+        :type conn: :class:`multiprocessing.connection.Connection`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        try:
+            while True:
+                try:
+                    calls = conn.recv()
+                except (EOFError, OSError, IOError):
+                    break
+                try:
+                    reply = (None, self.answer(calls))
+                except Exception as e:
+                    reply = (e, None)
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError, IOError):
+                    break
+                except Exception as e:
+                    # the reply could not be pickled
+                    conn.send((RuntimeError("Could not send the answer: %r" % (e,)), None))
+        finally:
+            conn.close()
+
+    def serve_forever(self, ):
+        """Accept connections and answer each one in a new thread until the server gets closed
+
+        :returns: None
+        :rtype: None
+        :raises: :class:`ValueError` if the server has no address
+        """
+        if self._listener is None:
+            raise ValueError("The server has no address to listen on.")
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except (EOFError, OSError, IOError):
+                if self._closed:
+                    break
+                continue
+            thread = threading.Thread(target=self.handle, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def start(self, ):
+        """Call :meth:`TreeServer.serve_forever` in a background thread
+
+        :returns: the thread
+        :rtype: :class:`threading.Thread`
+        :raises: None
+        """
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def close(self, ):
+        """Stop accepting connections
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._closed = True
+        if self._listener is not None:
+            self._listener.close()
+
+
+class RemoteTreeModel(QtCore.QAbstractItemModel):
+    """A read-only tree model for the hierarchy of a :class:`TreeServer`
+
+    Indexes store the id of their item as internal id.
+    Children are requested in pages. The data of the configured roles
+    is sent along with the pages, so views do not wait for single cells.
+    """
+
+    def __init__(self, connection, authkey=None, roles=None, pagesize=256, cachesize=10000, parent=None):
+        """Initialize a new model for the given server
+
+        :param connection: the address of the server or an open connection
+        :type connection: :class:`str` | :class:`tuple` | :class:`multiprocessing.connection.Connection`
+        :param authkey: the key to authenticate with, if an address is given
+        :type authkey: :class:`bytes` | None
+        :param roles: the data roles that are loaded. Other roles return None.
+                      If None, only :data:`QtCore.Qt.DisplayRole`.
+        :type roles: list of :data:`QtCore.Qt.ItemDataRole` | None
+        :param pagesize: the number of children that are loaded at once
+        :type pagesize: :class:`int`
+        :param cachesize: the maximum number of items that are kept in memory
+        :type cachesize: :class:`int`
+        :param parent: the parent object
+        :type parent: :class:`QtCore.QObject`
+        :raises: None
+        """
+        super(RemoteTreeModel, self).__init__(parent)
+        if not hasattr(connection, 'recv'):
+            connection = mpconnection.Client(connection, authkey=authkey)
+        self._connection = connection
+        self._roles = list(roles) if roles is not None else [QtCore.Qt.DisplayRole]
+        self._pagesize = pagesize
+        self._nodes = _LRUCache(cachesize)
+        """id -> [parent id, row, child count, data per role]"""
+        self._pages = _LRUCache(max(1, cachesize // pagesize))
+        """(parent id, page) -> list of ids"""
+        self._columncount, self._rowcount, self._headers = self.request([('header', self._roles)])[0]
+
+    def request(self, calls):
+        """Send a batch of calls to the server and return the results
+
+        See :meth:`TreeServer.answer`.
+
+        :param calls: the calls
+        :type calls: list of :class:`tuple`
+        :returns: the results in the same order
+        :rtype: list
+        :raises: :class:`EOFError` if the server closed the connection.
+                 The exception of the server if answering failed.
+        """
+        self._connection.send(calls)
+        error, results = self._connection.recv()
+        if error is not None:
+            raise error
+        return results
+
+    def close(self, ):
+        """Close the connection to the server
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._connection.close()
+
+    def refresh(self, ):
+        """Clear all caches and reset the model, e.g. after the hierarchy changed
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self.beginResetModel()
+        self._nodes.clear()
+        self._pages.clear()
+        self._columncount, self._rowcount, self._headers = self.request([('header', self._roles)])[0]
+        self.endResetModel()
+
+    def _load(self, pages, nodeids=()):
+        """Load the given pages and items with one request
+
+        :param pages: tuples of parent id and page number
+        :type pages: list of :class:`tuple`
+        :param nodeids: the ids of items
+        :type nodeids: list of :class:`int`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        calls = [('page', parentid, page * self._pagesize, self._pagesize, self._roles)
+                 for parentid, page in pages]
+        calls.extend(('node', nodeid, self._roles) for nodeid in nodeids)
+        results = self.request(calls)
+        for (parentid, page), records in zip(pages, results):
+            ids = []
+            row = page * self._pagesize
+            for nodeid, childcount, values in records or ():
+                self._nodes[nodeid] = [parentid, row, childcount, values]
+                ids.append(nodeid)
+                row += 1
+            self._pages[(parentid, page)] = ids
+        for nodeid, record in zip(nodeids, results[len(pages):]):
+            if record is not None:
+                self._nodes[nodeid] = list(record)
+
+    def _page(self, parentid, page):
+        """Return the ids of the given page of children
+
+        :param parentid: the id of the parent
+        :type parentid: :class:`int`
+        :param page: the page number
+        :type page: :class:`int`
+        :returns: the ids of the children in the page
+        :rtype: list of :class:`int`
+        :raises: None
+        """
+        ids = self._pages.get((parentid, page))
+        if ids is None:
+            self._load([(parentid, page)])
+            ids = self._pages.get((parentid, page))
+        return ids
+
+    def _node(self, nodeid):
+        """Return the cached information for the given id and load it if necessary
+
+        :param nodeid: the id of the item
+        :type nodeid: :class:`int`
+        :returns: the parent id, the row, the child count and the data per role
+                  or None if the server does not know the item anymore
+        :rtype: list | None
+        :raises: None
+        """
+        node = self._nodes.get(nodeid)
+        if node is None:
+            self._load([], [nodeid])
+            node = self._nodes.get(nodeid)
+        return node
+
+    def prefetch(self, indexes):
+        """Load the pages and items of the given indexes that are not cached with one request
+
+        See :class:`easymodel.ViewPrefetcher` for a helper that calls this for the visible rows of a view.
+
+        :param indexes: the indexes of the rows
+        :type indexes: iterable of :class:`QtCore.QModelIndex`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        pages = []
+        nodeids = []
+        for index in indexes:
+            if not index.isValid():
+                continue
+            nodeid = index.internalId()
+            node = self._nodes.get(nodeid)
+            if node is None:
+                if nodeid not in nodeids:
+                    nodeids.append(nodeid)
+                continue
+            key = (node[0], index.row() // self._pagesize)
+            if key not in self._pages and key not in pages:
+                pages.append(key)
+        if pages or nodeids:
+            self._load(pages, nodeids)
+
+    def index(self, row, column, parent=None):
+        """Return the index of the item in the model specified by the given row,
+        column and parent index.
+
+        :param row: the row of the item
+        :type row: int
+        :param column: the column for the item
+        :type column: int
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: the index of the item
+        :rtype: :class:`QtCore.QModelIndex`
+        :raises: None
+        """
+        if parent is None:
+            parent = QtCore.QModelIndex()
+        if not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+        ids = self._page(self.id_of_index(parent), row // self._pagesize)
+        pos = row % self._pagesize
+        if pos >= len(ids):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column, ids[pos])
+
+    def parent(self, index):
+        """Return the parent of the model item with the given index.
+
+        :param index: the index that you want to know the parent of
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: parent index
+        :rtype: :class:`QtCore.QModelIndex`
+        :raises: None
+        """
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        node = self._node(index.internalId())
+        if node is None or not node[0]:
+            return QtCore.QModelIndex()
+        parentnode = self._node(node[0])
+        if parentnode is None:
+            return QtCore.QModelIndex()
+        return self.createIndex(parentnode[1], 0, node[0])
+
+    def rowCount(self, parent=None):
+        """Return the number of rows under the given parent.
+
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: the row count
+        :rtype: int
+        :raises: None
+        """
+        if parent is None or not parent.isValid():
+            return self._rowcount
+        if parent.column() > 0:
+            return 0
+        node = self._node(parent.internalId())
+        return node[2] if node is not None else 0
+
+    def columnCount(self, parent=None):
+        """Return the number of columns
+
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: the column count
+        :rtype: int
+        :raises: None
+        """
+        return self._columncount
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        """Return the data stored under the given role for the item referred to by the index.
+
+        :param index: the index
+        :type index: :class:`QtCore.QModelIndex`
+        :param role: the data role
+        :type role: QtCore.Qt.ItemDataRole
+        :returns: the data for the loaded roles. None for other roles.
+        :raises: None
+        """
+        if not index.isValid() or role not in self._roles:
+            return
+        node = self._node(index.internalId())
+        if node is not None:
+            return node[3][self._roles.index(role)][index.column()]
+
+    def flags(self, index):
+        """Return the flags for the given index
+
+        :param index: the index to query
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: enabled and selectable for valid indexes
+        :rtype: QtCore.Qt.ItemFlags
+        :raises: None
+        """
+        if not index.isValid():
+            return QtCore.Qt.NoItemFlags
+        return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+
+    def headerData(self, section, orientation, role):
+        """Return the header data
+
+        :param section: the section in the header view
+        :type section: int
+        :param orientation: vertical or horizontal orientation
+        :type orientation: :data:`QtCore.Qt.Vertical` | :data:`QtCore.Qt.Horizontal`
+        :param role: the data role.
+        :type role: :data:`QtCore.Qt.ItemDataRole`
+        :returns: data for the header
+        :raises: None
+        """
+        if orientation == QtCore.Qt.Horizontal and role in self._roles and section < self._columncount:
+            d = self._headers[self._roles.index(role)][section]
+            if d is not None or role != QtCore.Qt.DisplayRole:
+                return d
+        if role == QtCore.Qt.DisplayRole:
+            return str(section + 1)
+
+    def id_of_index(self, index):
+        """Return the id of the item of the given index on the server
+
+        :param index: the index
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: the id. 0 for an invalid index.
+        :rtype: :class:`int`
+        :raises: None
+        """
+        return index.internalId() if index.isValid() else 0
@@ -0,0 +1,680 @@
+"""This module provides a compact binary format for saving and loading :class:`TreeItem` hierarchies.
+
+Pickling tree items recurses through the whole hierarchy and stores a lot of
+overhead per item. A snapshot stores the structure as flat integer arrays
+and the values of all columns in one blob. Items are stored in breadth-first order,
+so the children of every item are consecutive. The arrays are written and read
+in bulk::
+
+  easymodel.save_snapshot(model.root, 'tree.snap')
+  model = easymodel.TreeModel(easymodel.load_snapshot('tree.snap'))
+
+Trees that never change can also be shown without loading them. A :class:`SnapshotModel`
+maps the file into memory and reads the rows directly from it. Several processes
+that show the same file share its pages::
+
+  model = easymodel.SnapshotModel('tree.snap')
+
+The item data has to implement :meth:`ItemData.serialize` and :meth:`ItemData.deserialize`.
+:class:`ListItemData` does. The classes are stored by their import path and
+get imported when loading.
+
+The file starts with a header, followed by the class names and these arrays
+of little-endian 32 bit integers, each padded to 8 bytes:
+
+  :parents: the index of the parent of every item. -1 for the root.
+  :first children: the index of the first child of every item
+  :child counts: the number of children of every item
+  :classes: the index of the item data class of every item. -1 if the item has no data.
+  :cell starts: the index of the first cell of every item and the total number of cells
+  :cell offsets: the offset of every cell in the blob and the size of the blob
+
+Every cell in the blob starts with a byte for the type, followed by the value.
+"""
+import array
+import gc
+import importlib
+import mmap
+import numbers
+import struct
+import sys
+
+from PySide import QtCore
+
+from easymodel.treemodel import INTERNAL_OBJ_ROLE, TreeItem
+
+__all__ = ['save_snapshot', 'load_snapshot', 'SnapshotModel']
+
+
+MAGIC = b'EMSNAP\x00\x00'
+VERSION = 1
+_HEADER = struct.Struct('<8sIIII')
+"""magic, version, number of items, number of cells, length of the class names"""
+
+_NONE, _FALSE, _TRUE, _INT, _FLOAT, _TEXT, _BYTES, _BIGINT = range(8)
+_TAG = struct.Struct('<B')
+_INT64 = struct.Struct('<q')
+_FLOAT64 = struct.Struct('<d')
+_TEXTTYPE = type(u'')
+_CAST = sys.version_info[0] >= 3 and sys.byteorder == 'little'
+"""True, if integer sections can be used as views on the mapped memory"""
+
+
+def _view(data, start, end):
+    """Return a read-only view on a part of the data without copying it
+
+    Python 2 cannot create a memoryview of a mmap, so a buffer is used there.
+
+    :param data: the data, e.g. a mmap
+    :type data: :class:`mmap.mmap`
+    :param start: the start offset
+    :type start: :class:`int`
+    :param end: the end offset
+    :type end: :class:`int`
+    :returns: the view
+    :rtype: :class:`memoryview` | :class:`buffer`
+    :raises: None
+    """
+    if sys.version_info[0] < 3:
+        return buffer(data, start, end - start)  # noqa: F821
+    return memoryview(data)[start:end]
+
+
+def _align(pos):
+    """Return the next multiple of 8
+
+    :param pos: the position
+    :type pos: :class:`int`
+    :returns: the aligned position
+    :rtype: :class:`int`
+    :raises: None
+    """
+    return (pos + 7) & ~7
+
+
+def _layout(count, cellcount, classlength):
+    """Return the offsets of the sections of a snapshot
+
+    :param count: the number of items
+    :type count: :class:`int`
+    :param cellcount: the number of cells
+    :type cellcount: :class:`int`
+    :param classlength: the length of the class names in bytes
+    :type classlength: :class:`int`
+    :returns: the section names mapped to their offset and length in bytes
+    :rtype: :class:`dict`
+    :raises: None
+    """
+    sections = [('classes', classlength),
+                ('parents', 4 * count),
+                ('firstchildren', 4 * count),
+                ('childcounts', 4 * count),
+                ('classindexes', 4 * count),
+                ('cellstarts', 4 * (count + 1)),
+                ('celloffsets', 4 * (cellcount + 1))]
+    layout = {}
+    pos = _HEADER.size
+    for name, length in sections:
+        layout[name] = (pos, length)
+        pos = _align(pos + length)
+    layout['blob'] = (pos, None)
+    return layout
+
+
+def _int_array(data, typecode='i'):
+    """Return an array of 32 bit integers from little-endian bytes
+
+    :param data: the bytes
+    :type data: :class:`bytes`
+    :param typecode: ``'i'`` for signed or ``'I'`` for unsigned integers
+    :type typecode: :class:`str`
+    :returns: the array
+    :rtype: :class:`array.array`
+    :raises: None
+    """
+    a = array.array(typecode)
+    getattr(a, 'frombytes', getattr(a, 'fromstring', None))(data)
+    if sys.byteorder == 'big':
+        a.byteswap()
+    return a
+
+
+def _array_bytes(a):
+    """Return the little-endian bytes of the array
+
+    :param a: the array
+    :type a: :class:`array.array`
+    :returns: the bytes
+    :rtype: :class:`bytes`
+    :raises: None
+    """
+    if sys.byteorder == 'big':
+        a = array.array(a.typecode, a)
+        a.byteswap()
+    return getattr(a, 'tobytes', getattr(a, 'tostring', None))()
+
+
+def _encode_int(value):
+    """Return the bytes for an integer cell
+
+    :param value: the integer
+    :type value: :class:`int`
+    :returns: the type byte followed by the value
+    :rtype: :class:`bytes`
+    :raises: None
+    """
+    if -2 ** 63 <= value < 2 ** 63:
+        return _INT_TAG + _INT64.pack(value)
+    return _TAG.pack(_BIGINT) + str(value).encode('ascii')
+
+
+_INT_TAG = _TAG.pack(_INT)
+_ENCODERS = {
+    type(None): lambda value: _TAG.pack(_NONE),
+    bool: lambda value: _TAG.pack(_TRUE if value else _FALSE),
+    int: _encode_int,
+    float: lambda value: _TAG.pack(_FLOAT) + _FLOAT64.pack(value),
+    _TEXTTYPE: lambda value: _TAG.pack(_TEXT) + value.encode('utf-8'),
+    bytes: lambda value: _TAG.pack(_BYTES) + value,
+}
+"""The exact type of a value mapped to the function that encodes it"""
+
+
+def _encode(value):
+    """Return the bytes for a cell
+
+    :param value: the value
+    :returns: the type byte followed by the value
+    :rtype: :class:`bytes`
+    :raises: :class:`TypeError` if the type is not supported
+    """
+    encoder = _ENCODERS.get(type(value))
+    if encoder is not None:
+        return encoder(value)
+    # subclasses of the supported types
+    if isinstance(value, bool):
+        return _ENCODERS[bool](value)
+    if isinstance(value, numbers.Integral):
+        return _encode_int(value)
+    for cls in (float, _TEXTTYPE, bytes):
+        if isinstance(value, cls):
+            return _ENCODERS[cls](value)
+    raise TypeError("Values of type %s can not be stored in a snapshot." % type(value).__name__)
+
+
+def _decode_cells(buf, offsets, first, last, base=0):
+    """Return the values of the cells from first up to but not including last
+
+    :param buf: the buffer with the cells
+    :type buf: :class:`bytes` | :class:`mmap.mmap`
+    :param offsets: the offsets of the cells in the buffer
+    :type offsets: sequence of :class:`int`
+    :param first: the index of the first cell
+    :type first: :class:`int`
+    :param last: the index after the last cell
+    :type last: :class:`int`
+    :param base: the position of the blob in the buffer
+    :type base: :class:`int`
+    :returns: the values
+    :rtype: list
+    :raises: :class:`ValueError` if a type byte is unknown
+    """
+    values = []
+    append = values.append
+    tagof = _TAG.unpack_from
+    intof = _INT64.unpack_from
+    for c in range(first, last):
+        start = base + offsets[c]
+        tag = tagof(buf, start)[0]
+        if tag == _INT:
+            append(intof(buf, start + 1)[0])
+        elif tag == _TEXT:
+            append(buf[start + 1:base + offsets[c + 1]].decode('utf-8'))
+        elif tag == _FLOAT:
+            append(_FLOAT64.unpack_from(buf, start + 1)[0])
+        elif tag == _NONE:
+            append(None)
+        elif tag == _TRUE or tag == _FALSE:
+            append(tag == _TRUE)
+        elif tag == _BYTES:
+            append(buf[start + 1:base + offsets[c + 1]])
+        elif tag == _BIGINT:
+            append(int(buf[start + 1:base + offsets[c + 1]].decode('ascii')))
+        else:
+            raise ValueError("Unknown cell type %s." % tag)
+    return values
+
+
+def _class_name(cls):
+    """Return the import path of the class
+
+    :param cls: the class
+    :type cls: :class:`type`
+    :returns: the module and the name of the class separated by a colon
+    :rtype: :class:`str`
+    :raises: None
+    """
+    return '%s:%s' % (cls.__module__, cls.__name__)
+
+
+def _import_class(name):
+    """Import and return the class with the given import path
+
+    :param name: the module and the name of the class separated by a colon
+    :type name: :class:`str`
+    :returns: the class
+    :rtype: :class:`type`
+    :raises: :class:`ImportError`, :class:`AttributeError`
+    """
+    modulename, clsname = name.split(':')
+    module = sys.modules.get(modulename) or importlib.import_module(modulename)
+    return getattr(module, clsname)
+
+
+def _read_header(data):
+    """Check the header and return the number of items, cells and the class names
+
+    :param data: the snapshot
+    :type data: :class:`bytes` | :class:`mmap.mmap`
+    :returns: the number of items, the number of cells, the class names and the layout
+    :rtype: :class:`tuple`
+    :raises: :class:`ValueError` if the data is not a snapshot
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("Not a snapshot.")
+    magic, version, count, cellcount, classlength = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a snapshot.")
+    if version != VERSION:
+        raise ValueError("Unsupported snapshot version %s." % version)
+    layout = _layout(count, cellcount, classlength)
+    pos, length = layout['classes']
+    names = bytes(data[pos:pos + length]).decode('utf-8')
+    names = names.split('\n') if names else []
+    return count, cellcount, names, layout
+
+
+def save_snapshot(root, f):
+    """Save the hierarchy under and including root
+
+    :param root: the top item. If it is the root of a model, the headers are saved as well.
+    :type root: :class:`TreeItem`
+    :param f: a path or a file opened for writing bytes
+    :type f: :class:`str` | file
+    :returns: None
+    :rtype: None
+    :raises: :class:`TypeError` if a value can not be stored,
+             :class:`NotImplementedError` if an item data can not be serialized
+    """
+    items = [root]
+    parents = array.array('i', [-1])
+    firstchildren = array.array('i')
+    childcounts = array.array('i')
+    i = 0
+    while i < len(items):
+        children = items[i].childItems
+        firstchildren.append(len(items))
+        childcounts.append(len(children))
+        items.extend(children)
+        parents.extend([i] * len(children))
+        i += 1
+
+    classes = {}
+    classindexes = array.array('i')
+    cellstarts = array.array('i', [0])
+    celloffsets = array.array('I', [0])
+    cells = []
+    encode = _encode
+    for item in items:
+        data = item.itemdata()
+        if data is None:
+            classindexes.append(-1)
+        else:
+            cls = type(data)
+            classindexes.append(classes.setdefault(cls, len(classes)))
+            cells.extend([encode(value) for value in data.serialize()])
+        cellstarts.append(len(cells))
+    size = 0
+    for cell in cells:
+        size += len(cell)
+        celloffsets.append(size)
+    if size >= 2 ** 32:
+        raise ValueError("The values are too big for a snapshot.")
+
+    names = [None] * len(classes)
+    for cls, index in classes.items():
+        names[index] = _class_name(cls)
+    names = '\n'.join(names).encode('utf-8')
+
+    layout = _layout(len(items), len(cells), len(names))
+    sections = [('classes', names),
+                ('parents', _array_bytes(parents)),
+                ('firstchildren', _array_bytes(firstchildren)),
+                ('childcounts', _array_bytes(childcounts)),
+                ('classindexes', _array_bytes(classindexes)),
+                ('cellstarts', _array_bytes(cellstarts)),
+                ('celloffsets', _array_bytes(celloffsets))]
+    chunks = [_HEADER.pack(MAGIC, VERSION, len(items), len(cells), len(names))]
+    pos = _HEADER.size
+    for name, data in sections:
+        offset = layout[name][0]
+        chunks.append(b'\x00' * (offset - pos))
+        chunks.append(data)
+        pos = offset + len(data)
+    chunks.append(b'\x00' * (layout['blob'][0] - pos))
+    chunks.extend(cells)
+
+    if hasattr(f, 'write'):
+        f.write(b''.join(chunks))
+    else:
+        with open(f, 'wb') as fobj:
+            fobj.write(b''.join(chunks))
+
+
+def load_snapshot(f):
+    """Load a hierarchy saved with :func:`save_snapshot`
+
+    :param f: a path or a file opened for reading bytes
+    :type f: :class:`str` | file
+    :returns: the root item. It is not part of a model yet.
+    :rtype: :class:`TreeItem`
+    :raises: :class:`ValueError` if the data is not a snapshot
+    """
+    if hasattr(f, 'read'):
+        data = f.read()
+    else:
+        with open(f, 'rb') as fobj:
+            data = fobj.read()
+    count, cellcount, names, layout = _read_header(data)
+    classes = [_import_class(name) for name in names]
+
+    def section(name, typecode='i'):
+        pos, length = layout[name]
+        return _int_array(data[pos:pos + length], typecode)
+
+    parents = section('parents')
+    classindexes = section('classindexes')
+    cellstarts = section('cellstarts')
+    celloffsets = section('celloffsets', 'I')
+    blob = layout['blob'][0]
+
+    # the items reference each other, so the cyclic garbage collector
+    # would run over and over again while they are created
+    gcenabled = gc.isenabled()
+    gc.disable()
+    try:
+        items = []
+        append = items.append
+        for i in range(count):
+            classindex = classindexes[i]
+            if classindex < 0:
+                itemdata = None
+            else:
+                itemdata = classes[classindex].deserialize(
+                    _decode_cells(data, celloffsets, cellstarts[i], cellstarts[i + 1], blob))
+            item = TreeItem(itemdata)
+            parent = parents[i]
+            if parent >= 0:
+                parentitem = items[parent]
+                item._parent = parentitem
+                parentitem.childItems.append(item)
+            append(item)
+    finally:
+        if gcenabled:
+            gc.enable()
+    return items[0] if items else None
+
+
+class SnapshotModel(QtCore.QAbstractItemModel):
+    """A read-only tree model that serves a snapshot file directly from memory mapped pages
+
+    No python objects are created per row. Indexes store the position of their
+    item in the snapshot as internal id. Cells are only decoded when they are queried.
+    The root of the snapshot provides the headers, like the root of a :class:`TreeModel`.
+    For :data:`QtCore.Qt.DisplayRole` and :data:`QtCore.Qt.EditRole` the stored
+    values are returned the way :class:`ListItemData` returns them.
+    """
+
+    def __init__(self, path, parent=None):
+        """Initialize a new model for the snapshot at path
+
+        :param path: the path to a file written by :func:`save_snapshot`
+        :type path: :class:`str`
+        :param parent: the parent object
+        :type parent: :class:`QtCore.QObject`
+        :raises: :class:`ValueError` if the file is not a snapshot
+        """
+        super(SnapshotModel, self).__init__(parent)
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            count, cellcount, names, layout = _read_header(self._mmap)
+        except ValueError:
+            self._mmap.close()
+            raise
+        self._count = count
+        self._parents = self._section(layout, 'parents')
+        self._firstchildren = self._section(layout, 'firstchildren')
+        self._childcounts = self._section(layout, 'childcounts')
+        self._cellstarts = self._section(layout, 'cellstarts')
+        self._celloffsets = self._section(layout, 'celloffsets', 'I')
+        self._blob = layout['blob'][0]
+        self._columncount = self._cells(0)[1] - self._cells(0)[0]
+        if not self._columncount and count > 1:
+            self._columncount = self._cells(1)[1] - self._cells(1)[0]
+
+    def _section(self, layout, name, typecode='i'):
+        """Return the integers of a section of the snapshot
+
+        On little-endian platforms with python 3 this is a view on the mapped memory.
+        Otherwise the integers are copied.
+
+        :param layout: the layout of the snapshot
+        :type layout: :class:`dict`
+        :param name: the name of the section
+        :type name: :class:`str`
+        :param typecode: ``'i'`` for signed or ``'I'`` for unsigned integers
+        :type typecode: :class:`str`
+        :returns: the integers
+        :rtype: :class:`memoryview` | :class:`array.array`
+        :raises: None
+        """
+        pos, length = layout[name]
+        if _CAST:
+            return memoryview(self._mmap)[pos:pos + length].cast(typecode)
+        return _int_array(self._mmap[pos:pos + length], typecode)
+
+    def close(self, ):
+        """Unmap the file. The model must not be used afterwards.
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        for view in (self._parents, self._firstchildren, self._childcounts,
+                     self._cellstarts, self._celloffsets):
+            if hasattr(view, 'release'):
+                view.release()
+        self._mmap.close()
+
+    def _cells(self, i):
+        """Return the index of the first cell of the item and the index after its last cell
+
+        :param i: the position of the item in the snapshot
+        :type i: :class:`int`
+        :returns: the cell range
+        :rtype: :class:`tuple`
+        :raises: None
+        """
+        return self._cellstarts[i], self._cellstarts[i + 1]
+
+    def _value(self, i, column):
+        """Decode and return the value of the given cell
+
+        :param i: the position of the item in the snapshot
+        :type i: :class:`int`
+        :param column: the column
+        :type column: :class:`int`
+        :returns: the value or None if the item has no such column
+        :raises: None
+        """
+        first, last = self._cells(i)
+        cell = first + column
+        if column < 0 or cell >= last:
+            return None
+        return _decode_cells(self._mmap, self._celloffsets, cell, cell + 1, self._blob)[0]
+
+    def cell_buffer(self, index):
+        """Return the stored bytes of the cell of the given index without copying them
+
+        The first byte is the type of the value, the rest is the value itself.
+        Strings are utf-8 encoded, integers and floats are little-endian 64 bit values.
+        The view is only valid until the model is closed.
+
+        :param index: the index
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: a view on the mapped memory or None if there is no cell.
+                  On python 2 this is a :class:`buffer`.
+        :rtype: :class:`memoryview` | :class:`buffer` | None
+        :raises: None
+        """
+        i = index.internalId() if index.isValid() else 0
+        first, last = self._cells(i)
+        cell = first + index.column()
+        if index.column() < 0 or cell >= last:
+            return None
+        start = self._blob + self._celloffsets[cell]
+        end = self._blob + self._celloffsets[cell + 1]
+        return _view(self._mmap, start, end)
+
+    def row_values(self, index):
+        """Return all values of the row of the given index
+
+        :param index: the index
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: the values
+        :rtype: list
+        :raises: None
+        """
+        i = index.internalId() if index.isValid() else 0
+        first, last = self._cells(i)
+        return _decode_cells(self._mmap, self._celloffsets, first, last, self._blob)
+
+    def index(self, row, column, parent=None):
+        """Return the index of the item in the model specified by the given row,
+        column and parent index.
+
+        :param row: the row of the item
+        :type row: int
+        :param column: the column for the item
+        :type column: int
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: the index of the item
+        :rtype: :class:`QtCore.QModelIndex`
+        :raises: None
+        """
+        if parent is None:
+            parent = QtCore.QModelIndex()
+        if not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+        p = parent.internalId() if parent.isValid() else 0
+        return self.createIndex(row, column, self._firstchildren[p] + row)
+
+    def parent(self, index):
+        """Return the parent of the model item with the given index.
+
+        :param index: the index that you want to know the parent of
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: parent index
+        :rtype: :class:`QtCore.QModelIndex`
+        :raises: None
+        """
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        p = self._parents[index.internalId()]
+        if p <= 0:
+            return QtCore.QModelIndex()
+        return self.createIndex(p - self._firstchildren[self._parents[p]], 0, p)
+
+    def rowCount(self, parent=None):
+        """Return the number of rows under the given parent.
+
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: the row count
+        :rtype: int
+        :raises: None
+        """
+        if parent is None or not parent.isValid():
+            return self._childcounts[0] if self._count else 0
+        if parent.column() > 0:
+            return 0
+        return self._childcounts[parent.internalId()]
+
+    def columnCount(self, parent=None):
+        """Return the number of columns of the root
+
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: the column count
+        :rtype: int
+        :raises: None
+        """
+        return self._columncount
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        """Return the data stored under the given role for the item referred to by the index.
+
+        :param index: the index
+        :type index: :class:`QtCore.QModelIndex`
+        :param role: the data role
+        :type role: QtCore.Qt.ItemDataRole
+        :returns: the value for display and edit role, all values of the row for
+                  :data:`INTERNAL_OBJ_ROLE`
+        :raises: None
+        """
+        if not index.isValid():
+            return
+        if role == INTERNAL_OBJ_ROLE:
+            return self.row_values(index)
+        if role != QtCore.Qt.DisplayRole and role != QtCore.Qt.EditRole:
+            return
+        value = self._value(index.internalId(), index.column())
+        if value is None or isinstance(value, float) or \
+           (isinstance(value, int) and not isinstance(value, bool)):
+            return value
+        return str(value)
+
+    def flags(self, index):
+        """Return enabled and selectable for valid indexes
+
+        :param index: the index to query
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: the flags
+        :rtype: QtCore.Qt.ItemFlags
+        :raises: None
+        """
+        if not index.isValid():
+            return QtCore.Qt.NoItemFlags
+        return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+
+    def headerData(self, section, orientation, role):
+        """Return the header data
+
+        :param section: the section in the header view
+        :type section: int
+        :param orientation: vertical or horizontal orientation
+        :type orientation: :data:`QtCore.Qt.Vertical` | :data:`QtCore.Qt.Horizontal`
+        :param role: the data role.
+        :type role: :data:`QtCore.Qt.ItemDataRole`
+        :returns: data for the header
+        :raises: None
+        """
+        if role != QtCore.Qt.DisplayRole:
+            return
+        if orientation == QtCore.Qt.Horizontal and self._count:
+            value = self._value(0, section)
+            if value is not None:
+                return str(value)
+        return str(section + 1)
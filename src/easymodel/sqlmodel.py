@@ -0,0 +1,375 @@
+"""This module provides a tree model that serves its data directly from SQLite.
+
+The hierarchy is stored as an adjacency list. Every row of the table has a unique id
+and the id of its parent. Top level rows have NULL as parent::
+
+  CREATE TABLE nodes (id INTEGER PRIMARY KEY, parent_id INTEGER, name TEXT, size INTEGER);
+  CREATE INDEX nodes_parent ON nodes (parent_id, id);
+
+The :class:`SqlTreeModel` does not create :class:`TreeItem` instances.
+Children are loaded in pages when a view asks for them and kept in
+least recently used caches. So only the parts of the tree that are viewed
+exist in python::
+
+  model = easymodel.SqlTreeModel('tree.db', 'nodes', ['name', 'size'],
+                                 headers=['Name', 'Size'])
+  view.setModel(model)
+
+Pages are queried with the key of the last row of the previous page if that one is
+cached (keyset pagination) and with an offset otherwise.
+Make sure there is an index on the parent and order column.
+"""
+import collections
+import sqlite3
+
+from PySide import QtCore
+
+__all__ = ['SqlTreeModel']
+
+
+class _LRUCache(object):
+    """A mapping that discards the least recently used entries when it is full
+    """
+
+    def __init__(self, capacity):
+        """Initialize a new cache with the given capacity
+
+        :param capacity: the maximum number of entries
+        :type capacity: :class:`int`
+        :raises: None
+        """
+        self.capacity = capacity
+        self._data = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        """Return the value for key and mark it as recently used
+
+        :param key: the key
+        :param default: the value to return if the key is missing
+        :returns: the value or default
+        :raises: None
+        """
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            return default
+        self._data[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        """Store the value and discard the oldest entries if the cache is full
+
+        :param key: the key
+        :param value: the value
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._data.pop(key, None)
+        self._data[key] = value
+        while len(self._data) > self.capacity:
+            self._data.popitem(last=False)
+
+    def __contains__(self, key):
+        """Return True if the key is cached. Does not change the order.
+
+        :param key: the key
+        :returns: True, if cached
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        return key in self._data
+
+    def __len__(self, ):
+        """Return the number of cached entries
+
+        :returns: the number of entries
+        :rtype: :class:`int`
+        :raises: None
+        """
+        return len(self._data)
+
+    def clear(self, ):
+        """Remove all entries
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._data.clear()
+
+
+class SqlTreeModel(QtCore.QAbstractItemModel):
+    """A read-only tree model for an adjacency list table in SQLite
+
+    Indexes store the id of their row as internal id.
+    The rows of a parent are ordered by the order column, which has to be unique
+    among siblings. The default is the id column.
+    """
+
+    def __init__(self, connection, table, columns, idcolumn='id', parentcolumn='parent_id',
+                 ordercolumn=None, headers=None, pagesize=256, cachesize=10000, parent=None):
+        """Initialize a new model for the given table
+
+        :param connection: an open connection or the path to the database
+        :type connection: :class:`sqlite3.Connection` | :class:`str`
+        :param table: the name of the table
+        :type table: :class:`str`
+        :param columns: the names of the table columns that are shown as model columns
+        :type columns: list of :class:`str`
+        :param idcolumn: the name of the column with the unique integer id
+        :type idcolumn: :class:`str`
+        :param parentcolumn: the name of the column with the parent id
+        :type parentcolumn: :class:`str`
+        :param ordercolumn: the name of the column for sorting siblings. If None, use the idcolumn.
+        :type ordercolumn: :class:`str` | None
+        :param headers: the horizontal headers. If None use the column names.
+        :type headers: list of :class:`str` | None
+        :param pagesize: the number of children that are loaded at once
+        :type pagesize: :class:`int`
+        :param cachesize: the maximum number of rows that are kept in memory
+        :type cachesize: :class:`int`
+        :param parent: the parent object
+        :type parent: :class:`QtCore.QObject`
+        :raises: None
+        """
+        super(SqlTreeModel, self).__init__(parent)
+        if not isinstance(connection, sqlite3.Connection):
+            connection = sqlite3.connect(connection, check_same_thread=False)
+        self._connection = connection
+        self._columns = list(columns)
+        self._headers = list(headers) if headers is not None else list(self._columns)
+        self._pagesize = pagesize
+        self._nodes = _LRUCache(cachesize)
+        """id -> [parent id, row, order value, values]"""
+        self._pages = _LRUCache(max(1, cachesize // pagesize))
+        """(parent id, page) -> list of ids"""
+        self._counts = _LRUCache(cachesize)
+        """parent id -> number of children"""
+        ordercolumn = ordercolumn or idcolumn
+        selected = ', '.join([idcolumn, parentcolumn, ordercolumn] + self._columns)
+        # the statements never change, so sqlite can reuse the prepared ones
+        self._count_sql = 'SELECT COUNT(*) FROM %s WHERE %s IS ?' % (table, parentcolumn)
+        self._offset_sql = 'SELECT %s FROM %s WHERE %s IS ? ORDER BY %s LIMIT ? OFFSET ?'\
+                           % (selected, table, parentcolumn, ordercolumn)
+        self._keyset_sql = 'SELECT %s FROM %s WHERE %s IS ? AND %s > ? ORDER BY %s LIMIT ?'\
+                           % (selected, table, parentcolumn, ordercolumn, ordercolumn)
+        self._node_sql = 'SELECT %s FROM %s WHERE %s = ?' % (selected, table, idcolumn)
+        self._row_sql = 'SELECT COUNT(*) FROM %s WHERE %s IS ? AND %s < ?'\
+                        % (table, parentcolumn, ordercolumn)
+
+    @property
+    def connection(self, ):
+        """Return the database connection
+
+        :returns: the connection
+        :rtype: :class:`sqlite3.Connection`
+        :raises: None
+        """
+        return self._connection
+
+    def refresh(self, ):
+        """Clear all caches and reset the model, e.g. after the table changed
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self.beginResetModel()
+        self._nodes.clear()
+        self._pages.clear()
+        self._counts.clear()
+        self.endResetModel()
+
+    def _child_count(self, parentid):
+        """Return the number of children of the given parent
+
+        :param parentid: the id of the parent or None for top level rows
+        :type parentid: :class:`int` | None
+        :returns: the number of children
+        :rtype: :class:`int`
+        :raises: None
+        """
+        count = self._counts.get(parentid)
+        if count is None:
+            count = self._connection.execute(self._count_sql, (parentid,)).fetchone()[0]
+            self._counts[parentid] = count
+        return count
+
+    def _page(self, parentid, page):
+        """Return the ids of the given page of children
+
+        :param parentid: the id of the parent or None for top level rows
+        :type parentid: :class:`int` | None
+        :param page: the page number
+        :type page: :class:`int`
+        :returns: the ids of the children in the page
+        :rtype: list of :class:`int`
+        :raises: None
+        """
+        ids = self._pages.get((parentid, page))
+        if ids is not None:
+            return ids
+        previous = self._pages.get((parentid, page - 1)) if page else None
+        lastnode = self._nodes.get(previous[-1]) if previous else None
+        if lastnode is not None:
+            cursor = self._connection.execute(self._keyset_sql, (parentid, lastnode[2], self._pagesize))
+        else:
+            cursor = self._connection.execute(self._offset_sql,
+                                              (parentid, self._pagesize, page * self._pagesize))
+        ids = []
+        row = page * self._pagesize
+        for record in cursor:
+            self._nodes[record[0]] = [record[1], row, record[2], record[3:]]
+            ids.append(record[0])
+            row += 1
+        self._pages[(parentid, page)] = ids
+        return ids
+
+    def _node(self, nodeid):
+        """Return the cached information for the given id and load it if necessary
+
+        :param nodeid: the id of the row
+        :type nodeid: :class:`int`
+        :returns: the parent id, the row, the order value and the values
+                  or None if the row was deleted
+        :rtype: list | None
+        :raises: None
+        """
+        node = self._nodes.get(nodeid)
+        if node is None:
+            record = self._connection.execute(self._node_sql, (nodeid,)).fetchone()
+            if record is None:
+                return
+            row = self._connection.execute(self._row_sql, (record[1], record[2])).fetchone()[0]
+            node = [record[1], row, record[2], record[3:]]
+            self._nodes[nodeid] = node
+        return node
+
+    def _parent_id(self, index):
+        """Return the id for the given parent index
+
+        :param index: the parent index
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: the id or None for the invalid index
+        :rtype: :class:`int` | None
+        :raises: None
+        """
+        return index.internalId() if index.isValid() else None
+
+    def index(self, row, column, parent=None):
+        """Return the index of the item in the model specified by the given row,
+        column and parent index.
+
+        :param row: the row of the item
+        :type row: int
+        :param column: the column for the item
+        :type column: int
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: the index of the item
+        :rtype: :class:`QtCore.QModelIndex`
+        :raises: None
+        """
+        if parent is None:
+            parent = QtCore.QModelIndex()
+        if not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+        ids = self._page(self._parent_id(parent), row // self._pagesize)
+        pos = row % self._pagesize
+        if pos >= len(ids):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column, ids[pos])
+
+    def parent(self, index):
+        """Return the parent of the model item with the given index.
+
+        :param index: the index that you want to know the parent of
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: parent index
+        :rtype: :class:`QtCore.QModelIndex`
+        :raises: None
+        """
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        node = self._node(index.internalId())
+        if node is None or node[0] is None:
+            return QtCore.QModelIndex()
+        parentnode = self._node(node[0])
+        if parentnode is None:
+            return QtCore.QModelIndex()
+        return self.createIndex(parentnode[1], 0, node[0])
+
+    def rowCount(self, parent=None):
+        """Return the number of rows under the given parent.
+
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: the row count
+        :rtype: int
+        :raises: None
+        """
+        if parent is None:
+            parent = QtCore.QModelIndex()
+        if parent.column() > 0:
+            return 0
+        if parent.isValid() and self._node(parent.internalId()) is None:
+            return 0
+        return self._child_count(self._parent_id(parent))
+
+    def columnCount(self, parent=None):
+        """Return the number of columns
+
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: the column count
+        :rtype: int
+        :raises: None
+        """
+        return len(self._columns)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        """Return the data stored under the given role for the item referred to by the index.
+
+        :param index: the index
+        :type index: :class:`QtCore.QModelIndex`
+        :param role: the data role
+        :type role: QtCore.Qt.ItemDataRole
+        :returns: the value of the column for display and edit role
+        :raises: None
+        """
+        if not index.isValid():
+            return
+        if role == QtCore.Qt.DisplayRole or role == QtCore.Qt.EditRole:
+            node = self._node(index.internalId())
+            if node is not None:
+                return node[3][index.column()]
+
+    def headerData(self, section, orientation, role):
+        """Return the header data
+
+        :param section: the section in the header view
+        :type section: int
+        :param orientation: vertical or horizontal orientation
+        :type orientation: :data:`QtCore.Qt.Vertical` | :data:`QtCore.Qt.Horizontal`
+        :param role: the data role.
+        :type role: :data:`QtCore.Qt.ItemDataRole`
+        :returns: data for the header
+        :raises: None
+        """
+        if role != QtCore.Qt.DisplayRole:
+            return
+        if orientation == QtCore.Qt.Horizontal and section < len(self._headers):
+            return self._headers[section]
+        return str(section + 1)
+
+    def id_of_index(self, index):
+        """Return the database id of the given index
+
+        :param index: the index
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: the id or None for an invalid index
+        :rtype: :class:`int` | None
+        :raises: None
+        """
+        return self._parent_id(index)
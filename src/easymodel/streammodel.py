@@ -0,0 +1,270 @@
+"""This module provides a model for live streams like logs and events.
+
+The :class:`StreamModel` holds at most a fixed number of rows. Every row is an
+:class:`ItemData`. Appended rows are collected and inserted with one signal per batch.
+When the capacity is reached, the oldest rows get removed as one range.
+The rows are stored in a ring buffer, so neither appending nor evicting copies
+or shifts the stored rows::
+
+  headers = easymodel.ListItemData(['Time', 'Level', 'Message'])
+  model = easymodel.StreamModel(headers, capacity=10000, interval=100)
+  view.setModel(model)
+  # from the GUI thread, as often as you like
+  model.append(easymodel.ListItemData([time, level, msg]))
+
+"""
+from PySide import QtCore
+
+from easymodel.treemodel import INTERNAL_OBJ_ROLE
+
+__all__ = ['StreamModel']
+
+
+class StreamModel(QtCore.QAbstractItemModel):
+    """A flat model with a bounded number of :class:`ItemData` rows
+
+    The oldest rows are evicted when new rows do not fit anymore.
+    Rows are appended in batches. Either call :meth:`StreamModel.flush`
+    or set an interval for flushing automatically.
+    """
+
+    def __init__(self, headers, capacity, interval=0, parent=None):
+        """Initialize a new stream model
+
+        :param headers: the item data that provides the horizontal headers
+                        and the column count. :class:`ListItemData` is suitable.
+        :type headers: :class:`ItemData`
+        :param capacity: the maximum number of rows
+        :type capacity: :class:`int`
+        :param interval: the time in milliseconds to collect appended rows before they are inserted.
+                         If 0, rows are only inserted by :meth:`StreamModel.flush`.
+        :type interval: :class:`int`
+        :param parent: the parent object
+        :type parent: :class:`QtCore.QObject`
+        :raises: :class:`ValueError` if the capacity is not positive
+        """
+        super(StreamModel, self).__init__(parent)
+        if capacity <= 0:
+            raise ValueError("The capacity has to be positive.")
+        self._headers = headers
+        self._buffer = [None] * capacity
+        self._start = 0
+        self._count = 0
+        self._pending = []
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(interval)
+        self._timer.timeout.connect(self.flush)
+
+    @property
+    def capacity(self, ):
+        """Return the maximum number of rows
+
+        :returns: the capacity
+        :rtype: :class:`int`
+        :raises: None
+        """
+        return len(self._buffer)
+
+    def append(self, itemdata):
+        """Append a row
+
+        The row is inserted with the next flush.
+
+        :param itemdata: the data of the row
+        :type itemdata: :class:`ItemData`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._pending.append(itemdata)
+        self._schedule()
+
+    def extend(self, itemdatas):
+        """Append multiple rows
+
+        The rows are inserted with the next flush.
+
+        :param itemdatas: the data of the rows
+        :type itemdatas: iterable of :class:`ItemData`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._pending.extend(itemdatas)
+        self._schedule()
+
+    def _schedule(self, ):
+        """Start the flush timer if an interval is set
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if self._timer.interval() and not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self, ):
+        """Insert all appended rows with one signal and evict the oldest rows if necessary
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._timer.stop()
+        pending = self._pending
+        self._pending = []
+        capacity = len(self._buffer)
+        if len(pending) > capacity:
+            pending = pending[-capacity:]
+        n = len(pending)
+        if not n:
+            return
+        overflow = self._count + n - capacity
+        if overflow > 0:
+            self.beginRemoveRows(QtCore.QModelIndex(), 0, overflow - 1)
+            for i in range(overflow):
+                self._buffer[(self._start + i) % capacity] = None
+            self._start = (self._start + overflow) % capacity
+            self._count -= overflow
+            self.endRemoveRows()
+        self.beginInsertRows(QtCore.QModelIndex(), self._count, self._count + n - 1)
+        end = self._start + self._count
+        for i, itemdata in enumerate(pending):
+            self._buffer[(end + i) % capacity] = itemdata
+        self._count += n
+        self.endInsertRows()
+
+    def clear(self, ):
+        """Remove all rows, including the ones that are not inserted yet
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._pending = []
+        self._timer.stop()
+        if not self._count:
+            return
+        self.beginRemoveRows(QtCore.QModelIndex(), 0, self._count - 1)
+        self._buffer = [None] * len(self._buffer)
+        self._start = 0
+        self._count = 0
+        self.endRemoveRows()
+
+    def itemdata(self, row):
+        """Return the item data of the given row
+
+        :param row: the row
+        :type row: :class:`int`
+        :returns: the item data
+        :rtype: :class:`ItemData`
+        :raises: :class:`IndexError`
+        """
+        if not 0 <= row < self._count:
+            raise IndexError("Row %s out of range." % row)
+        return self._buffer[(self._start + row) % len(self._buffer)]
+
+    def index(self, row, column, parent=None):
+        """Return the index for the given row and column
+
+        :param row: the row of the item
+        :type row: int
+        :param column: the column for the item
+        :type column: int
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: the index of the item
+        :rtype: :class:`QtCore.QModelIndex`
+        :raises: None
+        """
+        if parent is None:
+            parent = QtCore.QModelIndex()
+        if not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index):
+        """Return an invalid index because the model is flat
+
+        :param index: the index
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: an invalid index
+        :rtype: :class:`QtCore.QModelIndex`
+        :raises: None
+        """
+        return QtCore.QModelIndex()
+
+    def rowCount(self, parent=None):
+        """Return the number of rows
+
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: the row count for the invalid parent. 0 otherwise.
+        :rtype: int
+        :raises: None
+        """
+        if parent is not None and parent.isValid():
+            return 0
+        return self._count
+
+    def columnCount(self, parent=None):
+        """Return the column count of the header item data
+
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: the column count
+        :rtype: int
+        :raises: None
+        """
+        return self._headers.column_count()
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        """Return the data of the item data for the given index and role
+
+        :param index: the index
+        :type index: :class:`QtCore.QModelIndex`
+        :param role: the data role
+        :type role: QtCore.Qt.ItemDataRole
+        :returns: some data depending on the role
+        :raises: None
+        """
+        if not index.isValid():
+            return
+        itemdata = self.itemdata(index.row())
+        if role == INTERNAL_OBJ_ROLE:
+            return itemdata.internal_data()
+        return itemdata.data(index.column(), role)
+
+    def flags(self, index):
+        """Return the flags of the item data for the given index
+
+        :param index: the index to query
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: the flags
+        :rtype: QtCore.Qt.ItemFlags
+        :raises: None
+        """
+        if not index.isValid():
+            return QtCore.Qt.NoItemFlags
+        return self.itemdata(index.row()).flags(index.column())
+
+    def headerData(self, section, orientation, role):
+        """Return the header data
+
+        :param section: the section in the header view
+        :type section: int
+        :param orientation: vertical or horizontal orientation
+        :type orientation: :data:`QtCore.Qt.Vertical` | :data:`QtCore.Qt.Horizontal`
+        :param role: the data role.
+        :type role: :data:`QtCore.Qt.ItemDataRole`
+        :returns: data for the header
+        :raises: None
+        """
+        if orientation == QtCore.Qt.Horizontal:
+            d = self._headers.data(section, role)
+            if d is None and role == QtCore.Qt.DisplayRole:
+                return str(section + 1)
+            return d
+        if orientation == QtCore.Qt.Vertical and role == QtCore.Qt.DisplayRole:
+            return str(section + 1)
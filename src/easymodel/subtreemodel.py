@@ -0,0 +1,555 @@
+"""This module provides a model that shows the subtree of one item of a tree model.
+
+A :class:`SubtreeModel` presents any :class:`TreeItem` of a :class:`TreeModel` as its root.
+It does not copy anything. The items are shared with the source model and
+creating a subtree model does not walk the hierarchy::
+
+  model = easymodel.TreeModel(root)
+  sub = easymodel.SubtreeModel(model, root.child(0))
+  view.setModel(sub)
+
+Structural changes and data changes of the source model are forwarded if they happen
+inside the subtree. The horizontal headers are the ones of the source model.
+If the item gets removed from the source model, the subtree model becomes empty.
+"""
+from PySide import QtCore
+
+from easymodel.treemodel import TreeItem
+
+__all__ = ['SubtreeModel']
+
+
+class SubtreeModel(QtCore.QAbstractItemModel):
+    """A model for the children of one item of a :class:`TreeModel`
+
+    Indexes store the ids of the items like the source model does. Data and flags are
+    provided by the source model, so aggregates show up as well.
+    """
+
+    def __init__(self, source, item=None, parent=None):
+        """Initialize a new model for the subtree of the given item
+
+        :param source: the model that holds the item
+        :type source: :class:`TreeModel`
+        :param item: the item whose children are the top level rows. If None, use the root of the source.
+        :type item: :class:`TreeItem` | None
+        :param parent: the parent object
+        :type parent: :class:`QtCore.QObject`
+        :raises: None
+        """
+        super(SubtreeModel, self).__init__(parent)
+        self._source = source
+        self._item = item if item is not None else source.root
+        self._pending = []
+        """For every begin signal of the source, what this model began: None, 'rows' or 'reset'"""
+        source.rowsAboutToBeInserted.connect(self._rows_about_to_be_inserted)
+        source.rowsInserted.connect(self._rows_inserted)
+        source.rowsAboutToBeRemoved.connect(self._rows_about_to_be_removed)
+        source.rowsRemoved.connect(self._rows_removed)
+        source.rowsAboutToBeMoved.connect(self._rows_about_to_be_moved)
+        source.rowsMoved.connect(self._rows_moved)
+        source.dataChanged.connect(self._data_changed)
+        source.headerDataChanged.connect(self.headerDataChanged.emit)
+        source.modelAboutToBeReset.connect(self.beginResetModel)
+        source.modelReset.connect(self._source_reset)
+        source.layoutChanged.connect(self._reset)
+        source.columnsInserted.connect(self._reset)
+        source.columnsRemoved.connect(self._reset)
+
+    @property
+    def source(self, ):
+        """Return the source model
+
+        :returns: the source model
+        :rtype: :class:`TreeModel`
+        :raises: None
+        """
+        return self._source
+
+    @property
+    def item(self, ):
+        """Return the item whose children are the top level rows
+
+        :returns: the item or None if it was removed from the source model
+        :rtype: :class:`TreeItem` | None
+        :raises: None
+        """
+        return self._item
+
+    def set_item(self, item):
+        """Show the subtree of another item of the source model
+
+        :param item: the item. If None, use the root of the source.
+        :type item: :class:`TreeItem` | None
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self.beginResetModel()
+        self._item = item if item is not None else self._source.root
+        self.endResetModel()
+
+    def _reset(self, *args):
+        """Reset the model
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self.beginResetModel()
+        self.endResetModel()
+
+    def _in_source(self, item):
+        """Return True if the item belongs to the hierarchy of the source model
+
+        :param item: the item
+        :type item: :class:`TreeItem`
+        :returns: True, if the item is in the source model
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        while item._parent is not None:
+            item = item._parent
+        return item is self._source.root
+
+    def _source_reset(self, ):
+        """Drop the item if it is not part of the source model anymore
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if self._item is not None and not self._in_source(self._item):
+            self._item = None
+        self.endResetModel()
+
+    def _map_parent(self, parent):
+        """Return the index of this model for the given source parent index
+
+        :param parent: the source parent index
+        :type parent: :class:`QtCore.QModelIndex`
+        :returns: the index or None if the parent is not the item or one of its descendants
+        :rtype: :class:`QtCore.QModelIndex` | None
+        :raises: None
+        """
+        return self._parent_index(self._source.item_of_index(parent))
+
+    def _parent_index(self, parentitem):
+        """Return the index of this model for the given parent item
+
+        :param parentitem: the parent item
+        :type parentitem: :class:`TreeItem`
+        :returns: the index or None if the parent is not the item or one of its descendants
+        :rtype: :class:`QtCore.QModelIndex` | None
+        :raises: None
+        """
+        if self._item is None or parentitem is None:
+            return
+        if parentitem is self._item:
+            return QtCore.QModelIndex()
+        item = parentitem
+        while item is not None:
+            item = item._parent
+            if item is self._item:
+                return self.createIndex(parentitem.row(), 0, parentitem.item_id())
+
+    def _contains_item(self, parent, first, last):
+        """Return True if the item is one of the given source rows or a descendant of them
+
+        :param parent: the source parent index
+        :type parent: :class:`QtCore.QModelIndex`
+        :param first: the first row
+        :type first: :class:`int`
+        :param last: the last row
+        :type last: :class:`int`
+        :returns: True, if the item is affected
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        if self._item is None:
+            return False
+        parentitem = self._source.item_of_index(parent)
+        item = self._item
+        while item._parent is not None:
+            if item._parent is parentitem:
+                return first <= parentitem.childItems.index(item) <= last
+            item = item._parent
+        return False
+
+    def _rows_about_to_be_inserted(self, parent, first, last):
+        """Begin inserting rows if the parent is in the subtree
+
+        :param parent: the source parent index
+        :type parent: :class:`QtCore.QModelIndex`
+        :param first: the first inserted row
+        :type first: :class:`int`
+        :param last: the last inserted row
+        :type last: :class:`int`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        index = self._map_parent(parent)
+        if index is None:
+            self._pending.append(None)
+            return
+        self.beginInsertRows(index, first, last)
+        self._pending.append('rows')
+
+    def _rows_inserted(self, parent, first, last):
+        """End inserting rows if they were forwarded
+
+        :param parent: the source parent index
+        :type parent: :class:`QtCore.QModelIndex`
+        :param first: the first inserted row
+        :type first: :class:`int`
+        :param last: the last inserted row
+        :type last: :class:`int`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if self._pending.pop():
+            self.endInsertRows()
+
+    def _rows_about_to_be_removed(self, parent, first, last):
+        """Begin removing rows if the parent is in the subtree
+
+        If the item itself gets removed, the model is reset.
+
+        :param parent: the source parent index
+        :type parent: :class:`QtCore.QModelIndex`
+        :param first: the first removed row
+        :type first: :class:`int`
+        :param last: the last removed row
+        :type last: :class:`int`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if self._contains_item(parent, first, last):
+            self.beginResetModel()
+            self._pending.append('reset')
+            return
+        index = self._map_parent(parent)
+        if index is None:
+            self._pending.append(None)
+            return
+        self.beginRemoveRows(index, first, last)
+        self._pending.append('rows')
+
+    def _rows_removed(self, parent, first, last):
+        """End removing rows if they were forwarded
+
+        :param parent: the source parent index
+        :type parent: :class:`QtCore.QModelIndex`
+        :param first: the first removed row
+        :type first: :class:`int`
+        :param last: the last removed row
+        :type last: :class:`int`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        pending = self._pending.pop()
+        if pending == 'reset':
+            self._item = None
+            self.endResetModel()
+        elif pending:
+            self.endRemoveRows()
+
+    def _rows_about_to_be_moved(self, parent, first, last, destination, row):
+        """Begin moving rows if the parents are in the subtree
+
+        If only one of the parents is in the subtree, the model is reset.
+
+        :param parent: the source parent index
+        :type parent: :class:`QtCore.QModelIndex`
+        :param first: the first moved row
+        :type first: :class:`int`
+        :param last: the last moved row
+        :type last: :class:`int`
+        :param destination: the source destination parent index
+        :type destination: :class:`QtCore.QModelIndex`
+        :param row: the destination row
+        :type row: :class:`int`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        index = self._map_parent(parent)
+        destindex = self._map_parent(destination)
+        if index is None and destindex is None:
+            pending = None
+        elif index is None or destindex is None:
+            self.beginResetModel()
+            pending = 'reset'
+        else:
+            self.beginMoveRows(index, first, last, destindex, row)
+            pending = 'rows'
+        self._pending.append(pending)
+
+    def _rows_moved(self, *args):
+        """End moving rows if they were forwarded
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        pending = self._pending.pop()
+        if pending == 'reset':
+            self.endResetModel()
+        elif pending:
+            self.endMoveRows()
+
+    def _data_changed(self, topleft, bottomright, *args):
+        """Forward data changes of items in the subtree
+
+        :param topleft: the top left source index
+        :type topleft: :class:`QtCore.QModelIndex`
+        :param bottomright: the bottom right source index
+        :type bottomright: :class:`QtCore.QModelIndex`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        parent = self._map_parent(topleft.parent())
+        if parent is None:
+            return
+        self.dataChanged.emit(self.index(topleft.row(), topleft.column(), parent),
+                              self.index(bottomright.row(), bottomright.column(), parent))
+
+    def map_to_source(self, index):
+        """Return the index of the source model for the given index
+
+        :param index: the index of this model
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: the source index. For the invalid index, the index of the item.
+        :rtype: :class:`QtCore.QModelIndex`
+        :raises: None
+        """
+        if not index.isValid():
+            if self._item is None:
+                return QtCore.QModelIndex()
+            return self._source.index_of_item(self._item)
+        return self._source.index_of_item(self.item_of_index(index), index.column())
+
+    def map_from_source(self, index):
+        """Return the index of this model for the given source index
+
+        :param index: the index of the source model
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: the index or an invalid index if it is not in the subtree
+        :rtype: :class:`QtCore.QModelIndex`
+        :raises: None
+        """
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        return self.index_of_item(self._source.item_of_index(index), index.column())
+
+    def index_of_item(self, item, column=0):
+        """Return the index for the given item
+
+        :param item: an item in the subtree
+        :type item: :class:`TreeItem`
+        :param column: the column of the index
+        :type column: :class:`int`
+        :returns: the index or an invalid index if the item is not in the subtree
+        :rtype: :class:`QtCore.QModelIndex`
+        :raises: None
+        """
+        if self._parent_index(item._parent) is None:
+            return QtCore.QModelIndex()
+        return self.createIndex(item.row(), column, item.item_id())
+
+    def item_of_index(self, index):
+        """Return the item of the given index
+
+        :param index: an index of this model
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: the item or the item of the subtree for an invalid index.
+                  None if the model is empty or the item of the index does not exist anymore.
+        :rtype: :class:`TreeItem` | None
+        :raises: None
+        """
+        if index.isValid():
+            return TreeItem.item_for_id(index.internalId())
+        return self._item
+
+    def index(self, row, column, parent=None):
+        """Return the index of the item in the model specified by the given row,
+        column and parent index.
+
+        :param row: the row of the item
+        :type row: int
+        :param column: the column for the item
+        :type column: int
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: the index of the item
+        :rtype: :class:`QtCore.QModelIndex`
+        :raises: None
+        """
+        if parent is None:
+            parent = QtCore.QModelIndex()
+        if not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column, self.item_of_index(parent).child(row).item_id())
+
+    def parent(self, index):
+        """Return the parent of the model item with the given index.
+        If the parent is the item of the subtree, return an invalid QModelIndex.
+
+        :param index: the index that you want to know the parent of
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: parent index
+        :rtype: :class:`QtCore.QModelIndex`
+        :raises: None
+        """
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        item = self.item_of_index(index)
+        if item is None:
+            return QtCore.QModelIndex()
+        parentitem = item.parent()
+        if parentitem is self._item or parentitem is None:
+            return QtCore.QModelIndex()
+        return self.createIndex(parentitem.row(), 0, parentitem.item_id())
+
+    def rowCount(self, parent=None):
+        """Return the number of rows under the given parent.
+
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: the row count
+        :rtype: int
+        :raises: None
+        """
+        if parent is None:
+            parent = QtCore.QModelIndex()
+        if parent.column() > 0:
+            return 0
+        item = self.item_of_index(parent)
+        return item.child_count() if item is not None else 0
+
+    def hasChildren(self, parent=None):
+        """Return True if the parent has children or can fetch them
+
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: True, if the parent has children
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        if parent is None:
+            parent = QtCore.QModelIndex()
+        if parent.column() > 0:
+            return False
+        item = self.item_of_index(parent)
+        return item is not None and (bool(item.child_count()) or item.can_fetch_more())
+
+    def canFetchMore(self, parent):
+        """Return True if the parent has children that are not loaded yet
+
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: True, if more children can be fetched
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        item = self.item_of_index(parent)
+        return item is not None and item.can_fetch_more()
+
+    def fetchMore(self, parent):
+        """Let the source model load the missing children of the parent
+
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if self._item is not None:
+            self._source.fetchMore(self.map_to_source(parent))
+
+    def columnCount(self, parent=None):
+        """Return the number of columns
+
+        The top level rows have as many columns as the headers of the source model.
+
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: the column count
+        :rtype: int
+        :raises: None
+        """
+        if parent is not None and parent.isValid():
+            item = self.item_of_index(parent)
+            return item.column_count() if item is not None else 0
+        return self._source.columnCount(QtCore.QModelIndex())
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        """Return the data of the source model for the given index and role
+
+        :param index: the index
+        :type index: :class:`QtCore.QModelIndex`
+        :param role: the data role
+        :type role: QtCore.Qt.ItemDataRole
+        :returns: some data depending on the role
+        :raises: None
+        """
+        if not index.isValid():
+            return
+        item = self.item_of_index(index)
+        if item is None:
+            return
+        return self._source.item_data(item, index.column(), role)
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        """Set the data of the given index to value
+
+        :param index: the index to set
+        :type index: :class:`QtCore.QModelIndex`
+        :param value: the value to set
+        :param role: the role, usually edit role
+        :type role: :data:`QtCore.Qt.ItemDataRole`
+        :returns: True, if successfull, False if unsuccessfull
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        if not index.isValid():
+            return False
+        item = self.item_of_index(index)
+        if item is None:
+            return False
+        return item.set_data(index.column(), value, role)
+
+    def flags(self, index):
+        """Return the flags of the item for the given index
+
+        :param index: the index to query
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: the flags
+        :rtype: QtCore.Qt.ItemFlags
+        :raises: None
+        """
+        if not index.isValid():
+            return QtCore.Qt.NoItemFlags
+        item = self.item_of_index(index)
+        if item is None:
+            return QtCore.Qt.NoItemFlags
+        return item.flags(index)
+
+    def headerData(self, section, orientation, role):
+        """Return the header data of the source model
+
+        :param section: the section in the header view
+        :type section: int
+        :param orientation: vertical or horizontal orientation
+        :type orientation: :data:`QtCore.Qt.Vertical` | :data:`QtCore.Qt.Horizontal`
+        :param role: the data role.
+        :type role: :data:`QtCore.Qt.ItemDataRole`
+        :returns: data for the header
+        :raises: None
+        """
+        return self._source.headerData(section, orientation, role)
@@ -15,9 +15,19 @@ Finally create a tree model instance with the root tree item.
 """
 
 import abc
+import bisect
+import collections
+import copy
+import itertools
+import numbers
+import operator
+import threading
+import weakref
 
 from PySide import QtCore
 
+from easymodel.journal import ChangeJournal
+
 __all__ = ['INTERNAL_OBJ_ROLE', 'TREEITEM_ROLE',
            'ItemData', 'ListItemData', 'TreeItem', 'TreeModel']
 
@@ -30,6 +40,16 @@ TREEITEM_ROLE = QtCore.Qt.UserRole + 1
 """:data:`QtCore.Qt.ItemDataRole` to retrieve the TreeItem index.
 Can be used on any column."""
 
+_item_ids = itertools.count(1)
+"""Counter for the ids of tree items. 0 is never used."""
+_items_by_id = weakref.WeakValueDictionary()
+"""id -> TreeItem for all items that got an id"""
+_item_ids_lock = threading.Lock()
+_hierarchy_version = 0
+"""Incremented whenever an item gets another parent, so the cached roots of the items get outdated"""
+_hierarchy_lock = threading.Lock()
+"""Items are reparented in worker threads too, e.g. by loaders"""
+
 
 class ItemData(object):
     """An abstract class that holds data and is used as an interface for TreeItems
@@ -110,6 +130,131 @@ class ItemData(object):
         """
         return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
 
+    def can_fetch_more(self, item):
+        """Return True if the given item has children that are not loaded yet
+
+        Reimplement this and :meth:`ItemData.fetch_more` for lazily loaded trees.
+        The default returns False.
+
+        :param item: the tree item that holds this item data
+        :type item: :class:`TreeItem`
+        :returns: True, if more children can be fetched
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        return False
+
+    def fetch_more(self, item):
+        """Load the missing children of the given item
+
+        Add the children with :meth:`TreeItem.add_children`. This may also
+        happen later, e.g. when a background job finished.
+        After that, :meth:`ItemData.can_fetch_more` should return False.
+        The default implementation does nothing.
+
+        :param item: the tree item that holds this item data
+        :type item: :class:`TreeItem`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        pass
+
+    def can_unload(self, item):
+        """Return True if the children of the given item can be removed and fetched again later
+
+        See :meth:`TreeModel.set_node_budget`. The default returns False.
+
+        :param item: the tree item that holds this item data
+        :type item: :class:`TreeItem`
+        :returns: True, if the children can be unloaded
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        return False
+
+    def unload(self, item):
+        """Called after the children of the given item were removed by :meth:`TreeItem.unload_children`
+
+        Reimplement it, so that :meth:`ItemData.can_fetch_more` returns True again.
+        The default implementation does nothing.
+
+        :param item: the tree item that holds this item data
+        :type item: :class:`TreeItem`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        pass
+
+    @classmethod
+    def prefetch(cls, itemdatas):
+        """Load the data of the given instances of this class in one go
+
+        This is called by :meth:`TreeModel.prefetch` with all item data
+        of this class whose rows are about to be displayed, before
+        :meth:`ItemData.data` is called for their cells.
+        Reimplement it to e.g. query a database once for all of them.
+        The default implementation does nothing.
+
+        :param itemdatas: the item data instances of this class
+        :type itemdatas: list of :class:`ItemData`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        pass
+
+    def set_treeitem(self, item):
+        """Called when the given :class:`TreeItem` starts to use this item data
+
+        The default implementation does nothing.
+        Reimplement it, if the item data needs to notify the model about changes by itself.
+
+        :param item: the tree item
+        :type item: :class:`TreeItem`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        pass
+
+    def copy(self, ):
+        """Return a copy that can be changed without changing this item data
+
+        It is used by :meth:`TreeItem.clone` before shared item data gets changed.
+        The default makes a shallow copy.
+
+        :returns: the copy
+        :rtype: :class:`ItemData`
+        :raises: None
+        """
+        return copy.copy(self)
+
+    def serialize(self, ):
+        """Return the values to store in a snapshot
+
+        See :func:`save_snapshot`. The values have to be None, booleans, integers,
+        floats, strings or bytes. Reimplement it together with :meth:`ItemData.deserialize`.
+
+        :returns: the values
+        :rtype: list
+        :raises: :class:`NotImplementedError`
+        """
+        raise NotImplementedError("%s can not be serialized." % type(self).__name__)
+
+    @classmethod
+    def deserialize(cls, values):
+        """Create a new item data out of the values returned by :meth:`ItemData.serialize`
+
+        :param values: the stored values
+        :type values: list
+        :returns: the new item data
+        :rtype: :class:`ItemData`
+        :raises: :class:`NotImplementedError`
+        """
+        raise NotImplementedError("%s can not be deserialized." % cls.__name__)
+
     def to_item(self, *args, **kwargs):
         """Create and return a new :class:`TreeItem` out of this
         instance.
@@ -216,6 +361,40 @@ class ListItemData(ItemData):
         """
         return self._list
 
+    def copy(self, ):
+        """Return a copy with a copy of the list
+
+        :returns: the copy
+        :rtype: :class:`ListItemData`
+        :raises: None
+        """
+        c = copy.copy(self)
+        c._list = list(self._list)
+        return c
+
+    def serialize(self, ):
+        """Return the list
+
+        :returns: the list
+        :rtype: list
+        :raises: None
+        """
+        return list(self._list)
+
+    @classmethod
+    def deserialize(cls, values):
+        """Create a new item data with the stored list
+
+        The editable flag is not stored.
+
+        :param values: the stored list
+        :type values: list
+        :returns: the new item data
+        :rtype: :class:`ListItemData`
+        :raises: None
+        """
+        return cls(values)
+
     def flags(self, column):
         """Return the item flags for the item
 
@@ -243,13 +422,31 @@ class TreeItem(object):
     root. The data for the root item can be None but it is advised to use
     a ListItemData so you can provide horizontal headers.
 
-    TreeItems should always belong to only one model.
-    Once a new TreeModel gets initialized all TreeItems will share the same model.
+    A hierarchy can be shown by several models at once, e.g. with different aggregates.
+    Once a new TreeModel gets initialized all TreeItems will share the same models.
+    The items are stored only once. Changes are broadcast to all models.
     When you add a new Item or delete one, the model gets automatically updated.
     You do not need to call TreeModel insertRow or removeRow. Just use add_child, remove_child
     or create a new TreeItem and provide a parent item to the constructor.
     """
 
+    _clones = None
+    """The clones of this item. Lazy ones still read its children, others might share its item data.
+    See :meth:`TreeItem.clone`."""
+    _datashared = False
+    """True for clones whose item data still belongs to the original item"""
+    _hasclones = False
+    """Set on the root of a hierarchy once one of its items was cloned.
+    Until then changes in the hierarchy do not look for clones."""
+    _lazy = False
+    """True for clones that did not create their children yet. See :meth:`TreeItem.clone`."""
+    _rootmodels = ()
+    """The models of the hierarchy. Only set on roots."""
+    _rootcache = None
+    """The hierarchy version and a weak reference to the root when it was looked up the last time"""
+    _id = None
+    """The id of the item. Assigned when it is needed the first time."""
+
     def __init__(self, data, parent=None):
         """Initialize a new TreeItem that holds some data and might be parented under parent
 
@@ -264,36 +461,192 @@ class TreeItem(object):
         :type parent: :class:`TreeItem`
         :raises: None
         """
-        self._model = None
-        self._data = data
+        self._data = None
+        self._set_itemdata(data)
         self._parent = parent
         self.childItems = []
         if self._parent is not None:
             self._parent.add_child(self)
 
+    @classmethod
+    def from_nested(cls, obj, itemdata_factory=None, children=None):
+        """Build a detached hierarchy out of nested data
+
+        The hierarchy is built iteratively, so deeply nested data is no problem.
+        Because the items are detached, no model has to be updated during
+        construction. Use :meth:`TreeItem.add_children` to insert the
+        children of the returned root into a model with a single notification
+        or create a new model with the returned root.
+
+        By default every object is a tuple ``(rowdata, childobjects)`` and
+        a :class:`ListItemData` is created from rowdata.
+
+        :param obj: the object for the root item
+        :param itemdata_factory: a function that returns the :class:`ItemData` for an object.
+        :type itemdata_factory: callable | None
+        :param children: a function that returns the child objects of an object.
+        :type children: callable | None
+        :returns: the root item
+        :rtype: :class:`TreeItem`
+        :raises: None
+        """
+        if itemdata_factory is None:
+            itemdata_factory = _listitemdata_from_nested
+        if children is None:
+            children = operator.itemgetter(1)
+        root = cls(itemdata_factory(obj))
+        stack = [(obj, root)]
+        while stack:
+            obj, item = stack.pop()
+            for childobj in children(obj):
+                child = cls(itemdata_factory(childobj))
+                child._parent = item
+                item.childItems.append(child)
+                stack.append((childobj, child))
+        return root
+
+    @classmethod
+    def from_paths(cls, rows, itemdata_factory=None):
+        """Build a detached hierarchy out of an iterable of ``(path, rowdata)`` tuples
+
+        A path is a tuple of keys. The last key identifies the item under the
+        item of the parent path. E.g. ``('a', 'b')`` is the child ``'b'``
+        of the item with the path ``('a',)``. Parents have to come before their children.
+        The empty path ``()`` is the root.
+        If it is not in rows, the root will have no data.
+        Children are in the order of rows.
+
+        See :meth:`TreeItem.from_nested` for attaching the hierarchy to a model.
+
+        :param rows: an iterable of tuples with a path and the data for that path
+        :type rows: iterable
+        :param itemdata_factory: a function that returns the :class:`ItemData` for a rowdata.
+                                 The default creates a :class:`ListItemData`.
+        :type itemdata_factory: callable | None
+        :returns: the root item
+        :rtype: :class:`TreeItem`
+        :raises: ValueError if a parent is missing
+        """
+        if itemdata_factory is None:
+            itemdata_factory = ListItemData
+        root = cls(None)
+        items = {(): root}
+        for path, rowdata in rows:
+            path = tuple(path)
+            if not path:
+                root._set_itemdata(itemdata_factory(rowdata))
+                continue
+            parent = items.get(path[:-1])
+            if parent is None:
+                raise ValueError("Parent of %s is missing." % (path,))
+            child = cls(itemdata_factory(rowdata))
+            child._parent = parent
+            parent.childItems.append(child)
+            items[path] = child
+        return root
+
+    def _get_root(self, ):
+        """Return the root of the hierarchy of this item
+
+        The root is cached until any item gets another parent.
+
+        :returns: the root. This item if it has no parent.
+        :rtype: :class:`TreeItem`
+        :raises: None
+        """
+        version = _hierarchy_version
+        cache = self._rootcache
+        if cache is not None and cache[0] == version:
+            root = cache[1]()
+            if root is not None:
+                return root
+        root = self
+        while root._parent is not None:
+            root = root._parent
+        self._rootcache = (version, weakref.ref(root))
+        return root
+
     def get_model(self, ):
         """Return the model the item belongs to
 
+        Only the root of a hierarchy stores the models.
+        All other items look them up via their root, which is cached.
+        If the hierarchy is shown by several models, the first one is returned.
+        See :meth:`TreeItem.get_models`.
+
         :returns: the model the item belongs to or None if it belongs to none
         :rtype: :class:`TreeModel` | None
         :raises: None
         """
-        return self._model
+        models = self._get_root()._rootmodels
+        return models[0] if models else None
+
+    _model = property(get_model)
+
+    def get_models(self, ):
+        """Return all models the item belongs to
+
+        :returns: the models
+        :rtype: list of :class:`TreeModel`
+        :raises: None
+        """
+        return list(self._get_root()._rootmodels)
 
     def set_model(self, model):
-        """Set the model the item belongs to
+        """Set the model of the hierarchy that this item is the root of
+
+        Other models get detached. Use :meth:`TreeItem.add_model` to show the hierarchy
+        in several models.
+        The model is only stored on this item. Children look it up via their root,
+        so this does not have to walk the hierarchy.
+        Items with a parent always belong to the models of their root.
+        Setting the model of such an item used to set the model of its subtree.
+        That is not supported anymore and raises a :class:`ValueError`.
+
+        :param model: the model the item belongs to or None
+        :type model: :class:`Treemodel` | None
+        :returns: None
+        :rtype: None
+        :raises: :class:`ValueError` if the item has a parent
+        """
+        self._check_root()
+        self._rootmodels = [model] if model is not None else ()
+
+    def _check_root(self, ):
+        """Raise a :class:`ValueError` if this item has a parent
+
+        :returns: None
+        :rtype: None
+        :raises: :class:`ValueError` if the item has a parent
+        """
+        if self._parent is not None:
+            raise ValueError("Only the root of a hierarchy can have models. "
+                             "The item belongs to the models of its root.")
+
+    def add_model(self, model):
+        """Add a model to the models of the hierarchy that this item is the root of
+
+        :param model: the additional model
+        :type model: :class:`TreeModel`
+        :returns: None
+        :rtype: None
+        :raises: :class:`ValueError` if the item has a parent
+        """
+        self._check_root()
+        if model not in self._rootmodels:
+            self._rootmodels = list(self._rootmodels) + [model]
 
-        A TreeItem can only belong to one model.
+    def remove_model(self, model):
+        """Remove a model from the models of the hierarchy that this item is the root of
 
-        :param model: the model the item belongs to
-        :type model: :class:`Treemodel`
+        :param model: the model to remove
+        :type model: :class:`TreeModel`
         :returns: None
         :rtype: None
         :raises: None
         """
-        self._model = model
-        for c in self.childItems:
-            c.set_model(model)
+        models = [m for m in self._rootmodels if m is not model]
+        self._rootmodels = models or ()
 
     def add_child(self, child):
         """Add child to children of this TreeItem
@@ -304,15 +657,29 @@ class TreeItem(object):
         :rtype: None
         :raises: None
         """
-        child.set_model(self._model)
-        if self._model:
+        self._prepare_change()
+        model = self._model
+        if model:
             row = len(self.childItems)
-            parentindex = self._model.index_of_item(self)
-            self._model.insertRow(row, child, parentindex)
+            parentindex = model.index_of_item(self)
+            model.insertRow(row, child, parentindex)
         else:
-            child._parent = self
+            _reparent(child, self)
             self.childItems.append(child)
 
+    def add_children(self, children):
+        """Add multiple children at once to the children of this TreeItem
+
+        The model gets notified only once.
+
+        :param children: the child TreeItems. They should not have a parent.
+        :type children: list of :class:`TreeItem`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._insert_children(len(self.childItems), list(children))
+
     def remove_child(self, child):
         """Remove the child from this TreeItem
 
@@ -322,13 +689,219 @@ class TreeItem(object):
         :rtype: None
         :raises: ValueError
         """
-        child.set_model(None)
-        if self._model:
+        self._prepare_change()
+        model = self._model
+        if model:
             row = self.childItems.index(child)
-            parentindex = self._model.index_of_item(self)
-            self._model.removeRow(row, parentindex)
+            parentindex = model.index_of_item(self)
+            model.removeRow(row, parentindex)
         else:
             self.childItems.remove(child)
+            _reparent(child, None)
+
+    def _insert_children(self, row, children):
+        """Insert the children before row and notify the model
+
+        :param row: the row where the children get inserted
+        :type row: int
+        :param children: the detached children to insert
+        :type children: list of :class:`TreeItem`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if not children:
+            return
+        self._prepare_change()
+        model = self._model
+        if model:
+            model.insert_items(row, children, model.index_of_item(self))
+            return
+        for child in children:
+            _reparent(child, self)
+        self.childItems[row:row] = children
+
+    def _remove_children(self, row, count):
+        """Remove count children starting at row and notify the model
+
+        :param row: the first row to remove
+        :type row: int
+        :param count: the number of children to remove
+        :type count: int
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if count <= 0:
+            return
+        self._prepare_change()
+        model = self._model
+        if model:
+            model.remove_items(row, count, model.index_of_item(self))
+            return
+        for child in self.childItems[row:row + count]:
+            _reparent(child, None)
+        del self.childItems[row:row + count]
+
+    def _move_child(self, row, destination):
+        """Move the child at row before the destination row and notify the model
+
+        :param row: the row of the child
+        :type row: int
+        :param destination: the row before which the child is inserted,
+                            counted before the child is removed
+        :type destination: int
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if destination == row or destination == row + 1:
+            return
+        self._prepare_change()
+        model = self._model
+        if model:
+            model.move_item(row, destination, model.index_of_item(self))
+            return
+        _move_in_list(self.childItems, row, destination)
+
+    def replace_children(self, children, key=None):
+        """Replace the children of this item with the given ones
+
+        Instead of removing all children and adding the new ones, the
+        difference between the current and the new children is computed.
+        Children are matched by the given key function.
+        A current child that matches a new one is kept, including its own children,
+        and takes over the :class:`ItemData` of the new item.
+        Children without a match get removed and new items without a match get inserted.
+        The model only receives the minimal amount of row removals, moves and insertions
+        and one data change for each range of consecutive updated rows.
+        Selections and expanded states of kept items are preserved that way.
+
+        :param children: the new children. They should not have a parent.
+        :type children: list of :class:`TreeItem`
+        :param key: a function that is called with a tree item and returns a hashable key.
+                    The default is the tuple of the display data of all columns, so items
+                    with equal display data match. Use e.g. :meth:`TreeItem.itemdata`
+                    to match items that share their :class:`ItemData` instead.
+        :type key: callable | None
+        :returns: None
+        :rtype: None
+        :raises: :class:`TypeError` if a key is not hashable
+        """
+        self._replace_children(list(children), key or _display_key)
+
+    def reconcile(self, other, key=None):
+        """Make the hierarchy under this item equal to the one under other
+
+        Walks both hierarchies in parallel and calls :meth:`TreeItem.replace_children`
+        for every pair of matched items. So only items that do not exist
+        in the other hierarchy get removed and only the new ones get inserted.
+        This item also takes over the :class:`ItemData` of other.
+        If this item is the root of a model, the header data changes.
+        Otherwise the data of the item changes.
+
+        The other hierarchy should be detached. Its items are either moved
+        into this hierarchy or discarded, so do not use it afterwards.
+        The hierarchies are traversed iteratively, so deep trees are no problem.
+
+        :param other: the root of the new hierarchy
+        :type other: :class:`TreeItem`
+        :param key: a function that is called with a tree item and returns a hashable key.
+                    The default is the tuple of the display data of all columns.
+                    See :meth:`TreeItem.replace_children`.
+        :type key: callable | None
+        :returns: None
+        :rtype: None
+        :raises: :class:`TypeError` if a key is not hashable
+        """
+        key = key or _display_key
+        if self._data is not other._data:
+            self._prepare_change()
+            self._set_itemdata(other._data)
+            if self._parent is None:
+                for model in self._rootmodels:
+                    model.headerDataChanged.emit(QtCore.Qt.Horizontal, 0, max(0, self.column_count() - 1))
+                    model._record_data([(self, 0, max(0, self.column_count() - 1))])
+            else:
+                lastcolumn = max(0, self._parent.column_count() - 1)
+                for model in self.get_models():
+                    model.item_data_changed(self, 0, lastcolumn)
+        stack = [(self, other)]
+        while stack:
+            item, new = stack.pop()
+            children = new.childItems
+            new.childItems = []
+            for child in children:
+                _reparent(child, None)
+            for kept, match in item._replace_children(children, key):
+                if kept.childItems or match.childItems:
+                    stack.append((kept, match))
+
+    def _replace_children(self, children, key):
+        """Replace the children of this item with the given ones
+
+        See :meth:`TreeItem.replace_children`.
+
+        :param children: the new children. They should not have a parent.
+        :type children: list of :class:`TreeItem`
+        :param key: a function that is called with a tree item and returns a hashable key.
+        :type key: callable
+        :returns: pairs of a kept child and the new item that matched it
+        :rtype: list of tuple
+        :raises: None
+        """
+        current = {}
+        for child in self.childItems:
+            current.setdefault(key(child), child)
+        matches = [current.pop(key(child), None) for child in children]
+        kept = set(id(m) for m in matches if m is not None)
+
+        # remove children without a match from the bottom up
+        obsolete = [r for r, child in enumerate(self.childItems) if id(child) not in kept]
+        for first, last in reversed(_ranges(obsolete)):
+            self._remove_children(first, last - first + 1)
+
+        # reorder the kept children, leaving a longest increasing run in place
+        target = [m for m in matches if m is not None]
+        targetpos = dict((id(m), i) for i, m in enumerate(target))
+        stay = _longest_increasing([targetpos[id(c)] for c in self.childItems])
+        stay = set(id(self.childItems[i]) for i in stay)
+        positions = dict((id(c), r) for r, c in enumerate(self.childItems))
+        for i, child in enumerate(target):
+            if id(child) in stay:
+                continue
+            row = positions[id(child)]
+            destination = positions[id(target[i - 1])] + 1 if i else 0
+            self._move_child(row, destination)
+            # only the rows between the old and the new position shift
+            childitems = self.childItems
+            for r in range(min(row, destination), min(max(row, destination) + 1, len(childitems))):
+                positions[id(childitems[r])] = r
+
+        # insert new items where they have no match
+        new = [i for i, m in enumerate(matches) if m is None]
+        for first, last in _ranges(new):
+            self._insert_children(first, children[first:last + 1])
+
+        # adopt the data of the new items
+        changed = []
+        for row, (child, match) in enumerate(zip(children, matches)):
+            if match is not None and match._data is not child._data:
+                match._prepare_change()
+                match._set_itemdata(child._data)
+                changed.append(row)
+        for model in self.get_models():
+            parentindex = model.index_of_item(self)
+            lastcolumn = model.columnCount(parentindex) - 1
+            for first, last in _ranges(changed):
+                model.dataChanged.emit(model.index(first, 0, parentindex),
+                                       model.index(last, lastcolumn, parentindex))
+            if changed and (model._aggregates or model._journal is not None):
+                adopted = [(matches[row], 0, lastcolumn) for row in changed]
+                model._record_data(adopted)
+                if model._aggregates:
+                    model._queue_changes(model._aggregate_changes(adopted))
+        return [(m, child) for child, m in zip(children, matches) if m is not None]
 
     def child(self, row):
         """Return the child at the specified row
@@ -350,6 +923,39 @@ class TreeItem(object):
         """
         return len(self.childItems)
 
+    def item_id(self, ):
+        """Return the unique integer id of this item
+
+        The id is assigned when it is requested the first time. It never changes and
+        is not reused for other items, not even after this item got garbage collected.
+        Ids can be passed to other threads or processes and are looked up with
+        :meth:`TreeItem.item_for_id`. :class:`TreeModel` stores them in its indexes.
+
+        :returns: the id
+        :rtype: :class:`int`
+        :raises: None
+        """
+        itemid = self._id
+        if itemid is None:
+            with _item_ids_lock:
+                if self._id is None:
+                    self._id = next(_item_ids)
+                    _items_by_id[self._id] = self
+                itemid = self._id
+        return itemid
+
+    @staticmethod
+    def item_for_id(itemid):
+        """Return the item with the given id
+
+        :param itemid: the id of the item. See :meth:`TreeItem.item_id`.
+        :type itemid: :class:`int`
+        :returns: the item or None if there is no item with this id anymore
+        :rtype: :class:`TreeItem` | None
+        :raises: None
+        """
+        return _items_by_id.get(itemid)
+
     def row(self, ):
         """Return the index of this tree item in the parent rows
 
@@ -371,7 +977,7 @@ class TreeItem(object):
         :raises: None
         """
         if self.child_count():
-            return self.childItems[0]._data.column_count()
+            return self.child(0)._data.column_count()
         else:
             return self._data.column_count() if self._data else 0
 
@@ -407,12 +1013,33 @@ class TreeItem(object):
         """
         if not self._data or column >= self._data.column_count():
             return False
+        self._prepare_change()
+        if self._datashared:
+            self._set_itemdata(self._data.copy())
+            self._datashared = False
+        else:
+            self._unshare_data()
         r = self._data.set_data(column, value, role)
-        index = self.to_index(column)
-        if r and self._model:
-            self._model.dataChanged.emit(index, index)
+        if r:
+            for model in self.get_models():
+                model.item_data_changed(self, column)
         return r
 
+    def _set_itemdata(self, data):
+        """Set the internal :class:`ItemData` and tell it about this item
+
+        See :meth:`ItemData.set_treeitem`.
+
+        :param data: the new item data
+        :type data: :class:`ItemData` | None
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._data = data
+        if data is not None:
+            data.set_treeitem(self)
+
     def parent(self, ):
         """Return the parent tree item
 
@@ -460,89 +1087,1024 @@ class TreeItem(object):
         """
         return self._data.internal_data()
 
-    def flags(self, index):
-        """Return the flags for the item
-
-        :param index: the index to query
-        :type index: :class:`QtCore.QModelIndex`
-        :returns: the flags
-        :rtype: QtCore.Qt.ItemFlags
-        :raises: None
-        """
-        return self._data.flags(index.column())
+    def can_fetch_more(self, ):
+        """Return True if this item has children that are not loaded yet
 
-    def to_index(self, column=0):
-        """Return the index for this tree item in the model
+        See :meth:`ItemData.can_fetch_more`.
 
-        :returns: The index in the model or None, if there is no model
-        :rtype: :class:`QtCore.QModelIndex`
+        :returns: True, if more children can be fetched
+        :rtype: :class:`bool`
         :raises: None
         """
-        return self._model.index_of_item(self, column=column) if self._model else None
+        return self._data is not None and self._data.can_fetch_more(self)
 
+    def fetch_more(self, ):
+        """Load the missing children of this item
 
-class TreeModel(QtCore.QAbstractItemModel):
-    """A tree model that uses the :class:`TreeItem` to represent a general tree.
+        See :meth:`ItemData.fetch_more`.
 
-    The model uses :class:`TreeItem` instances in an hierarchy to build a tree.
-    Each tree item represents a row. The tree items can hold arbitrary :class:`ItemData`
-    instances.
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if self._data is not None:
+            self._data.fetch_more(self)
 
-    The model will get automatically updated, when the hierarchy of the tree items changes.
-    You rarely have to use model methods for that. Just use methods of the tree items.
+    def unload_children(self, ):
+        """Remove all children, so they get fetched again when they are needed
 
-    All models need at least a root. The root is responsible for the headers.
-    So the :class:`ItemData` of the root should have a columns for each header and return
-    a string for them when queried with :data:`QtCore.Qt.DisplayRole`. Only horizontal
-    headers are supported at the moment. Vertical headers get numbers.
-    """
+        This only works if the item data supports it. See :meth:`ItemData.can_unload`.
 
-    def __init__(self, root, parent=None):
-        """Initialize a new tree model with the given root treeitem
+        :returns: True, if the children were unloaded
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        if self._data is None or not self._data.can_unload(self):
+            return False
+        self._remove_children(0, len(self.childItems))
+        self._data.unload(self)
+        return True
 
-        :param root: the root tree item. The root tree item is responsible for the headers.
-                     A :class:`ListItemData` with the headers is suitable as data for the item.
-        :type root: :class:`TreeItem`
-        :param parent: the parent for the model
-        :type parent: :class:`QtCore.QObject`
+    def clone(self, ):
+        """Return a copy-on-write copy of the hierarchy under and including this item
+
+        The clone is detached and shares the :class:`ItemData` with this hierarchy.
+        Item data that reimplements :meth:`ItemData.set_treeitem` is copied right away instead,
+        so it notifies the models of the clone.
+        The items of the clone are created when they are requested with :meth:`TreeItem.child`.
+        Counting children, looking up rows and :meth:`TreeItem.subtree_size` read the original items.
+        The whole level is created when :attr:`TreeItem.childItems` is accessed.
+        When an item of either hierarchy is changed with the methods of :class:`TreeItem`,
+        the clones along the path from the root are created first and shared item data
+        is copied with :meth:`ItemData.copy` for the clones before it is changed.
+        The original items keep their item data.
+        So the original and the clone never see the changes of each other.
+        Changing an :class:`ItemData` or the children list directly is not detected.
+
+        :returns: the root of the clone
+        :rtype: :class:`TreeItem`
         :raises: None
         """
-        super(TreeModel, self).__init__(parent)
-        self._root = root
-        self._root.set_model(self)
+        self._get_root()._hasclones = True
+        return _ClonedTreeItem(self, None)
 
-    def index(self, row, column, parent=None):
-        """Return the index of the item in the model specified by the given row,
-        column and parent index.
+    def _add_clone(self, clone):
+        """Remember a clone that reads the children or shares the item data of this item
 
-        :param row: the row of the item
-        :type row: int
-        :param column: the column for the item
-        :type column: int
-        :param parent: the parent index
-        :type parent: :class:`QtCore.QModelIndex`:
-        :returns: the index of the item
-        :rtype: :class:`QtCore.QModelIndex`
+        :param clone: the clone
+        :type clone: :class:`TreeItem`
+        :returns: None
+        :rtype: None
         :raises: None
         """
-        if parent is None:
-            parent = QtCore.QModelIndex()
-        if not self.hasIndex(row, column, parent):
-            return QtCore.QModelIndex()
+        if self._clones is None:
+            self._clones = weakref.WeakSet()
+        self._clones.add(clone)
 
-        if parent.isValid():
-            parentItem = parent.internalPointer()
-        else:
-            parentItem = self._root
+    def _unshare_data(self, ):
+        """Give the clones that share the item data of this item their own copy
 
-        childItem = parentItem.child(row)
-        return self.createIndex(row, column, childItem)
+        Call it before the item data of this item changes.
+        Clones of clones are included.
 
-    def parent(self, index):
-        """Return the parent of the model item with the given index.
-        If the item has no parent, return an invalid QModelIndex.
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if not self._clones:
+            return
+        data = self._data
+        stack = list(self._clones)
+        while stack:
+            clone = stack.pop()
+            if clone._data is data:
+                clone._set_itemdata(data.copy())
+                clone._datashared = False
+            if clone._clones:
+                stack.extend(clone._clones)
+
+    def _prepare_change(self, ):
+        """Create the children of all lazy clones of this item and its ancestors
+
+        Call it before the children or the data of this item change.
+        Afterwards no clone reads the children of the changed items anymore.
 
-        :param index: the index that you want to know the parent of
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if not self._get_root()._hasclones:
+            return
+        path = []
+        item = self
+        while item is not None:
+            path.append(item)
+            item = item._parent
+        # top down, so the new clones of one level get materialized on the next level
+        for item in reversed(path):
+            if item._clones:
+                for clone in list(item._clones):
+                    clone._get_children()
+
+    def subtree_size(self, ):
+        """Return the number of items in the hierarchy under and including this item
+
+        :returns: the number of items
+        :rtype: :class:`int`
+        :raises: None
+        """
+        count = 0
+        stack = [self]
+        while stack:
+            item = stack.pop()
+            count += 1
+            stack.extend(item._peek_children())
+        return count
+
+    def _peek_children(self, ):
+        """Return the children for reading without creating the children of lazy clones
+
+        The returned items might belong to the original hierarchy of a clone.
+        Only use them to inspect the structure.
+
+        :returns: the children
+        :rtype: list of :class:`TreeItem`
+        :raises: None
+        """
+        return self.childItems
+
+    def preorder(self, prune=None):
+        """Iterate over this item and its descendants in depth-first pre-order
+
+        The traversal does not use recursion and keeps only one iterator per level.
+        Do not insert or remove items while iterating.
+
+        :param prune: a function that gets an item and returns True to skip it
+                      and all its descendants. They are not visited at all.
+        :type prune: callable | None
+        :returns: tuples of an item and its depth relative to this item
+        :rtype: generator
+        :raises: None
+        """
+        return _preorder([self], 0, prune)
+
+    def postorder(self, prune=None):
+        """Iterate over this item and its descendants in depth-first post-order
+
+        Children come before their parent, so items can be removed
+        after they were yielded. See :meth:`TreeItem.preorder`.
+
+        :param prune: a function that gets an item and returns True to skip it
+                      and all its descendants
+        :type prune: callable | None
+        :returns: tuples of an item and its depth relative to this item
+        :rtype: generator
+        :raises: None
+        """
+        return _postorder([self], 0, prune)
+
+    def breadth_first(self, prune=None):
+        """Iterate over this item and its descendants level by level
+
+        See :meth:`TreeItem.preorder`.
+
+        :param prune: a function that gets an item and returns True to skip it
+                      and all its descendants
+        :type prune: callable | None
+        :returns: tuples of an item and its depth relative to this item
+        :rtype: generator
+        :raises: None
+        """
+        return _breadth_first([self], 0, prune)
+
+    def leaves(self, prune=None):
+        """Iterate over the items without children in the hierarchy under and including this item
+
+        See :meth:`TreeItem.preorder`.
+
+        :param prune: a function that gets an item and returns True to skip it
+                      and all its descendants
+        :type prune: callable | None
+        :returns: tuples of an item and its depth relative to this item
+        :rtype: generator
+        :raises: None
+        """
+        return _leaves([self], 0, prune)
+
+    def ancestors(self, prune=None):
+        """Iterate over the parent, the parent of the parent and so on up to the root
+
+        :param prune: a function that gets an item and returns True to stop before it
+        :type prune: callable | None
+        :returns: tuples of an ancestor and its distance to this item
+        :rtype: generator
+        :raises: None
+        """
+        item = self._parent
+        distance = 1
+        while item is not None:
+            if prune is not None and prune(item):
+                return
+            yield item, distance
+            item = item._parent
+            distance += 1
+
+    def flags(self, index):
+        """Return the flags for the item
+
+        :param index: the index to query
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: the flags
+        :rtype: QtCore.Qt.ItemFlags
+        :raises: None
+        """
+        return self._data.flags(index.column())
+
+    def to_index(self, column=0):
+        """Return the index for this tree item in the model
+
+        :returns: The index in the model or None, if there is no model
+        :rtype: :class:`QtCore.QModelIndex`
+        :raises: None
+        """
+        model = self._model
+        return model.index_of_item(self, column=column) if model else None
+
+
+class _ClonedTreeItem(TreeItem):
+    """A tree item that clones the children of an original item when they are requested
+
+    Until the children list is needed, only the requested children are cloned.
+    They are kept in a dict by row. See :meth:`TreeItem.clone`.
+    """
+
+    def __init__(self, origin, parent):
+        """Initialize a new clone of origin
+
+        :param origin: the original item
+        :type origin: :class:`TreeItem`
+        :param parent: the parent of the clone
+        :type parent: :class:`TreeItem` | None
+        :raises: None
+        """
+        data = origin._data
+        self._data = None
+        if data is not None and type(data).set_treeitem != ItemData.set_treeitem:
+            # the item data notifies its tree item, so the clone needs its own
+            self._set_itemdata(data.copy())
+        else:
+            self._data = data
+            self._datashared = True
+        self._parent = parent
+        self._children = None
+        self._lazy = True
+        self._requested = None
+        """row -> clone of the children that were requested before the list was created"""
+        self._origin = origin
+        origin._add_clone(self)
+
+    def _get_children(self, ):
+        """Return the children and create the missing clones of the original children on the first access
+
+        :returns: the children
+        :rtype: list of :class:`TreeItem`
+        :raises: None
+        """
+        if self._lazy:
+            origin = self._origin
+            requested = self._requested or {}
+            self._origin = None
+            self._requested = None
+            self._lazy = False
+            children = []
+            for row, child in enumerate(origin.childItems):
+                clone = requested.get(row)
+                children.append(clone if clone is not None else _ClonedTreeItem(child, self))
+            self._children = children
+        return self._children
+
+    def _set_children(self, children):
+        """Replace the children
+
+        :param children: the new children
+        :type children: list of :class:`TreeItem`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._origin = None
+        self._requested = None
+        self._lazy = False
+        self._children = children
+
+    childItems = property(_get_children, _set_children)
+
+    def child(self, row):
+        """Return the child at the specified row
+
+        Only this child gets cloned if the children were not created yet.
+
+        :param row: the row number
+        :type row: int
+        :returns: the child
+        :rtype: :class:`TreeItem`
+        :raises: IndexError
+        """
+        if not self._lazy:
+            return self._children[row]
+        count = self._origin.child_count()
+        if row < 0:
+            row += count
+        if not 0 <= row < count:
+            raise IndexError("Row %s is out of range." % row)
+        if self._requested is None:
+            self._requested = {}
+        clone = self._requested.get(row)
+        if clone is None:
+            clone = _ClonedTreeItem(self._origin.child(row), self)
+            clone._lazyrow = row
+            self._requested[row] = clone
+        return clone
+
+    def child_count(self, ):
+        """Return the number of children without creating them
+
+        :returns: child count
+        :rtype: int
+        :raises: None
+        """
+        if self._lazy:
+            return self._origin.child_count()
+        return len(self._children)
+
+    def row(self, ):
+        """Return the index of this tree item in the parent rows
+
+        :returns: the row of this TreeItem in the parent
+        :rtype: int
+        :raises: None
+        """
+        if self._parent is not None and self._parent._lazy:
+            return self._lazyrow
+        return super(_ClonedTreeItem, self).row()
+
+    def _peek_children(self, ):
+        """Return the children for reading without creating them
+
+        Children that were not requested yet are represented by the original items.
+
+        :returns: the children
+        :rtype: list of :class:`TreeItem`
+        :raises: None
+        """
+        if not self._lazy:
+            return self._children
+        children = self._origin._peek_children()
+        if not self._requested:
+            return children
+        requested = self._requested
+        return [requested.get(row, child) for row, child in enumerate(children)]
+
+
+def _listitemdata_from_nested(obj):
+    """Return a :class:`ListItemData` for the first element of the given tuple
+
+    :param obj: a tuple with a list as first element
+    :type obj: tuple
+    :returns: a new list item data
+    :rtype: :class:`ListItemData`
+    :raises: None
+    """
+    return ListItemData(obj[0])
+
+
+def _reparent(item, parent):
+    """Set the parent of the item and outdate the cached roots of all items
+
+    A root that gets a parent forgets its models, because the models
+    of the hierarchy are stored on its root only.
+    Whether the hierarchy has clones is kept for the new hierarchy of the item.
+
+    :param item: the item
+    :type item: :class:`TreeItem`
+    :param parent: the new parent or None
+    :type parent: :class:`TreeItem` | None
+    :returns: None
+    :rtype: None
+    :raises: None
+    """
+    global _hierarchy_version
+    if parent is not None:
+        if item._rootmodels:
+            item._rootmodels = ()
+        if item._hasclones:
+            parent._get_root()._hasclones = True
+    elif item._parent is not None and item._parent._get_root()._hasclones:
+        item._hasclones = True
+    item._parent = parent
+    # after the parent changed, so a root looked up in the meantime is not cached as current
+    with _hierarchy_lock:
+        _hierarchy_version += 1
+
+
+def _move_in_list(liste, row, destination):
+    """Move the element at row before the element at destination
+
+    :param liste: the list to change in place
+    :type liste: list
+    :param row: the index of the element to move
+    :type row: int
+    :param destination: the index before which the element is inserted,
+                        counted before the element is removed
+    :type destination: int
+    :returns: None
+    :rtype: None
+    :raises: None
+    """
+    element = liste.pop(row)
+    if destination > row:
+        destination -= 1
+    liste.insert(destination, element)
+
+
+def _display_key(item):
+    """Return the display data of all columns of the item
+
+    This is the default key to match items in :meth:`TreeItem.replace_children`.
+
+    :param item: the item
+    :type item: :class:`TreeItem`
+    :returns: the display data of every column
+    :rtype: tuple
+    :raises: None
+    """
+    data = item._data
+    if data is None:
+        return ()
+    return tuple(data.data(column, QtCore.Qt.DisplayRole) for column in range(data.column_count()))
+
+
+def _ranges(rows):
+    """Group the sorted rows into ranges of consecutive numbers
+
+    :param rows: sorted row numbers
+    :type rows: list of int
+    :returns: tuples with the first and last row of each range
+    :rtype: list of tuple
+    :raises: None
+    """
+    ranges = []
+    for row in rows:
+        if ranges and ranges[-1][1] == row - 1:
+            ranges[-1][1] = row
+        else:
+            ranges.append([row, row])
+    return [tuple(r) for r in ranges]
+
+
+def _longest_increasing(seq):
+    """Return the indexes of a longest strictly increasing subsequence of seq
+
+    :param seq: a sequence of comparable elements
+    :type seq: list
+    :returns: the indexes of the elements in the subsequence
+    :rtype: set of int
+    :raises: None
+    """
+    tails = []  # values of the smallest tail of every subsequence length
+    tailindexes = []
+    previous = [None] * len(seq)
+    for i, value in enumerate(seq):
+        pos = bisect.bisect_left(tails, value)
+        if pos:
+            previous[i] = tailindexes[pos - 1]
+        if pos == len(tails):
+            tails.append(value)
+            tailindexes.append(i)
+        else:
+            tails[pos] = value
+            tailindexes[pos] = i
+    result = set()
+    i = tailindexes[-1] if tailindexes else None
+    while i is not None:
+        result.add(i)
+        i = previous[i]
+    return result
+
+
+def _preorder(items, depth, prune):
+    """Yield the items and their descendants in depth-first pre-order
+
+    Only one iterator per level is kept, so the memory depends on the depth only.
+
+    :param items: the top items
+    :type items: list of :class:`TreeItem`
+    :param depth: the depth of the top items
+    :type depth: :class:`int`
+    :param prune: a function that returns True for items that are skipped together with their descendants
+    :type prune: callable | None
+    :returns: tuples of an item and its depth
+    :rtype: generator
+    :raises: None
+    """
+    stack = [(iter(items), depth)]
+    while stack:
+        children, d = stack[-1]
+        for item in children:
+            if prune is not None and prune(item):
+                continue
+            yield item, d
+            if item.childItems:
+                stack.append((iter(item.childItems), d + 1))
+            break
+        else:
+            stack.pop()
+
+
+def _postorder(items, depth, prune):
+    """Yield the items and their descendants in depth-first post-order
+
+    :param items: the top items
+    :type items: list of :class:`TreeItem`
+    :param depth: the depth of the top items
+    :type depth: :class:`int`
+    :param prune: a function that returns True for items that are skipped together with their descendants
+    :type prune: callable | None
+    :returns: tuples of an item and its depth
+    :rtype: generator
+    :raises: None
+    """
+    stack = [(None, iter(items), depth)]
+    while stack:
+        parent, children, d = stack[-1]
+        for item in children:
+            if prune is not None and prune(item):
+                continue
+            stack.append((item, iter(item.childItems), d + 1))
+            break
+        else:
+            stack.pop()
+            if parent is not None:
+                yield parent, d - 1
+
+
+def _breadth_first(items, depth, prune):
+    """Yield the items and their descendants level by level
+
+    :param items: the top items
+    :type items: list of :class:`TreeItem`
+    :param depth: the depth of the top items
+    :type depth: :class:`int`
+    :param prune: a function that returns True for items that are skipped together with their descendants
+    :type prune: callable | None
+    :returns: tuples of an item and its depth
+    :rtype: generator
+    :raises: None
+    """
+    queue = collections.deque([(items, depth)])
+    while queue:
+        children, d = queue.popleft()
+        for item in children:
+            if prune is not None and prune(item):
+                continue
+            yield item, d
+            if item.childItems:
+                queue.append((item.childItems, d + 1))
+
+
+def _leaves(items, depth, prune):
+    """Yield the items without children in depth-first order
+
+    :param items: the top items
+    :type items: list of :class:`TreeItem`
+    :param depth: the depth of the top items
+    :type depth: :class:`int`
+    :param prune: a function that returns True for items that are skipped together with their descendants
+    :type prune: callable | None
+    :returns: tuples of an item and its depth
+    :rtype: generator
+    :raises: None
+    """
+    for item, d in _preorder(items, depth, prune):
+        if not item.childItems:
+            yield item, d
+
+
+class _Aggregate(object):
+    """Caches a value per item that combines the value of the item with the values of its children
+
+    The kinds are ``'count'``, ``'sum'``, ``'min'`` and ``'max'``.
+    The cached values are updated incrementally by the model.
+    Sums ignore values that are not numbers.
+    """
+
+    def __init__(self, model, kind, sourcecolumn, role):
+        """Initialize a new aggregate
+
+        :param model: the model that holds the items
+        :type model: :class:`TreeModel`
+        :param kind: ``'count'``, ``'sum'``, ``'min'`` or ``'max'``
+        :type kind: :class:`str`
+        :param sourcecolumn: the column with the values of the items. Ignored for counting.
+        :type sourcecolumn: :class:`int` | None
+        :param role: the role to query the values with
+        :type role: :data:`QtCore.Qt.ItemDataRole`
+        :raises: :class:`ValueError` if the kind is unknown
+        """
+        if kind not in ('count', 'sum', 'min', 'max'):
+            raise ValueError("Unknown aggregate %r." % (kind,))
+        self.model = model
+        self.kind = kind
+        self.sourcecolumn = sourcecolumn
+        self.role = role
+        self.values = {}
+
+    def own(self, item):
+        """Return the value of the item itself
+
+        The root does not contribute to the aggregate.
+
+        :param item: the item
+        :type item: :class:`TreeItem`
+        :returns: the value or None
+        :raises: None
+        """
+        if item is self.model._root:
+            return None
+        if self.kind == 'count':
+            return 1
+        if item._data is None:
+            return None
+        value = item._data.data(self.sourcecolumn, self.role)
+        if self.kind == 'sum' and not isinstance(value, numbers.Number):
+            return None
+        return value
+
+    def compute(self, item):
+        """Return the aggregate of the item from its own value and the cached values of its children
+
+        :param item: the item
+        :type item: :class:`TreeItem`
+        :returns: the aggregate
+        :raises: None
+        """
+        get = self.values.get
+        values = [get(child) for child in item.childItems]
+        values.append(self.own(item))
+        values = [v for v in values if v is not None]
+        if self.kind == 'count' or self.kind == 'sum':
+            return sum(values)
+        if not values:
+            return None
+        return min(values) if self.kind == 'min' else max(values)
+
+    def build(self, item):
+        """Compute and cache the aggregates of all items in the hierarchy under and including item
+
+        :param item: the top item
+        :type item: :class:`TreeItem`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        stack = [(item, False)]
+        while stack:
+            i, visited = stack.pop()
+            if visited:
+                self.values[i] = self.compute(i)
+            else:
+                stack.append((i, True))
+                stack.extend((child, False) for child in i.childItems)
+
+    def propagate(self, parent, old, new, changed):
+        """Update the ancestors after the aggregate of one of their children changed from old to new
+
+        Sums and counts are updated with the difference. Sums of floats get recomputed
+        from the children of an ancestor instead, because the differences would
+        accumulate rounding errors. Minimum and maximum
+        only get recomputed from the children of an ancestor if the old value was the extreme.
+        The walk stops at the first ancestor whose aggregate did not change.
+
+        :param parent: the parent of the changed child
+        :type parent: :class:`TreeItem` | None
+        :param old: the old aggregate of the child. None if it was inserted.
+        :param new: the new aggregate of the child. None if it was removed.
+        :param changed: a list to append the changed ancestors to
+        :type changed: list
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        values = self.values
+        additive = self.kind == 'count' or self.kind == 'sum'
+        while parent is not None and old != new and parent in values:
+            current = values[parent]
+            if additive and (isinstance(current, float) or isinstance(old, float) or isinstance(new, float)):
+                updated = self.compute(parent)
+            elif additive:
+                updated = current - (old or 0) + (new or 0)
+            elif new is not None and (current is None or
+                                      (new <= current if self.kind == 'min' else new >= current)):
+                updated = new
+            elif old is not None and old == current:
+                updated = self.compute(parent)
+            else:
+                updated = current
+            if updated == current:
+                return
+            values[parent] = updated
+            changed.append(parent)
+            old, new = current, updated
+            parent = parent._parent
+
+    def display(self, item):
+        """Return the cached aggregate for displaying it
+
+        Counts exclude the item itself.
+
+        :param item: the item
+        :type item: :class:`TreeItem`
+        :returns: the aggregate
+        :raises: None
+        """
+        value = self.values.get(item)
+        if self.kind == 'count' and value is not None:
+            return value - 1
+        return value
+
+
+class _OrderIndex(object):
+    """Maps between items and their position in the fully expanded tree
+
+    The size of the subtree of every item is cached. For every parent that was queried,
+    a Fenwick tree over the subtree sizes of its children allows prefix sums and searches
+    in logarithmic time. Inserting or removing children drops the Fenwick tree of the parent.
+    It is rebuilt on the next query. Size changes deeper down are applied to the Fenwick trees
+    of the ancestors directly.
+    """
+
+    def __init__(self, root):
+        """Initialize a new index for the hierarchy under root
+
+        :param root: the root item. It is not part of the order.
+        :type root: :class:`TreeItem`
+        :raises: None
+        """
+        self.root = root
+        self.sizes = {}
+        self.trees = {}
+        """parent -> (Fenwick tree as list, child -> row)"""
+        self.build(root)
+
+    def build(self, item):
+        """Compute and cache the subtree sizes of all items under and including item
+
+        :param item: the top item
+        :type item: :class:`TreeItem`
+        :returns: the size of the subtree
+        :rtype: :class:`int`
+        :raises: None
+        """
+        sizes = self.sizes
+        stack = [(item, False)]
+        while stack:
+            i, visited = stack.pop()
+            if visited:
+                sizes[i] = 1 + sum(sizes[child] for child in i.childItems)
+            else:
+                stack.append((i, True))
+                stack.extend((child, False) for child in i.childItems)
+        return sizes[item]
+
+    def _tree(self, parent):
+        """Return the Fenwick tree and the row mapping for the children of parent
+
+        :param parent: the parent item
+        :type parent: :class:`TreeItem`
+        :returns: the Fenwick tree and a dict that maps the children to their rows
+        :rtype: :class:`tuple`
+        :raises: None
+        """
+        entry = self.trees.get(parent)
+        if entry is None:
+            children = parent.childItems
+            tree = [0] + [self.sizes[child] for child in children]
+            n = len(children)
+            for i in range(1, n + 1):
+                j = i + (i & -i)
+                if j <= n:
+                    tree[j] += tree[i]
+            entry = (tree, dict((child, row) for row, child in enumerate(children)))
+            self.trees[parent] = entry
+        return entry
+
+    def invalidate(self, parent):
+        """Drop the Fenwick tree of parent because its children changed
+
+        :param parent: the parent item
+        :type parent: :class:`TreeItem`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self.trees.pop(parent, None)
+
+    def _grow(self, item, delta):
+        """Add delta to the subtree size of item and its ancestors
+
+        :param item: the first item to update
+        :type item: :class:`TreeItem`
+        :param delta: the difference
+        :type delta: :class:`int`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        while item is not None:
+            self.sizes[item] += delta
+            parent = item._parent
+            entry = self.trees.get(parent) if parent is not None else None
+            if entry is not None:
+                tree = entry[0]
+                i = entry[1][item] + 1
+                while i < len(tree):
+                    tree[i] += delta
+                    i += i & -i
+            item = parent
+
+    def inserted(self, parent, items):
+        """Update the index after items were inserted under parent
+
+        :param parent: the parent item
+        :type parent: :class:`TreeItem`
+        :param items: the inserted items
+        :type items: list of :class:`TreeItem`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        delta = sum(self.build(item) for item in items)
+        self.invalidate(parent)
+        self._grow(parent, delta)
+
+    def removed(self, parent, items):
+        """Update the index after items were removed from parent
+
+        :param parent: the parent item
+        :type parent: :class:`TreeItem`
+        :param items: the removed items
+        :type items: list of :class:`TreeItem`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        delta = 0
+        for item in items:
+            delta += self.sizes.get(item, 0)
+            stack = [item]
+            while stack:
+                i = stack.pop()
+                self.sizes.pop(i, None)
+                self.trees.pop(i, None)
+                stack.extend(i.childItems)
+        self.invalidate(parent)
+        self._grow(parent, -delta)
+
+    def position(self, item):
+        """Return the position of item in the fully expanded tree
+
+        :param item: the item
+        :type item: :class:`TreeItem`
+        :returns: the position
+        :rtype: :class:`int`
+        :raises: None
+        """
+        position = 0
+        while item is not self.root:
+            parent = item._parent
+            tree, rows = self._tree(parent)
+            i = rows[item]
+            while i > 0:
+                position += tree[i]
+                i -= i & -i
+            if parent is not self.root:
+                position += 1
+            item = parent
+        return position
+
+    def item(self, position):
+        """Return the item at the given position in the fully expanded tree
+
+        :param position: the position
+        :type position: :class:`int`
+        :returns: the item
+        :rtype: :class:`TreeItem`
+        :raises: :class:`IndexError` if the position is out of range
+        """
+        if not 0 <= position < self.sizes[self.root] - 1:
+            raise IndexError("Position %s out of range." % position)
+        item = self.root
+        while True:
+            tree = self._tree(item)[0]
+            # find the last child whose preceding siblings span at most position items
+            row = 0
+            step = 1
+            while step * 2 < len(tree):
+                step *= 2
+            while step:
+                if row + step < len(tree) and tree[row + step] <= position:
+                    row += step
+                    position -= tree[row]
+                step //= 2
+            item = item.childItems[row]
+            if not position:
+                return item
+            position -= 1
+
+
+class TreeModel(QtCore.QAbstractItemModel):
+    """A tree model that uses the :class:`TreeItem` to represent a general tree.
+
+    The model uses :class:`TreeItem` instances in an hierarchy to build a tree.
+    Each tree item represents a row. The tree items can hold arbitrary :class:`ItemData`
+    instances.
+
+    The model will get automatically updated, when the hierarchy of the tree items changes.
+    You rarely have to use model methods for that. Just use methods of the tree items.
+
+    All models need at least a root. The root is responsible for the headers.
+    So the :class:`ItemData` of the root should have a columns for each header and return
+    a string for them when queried with :data:`QtCore.Qt.DisplayRole`. Only horizontal
+    headers are supported at the moment. Vertical headers get numbers.
+    """
+
+    def __init__(self, root, parent=None):
+        """Initialize a new tree model with the given root treeitem
+
+        :param root: the root tree item. The root tree item is responsible for the headers.
+                     A :class:`ListItemData` with the headers is suitable as data for the item.
+                     It must not have a parent.
+        :type root: :class:`TreeItem`
+        :param parent: the parent for the model
+        :type parent: :class:`QtCore.QObject`
+        :raises: :class:`ValueError` if the root has a parent
+        """
+        root._check_root()
+        super(TreeModel, self).__init__(parent)
+        self._root = root
+        self._root.add_model(self)
+        self._dirty = {}
+        self._held = 0
+        self._rowmaps = weakref.WeakKeyDictionary()
+        """parent -> id of child -> row. See :meth:`TreeModel._row`."""
+        self._update_timer = QtCore.QTimer(self)
+        self._update_timer.setSingleShot(True)
+        self._update_timer.timeout.connect(self.flush_updates)
+        self._node_budget = 0
+        self._node_count = 0
+        self._loaded = collections.OrderedDict()
+        self._expanded = set()
+        self._budget_timer = QtCore.QTimer(self)
+        self._budget_timer.setSingleShot(True)
+        self._budget_timer.timeout.connect(self.enforce_node_budget)
+        self._aggregates = {}
+        self._order = None
+        self._journal = None
+
+    def index(self, row, column, parent=None):
+        """Return the index of the item in the model specified by the given row,
+        column and parent index.
+
+        :param row: the row of the item
+        :type row: int
+        :param column: the column for the item
+        :type column: int
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: the index of the item
+        :rtype: :class:`QtCore.QModelIndex`
+        :raises: None
+        """
+        if parent is None:
+            parent = QtCore.QModelIndex()
+        if not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+
+        if parent.isValid():
+            parentItem = _items_by_id.get(parent.internalId())
+            if parentItem is None:
+                return QtCore.QModelIndex()
+        else:
+            parentItem = self._root
+
+        childItem = parentItem.child(row)
+        return self.createIndex(row, column, childItem.item_id())
+
+    def parent(self, index):
+        """Return the parent of the model item with the given index.
+        If the item has no parent, return an invalid QModelIndex.
+
+        :param index: the index that you want to know the parent of
         :type index: :class:`QtCore.QModelIndex`
         :returns: parent index
         :rtype: :class:`QtCore.QModelIndex`
@@ -550,11 +2112,13 @@ class TreeModel(QtCore.QAbstractItemModel):
         """
         if not index.isValid():
             return QtCore.QModelIndex()
-        childItem = index.internalPointer()
-        parentItem = childItem.parent()
-        if parentItem is self._root:
+        childItem = _items_by_id.get(index.internalId())
+        if childItem is None:
+            return QtCore.QModelIndex()
+        parentItem = childItem._parent
+        if parentItem is self._root or parentItem is None or parentItem._parent is None:
             return QtCore.QModelIndex()
-        return self.createIndex(parentItem.row(), 0, parentItem)
+        return self.createIndex(self._row(parentItem), 0, parentItem.item_id())
 
     def rowCount(self, parent):
         """Return the number of rows under the given parent.
@@ -572,9 +2136,62 @@ class TreeModel(QtCore.QAbstractItemModel):
         if not parent.isValid():
             parentItem = self._root
         else:
-            parentItem = parent.internalPointer()
+            parentItem = _items_by_id.get(parent.internalId())
+            if parentItem is None:
+                return 0
         return parentItem.child_count()
 
+    def hasChildren(self, parent=None):
+        """Return True if the parent has children or can fetch them
+
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: True, if the parent has children
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        if parent is None:
+            parent = QtCore.QModelIndex()
+        if parent.column() > 0:
+            return False
+        item = self.item_of_index(parent)
+        if item is None:
+            return False
+        return bool(item.child_count()) or item.can_fetch_more()
+
+    def canFetchMore(self, parent):
+        """Return True if the parent has children that are not loaded yet
+
+        See :meth:`ItemData.can_fetch_more`.
+
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: True, if more children can be fetched
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        item = self.item_of_index(parent)
+        return item is not None and item.can_fetch_more()
+
+    def fetchMore(self, parent):
+        """Load the missing children of the parent
+
+        See :meth:`ItemData.fetch_more`.
+
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`:
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        item = self.item_of_index(parent)
+        if item is None:
+            return
+        item.fetch_more()
+        if self._node_budget and item is not self._root:
+            self._loaded.pop(item, None)
+            self._loaded[item] = None
+
     def columnCount(self, parent):
         """Return the number of columns for the children of the given parent.
 
@@ -585,7 +2202,8 @@ class TreeModel(QtCore.QAbstractItemModel):
         :raises: None
         """
         if parent.isValid():
-            return parent.internalPointer().column_count()
+            item = _items_by_id.get(parent.internalId())
+            return item.column_count() if item is not None else 0
         else:
             return self._root.column_count()
 
@@ -601,8 +2219,29 @@ class TreeModel(QtCore.QAbstractItemModel):
         """
         if not index.isValid():
             return
-        item = index.internalPointer()
-        return item.data(index.column(), role)
+        item = _items_by_id.get(index.internalId())
+        if item is None:
+            return
+        return self.item_data(item, index.column(), role)
+
+    def item_data(self, item, column, role=QtCore.Qt.DisplayRole):
+        """Return the data of the given item like :meth:`TreeModel.data` does
+
+        This avoids creating an index, e.g. for models that show the items of this model.
+
+        :param item: an item of this model
+        :type item: :class:`TreeItem`
+        :param column: the column
+        :type column: :class:`int`
+        :param role: the data role
+        :type role: QtCore.Qt.ItemDataRole
+        :returns: some data depending on the role
+        :raises: None
+        """
+        aggregate = self._aggregates.get(column)
+        if aggregate is not None and role == QtCore.Qt.DisplayRole:
+            return aggregate.display(item)
+        return item.data(column, role)
 
     def setData(self, index, value, role=QtCore.Qt.EditRole):
         """Set the data of the given index to value
@@ -618,7 +2257,9 @@ class TreeModel(QtCore.QAbstractItemModel):
         """
         if not index.isValid():
             return False
-        item = index.internalPointer()
+        item = _items_by_id.get(index.internalId())
+        if item is None:
+            return False
         r = item.set_data(index.column(), value, role)
         return r
 
@@ -647,55 +2288,194 @@ class TreeModel(QtCore.QAbstractItemModel):
         if orientation == QtCore.Qt.Vertical and role == QtCore.Qt.DisplayRole:
             return str(section + 1)
 
-    def insertRow(self, row, item, parent):
-        """Insert a single item before the given row in the child items of the parent specified.
+    def insertRow(self, row, item, parent):
+        """Insert a single item before the given row in the child items of the parent specified.
+
+        :param row: the index where the rows get inserted
+        :type row: int
+        :param item: the item to insert. When creating the item, make sure it's parent is None.
+                     If not it will defeat the purpose of this function.
+        :type item: :class:`TreeItem`
+        :param parent: the parent
+        :type parent: :class:`QtCore.QModelIndex`
+        :returns: Returns true if the row is inserted; otherwise returns false.
+        :rtype: bool
+        :raises: None
+        """
+        if parent.isValid():
+            parentitem = _items_by_id.get(parent.internalId())
+            if parentitem is None:
+                return False
+        else:
+            parentitem = self._root
+        observers = self._observers(parentitem, parent)
+        for model, index in observers:
+            model.beginInsertRows(index, row, row)
+        _reparent(item, parentitem)
+        if parentitem:
+            parentitem.childItems.insert(row, item)
+        for model, index in observers:
+            model.endInsertRows()
+            model._items_added([item])
+            model._record('insert', parentitem, row, row, [item])
+        return True
+
+    def removeRow(self, row, parent):
+        """Remove row from parent
+
+        :param row: the row index
+        :type row: int
+        :param parent: the parent index
+        :type parent: :class:`QtCore.QModelIndex`
+        :returns: True if row is inserted; otherwise returns false.
+        :rtype: bool
+        :raises: None
+        """
+        if parent.isValid():
+            parentitem = _items_by_id.get(parent.internalId())
+            if parentitem is None:
+                return False
+        else:
+            parentitem = self._root
+        observers = self._observers(parentitem, parent)
+        for model, index in observers:
+            model.beginRemoveRows(index, row, row)
+        item = parentitem.childItems[row]
+        _reparent(item, None)
+        del parentitem.childItems[row]
+        for model, index in observers:
+            model.endRemoveRows()
+            model._items_removed(parentitem, [item])
+            model._record('remove', parentitem, row, row, [item])
+        return True
+
+    def insert_items(self, row, items, parent):
+        """Insert multiple items before the given row in the child items of the parent specified.
+
+        In contrast to calling :meth:`TreeModel.insertRow` for every item,
+        the views only get notified once.
+
+        :param row: the index where the items get inserted
+        :type row: int
+        :param items: the items to insert. Their parent should be None.
+        :type items: list of :class:`TreeItem`
+        :param parent: the parent
+        :type parent: :class:`QtCore.QModelIndex`
+        :returns: Returns true if the items are inserted; otherwise returns false.
+        :rtype: bool
+        :raises: None
+        """
+        if not items:
+            return False
+        if parent.isValid():
+            parentitem = _items_by_id.get(parent.internalId())
+            if parentitem is None:
+                return False
+        else:
+            parentitem = self._root
+        observers = self._observers(parentitem, parent)
+        for model, index in observers:
+            model.beginInsertRows(index, row, row + len(items) - 1)
+        for item in items:
+            _reparent(item, parentitem)
+        parentitem.childItems[row:row] = items
+        for model, index in observers:
+            model.endInsertRows()
+            model._items_added(items)
+            model._record('insert', parentitem, row, row + len(items) - 1, items)
+        return True
+
+    def remove_items(self, row, count, parent):
+        """Remove count rows starting with the given row from parent
 
-        :param row: the index where the rows get inserted
+        :param row: the first row to remove
         :type row: int
-        :param item: the item to insert. When creating the item, make sure it's parent is None.
-                     If not it will defeat the purpose of this function.
-        :type item: :class:`TreeItem`
-        :param parent: the parent
+        :param count: the number of rows to remove
+        :type count: int
+        :param parent: the parent index
         :type parent: :class:`QtCore.QModelIndex`
-        :returns: Returns true if the row is inserted; otherwise returns false.
+        :returns: True if the rows are removed; otherwise returns false.
         :rtype: bool
         :raises: None
         """
-        item.set_model(self)
+        if count <= 0:
+            return False
         if parent.isValid():
-            parentitem = parent.internalPointer()
+            parentitem = _items_by_id.get(parent.internalId())
+            if parentitem is None:
+                return False
         else:
             parentitem = self._root
-        self.beginInsertRows(parent, row, row)
-        item._parent = parentitem
-        if parentitem:
-            parentitem.childItems.insert(row, item)
-        self.endInsertRows()
+        observers = self._observers(parentitem, parent)
+        for model, index in observers:
+            model.beginRemoveRows(index, row, row + count - 1)
+        removed = parentitem.childItems[row:row + count]
+        for item in removed:
+            _reparent(item, None)
+        del parentitem.childItems[row:row + count]
+        for model, index in observers:
+            model.endRemoveRows()
+            model._items_removed(parentitem, removed)
+            model._record('remove', parentitem, row, row + count - 1, removed)
         return True
 
-    def removeRow(self, row, parent):
-        """Remove row from parent
+    def move_item(self, row, destination, parent):
+        """Move the item in the given row of parent before the destination row
 
-        :param row: the row index
+        The destination is the row before the move happens.
+        So to move an item to the end, use the child count of the parent.
+
+        :param row: the row of the item to move
         :type row: int
+        :param destination: the row before which the item is inserted
+        :type destination: int
         :param parent: the parent index
         :type parent: :class:`QtCore.QModelIndex`
-        :returns: True if row is inserted; otherwise returns false.
+        :returns: True if the item was moved; otherwise returns false.
         :rtype: bool
         :raises: None
         """
         if parent.isValid():
-            parentitem = parent.internalPointer()
+            parentitem = _items_by_id.get(parent.internalId())
+            if parentitem is None:
+                return False
         else:
             parentitem = self._root
-        self.beginRemoveRows(parent, row, row)
+        observers = []
+        for model, index in self._observers(parentitem, parent):
+            if model.beginMoveRows(index, row, row, index, destination):
+                observers.append(model)
+            elif model is self:
+                return False
         item = parentitem.childItems[row]
-        item.set_model(None)
-        item._parent = None
-        del parentitem.childItems[row]
-        self.endRemoveRows()
+        _move_in_list(parentitem.childItems, row, destination)
+        for model in observers:
+            if model._order is not None:
+                model._order.invalidate(parentitem)
+            model.endMoveRows()
+            model._record('move', parentitem, row, destination, [item])
         return True
 
+    def _observers(self, parentitem, parent):
+        """Return all models of the hierarchy together with their index for parentitem
+
+        Structural changes have to be announced to every model, before the
+        children list changes, and finished for every model afterwards.
+
+        :param parentitem: the item whose children change
+        :type parentitem: :class:`TreeItem`
+        :param parent: the index of parentitem in this model
+        :type parent: :class:`QtCore.QModelIndex`
+        :returns: tuples of a model and the parent index in that model. This model comes first.
+        :rtype: list of tuple
+        :raises: None
+        """
+        observers = [(self, parent)]
+        for model in self._root._rootmodels:
+            if model is not self:
+                observers.append((model, model.index_of_item(parentitem)))
+        return observers
+
     @property
     def root(self, ):
         """Return the root tree item
@@ -706,6 +2486,44 @@ class TreeModel(QtCore.QAbstractItemModel):
         """
         return self._root
 
+    def set_root(self, root):
+        """Replace the root tree item and with it the whole content of the model
+
+        The new hierarchy can be built without a model, e.g. in another thread,
+        and then swapped in at once. Views, proxies and cascade views keep using
+        this model but get reset.
+        The old root gets detached from this model. Because only the root stores the models,
+        this does not walk the old hierarchy. Other models of the old root keep it.
+        Pending throttled data changes are discarded.
+
+        :param root: the new root tree item. It must not have a parent.
+        :type root: :class:`TreeItem`
+        :returns: the old root
+        :rtype: :class:`TreeItem`
+        :raises: :class:`ValueError` if the root has a parent
+        """
+        root._check_root()
+        self.beginResetModel()
+        self._update_timer.stop()
+        self._dirty = {}
+        old = self._root
+        old.remove_model(self)
+        self._root = root
+        root.add_model(self)
+        self._loaded.clear()
+        self._expanded.clear()
+        if self._node_budget:
+            self._node_count = root.subtree_size()
+        for aggregate in self._aggregates.values():
+            aggregate.values.clear()
+            aggregate.build(root)
+        if self._order is not None:
+            self._order = _OrderIndex(root)
+        self.endResetModel()
+        if self._journal is not None:
+            self._journal.record('reset', root.item_id(), None, None, [])
+        return old
+
     def flags(self, index):
         """Return the flags for the given index
 
@@ -718,11 +2536,121 @@ class TreeModel(QtCore.QAbstractItemModel):
         :raises: None
         """
         if index.isValid():
-            item = index.internalPointer()
+            item = _items_by_id.get(index.internalId())
+            if item is None:
+                return QtCore.Qt.NoItemFlags
             return item.flags(index)
         else:
             super(TreeModel, self).flags(index)
 
+    def prefetch(self, indexes):
+        """Tell the item data of the given indexes that their rows are about to be displayed
+
+        The item data are grouped by their class and :meth:`ItemData.prefetch`
+        is called once for each class.
+        See :class:`easymodel.ViewPrefetcher` for a helper that calls this for the visible rows of a view.
+
+        :param indexes: the indexes of the rows
+        :type indexes: iterable of :class:`QtCore.QModelIndex`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        groups = {}
+        seen = set()
+        for index in indexes:
+            if not index.isValid():
+                continue
+            item = _items_by_id.get(index.internalId())
+            if item is None:
+                continue
+            data = item.itemdata()
+            if data is None or id(data) in seen:
+                continue
+            seen.add(id(data))
+            groups.setdefault(type(data), []).append(data)
+        for cls, datas in groups.items():
+            cls.prefetch(datas)
+
+    def item_of_index(self, index):
+        """Return the item of the given index
+
+        :param index: an index of this model
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: the item, the root for an invalid index
+                  or None if the item of the index does not exist anymore
+        :rtype: :class:`TreeItem` | None
+        :raises: None
+        """
+        if index.isValid():
+            return _items_by_id.get(index.internalId())
+        return self._root
+
+    def item_for_id(self, itemid):
+        """Return the item with the given id
+
+        See :meth:`TreeItem.item_id`. This is a lookup in a table and does not
+        check that the item belongs to this model.
+
+        :param itemid: the id of the item
+        :type itemid: :class:`int`
+        :returns: the item or None if there is no item with this id anymore
+        :rtype: :class:`TreeItem` | None
+        :raises: None
+        """
+        return _items_by_id.get(itemid)
+
+    def index_for_id(self, itemid, column=0):
+        """Return the index of the item with the given id
+
+        Unlike :meth:`TreeModel.index_of_item`, this does not create the indexes of the parents.
+        The parents are only walked up to check that the item belongs to this model.
+        The row of the item is looked up in a cached row map of its parent.
+
+        :param itemid: the id of the item. See :meth:`TreeItem.item_id`.
+        :type itemid: :class:`int`
+        :param column: the column of the index
+        :type column: :class:`int`
+        :returns: the index or an invalid index if there is no item with this id in this model
+        :rtype: :class:`QtCore.QModelIndex`
+        :raises: None
+        """
+        item = _items_by_id.get(itemid)
+        if item is None or item._parent is None:
+            return QtCore.QModelIndex()
+        root = item._parent
+        while root._parent is not None:
+            root = root._parent
+        if root is not self._root:
+            return QtCore.QModelIndex()
+        return self.createIndex(self._row(item), column, itemid)
+
+    def _row(self, item):
+        """Return the row of the item in its parent
+
+        The rows of the children of a parent are cached. A cached row is used
+        if the parent still has the item in that row. Otherwise the rows are mapped again.
+        Clones that did not create their children yet know the rows of the requested ones.
+
+        :param item: an item with a parent
+        :type item: :class:`TreeItem`
+        :returns: the row
+        :rtype: :class:`int`
+        :raises: :class:`KeyError` if the item is not a child of its parent
+        """
+        parent = item._parent
+        if parent._lazy:
+            return item._lazyrow
+        children = parent.childItems
+        rows = self._rowmaps.get(parent)
+        if rows is not None:
+            row = rows.get(id(item))
+            if row is not None and row < len(children) and children[row] is item:
+                return row
+        rows = dict((id(child), row) for row, child in enumerate(children))
+        self._rowmaps[parent] = rows
+        return rows[id(item)]
+
     def index_of_item(self, item, column=0):
         """Get the index for the given TreeItem
 
@@ -756,10 +2684,652 @@ class TreeModel(QtCore.QAbstractItemModel):
         # get the parent indexes until
         index = QtCore.QModelIndex()
         for treeitem in reversed(parents):
-            parent = treeitem.parent()
-            row = parent.childItems.index(treeitem)
-            index = self.index(row, 0, index)
-        parent = item.parent()
-        row = parent.childItems.index(item)
-        index = self.index(row, column, index)
+            index = self.index(self._row(treeitem), 0, index)
+        index = self.index(self._row(item), column, index)
         return index
+
+    def update_rate(self, ):
+        """Return the maximum number of times per second that data changes are emitted
+
+        :returns: the update rate or 0 if every change is emitted immediately
+        :rtype: :class:`float`
+        :raises: None
+        """
+        interval = self._update_timer.interval()
+        if not interval:
+            return 0
+        return 1000.0 / interval
+
+    def set_update_rate(self, rate):
+        """Throttle :data:`QtCore.QAbstractItemModel.dataChanged` to at most
+        ``rate`` emissions per second.
+
+        Changes that are reported via :meth:`TreeModel.item_data_changed`
+        are accumulated and flushed by a timer. All changes under the same
+        parent are coalesced into one signal.
+        Use 0 to disable throttling. Pending changes are flushed in that case.
+
+        :param rate: the maximum updates per second or 0
+        :type rate: :class:`float`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if rate <= 0:
+            self._update_timer.setInterval(0)
+            self.flush_updates()
+            return
+        self._update_timer.setInterval(max(1, int(1000.0 / rate)))
+
+    def hold_updates(self, ):
+        """Accumulate all data changes until :meth:`TreeModel.release_updates` is called
+
+        Use this to change the data of many items and notify the views only once per parent.
+        Calls can be nested.
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._held += 1
+
+    def release_updates(self, ):
+        """Undo one :meth:`TreeModel.hold_updates` and emit the accumulated changes
+        if nothing holds them anymore.
+
+        If an update rate is set, the changes are emitted with the next flush.
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._held = max(0, self._held - 1)
+        if self._held or not self._dirty:
+            return
+        if not self._update_timer.interval():
+            self.flush_updates()
+        elif not self._update_timer.isActive():
+            self._update_timer.start()
+
+    def item_data_changed(self, item, first, last=None):
+        """Notify the views that the data of the item changed in
+        the columns from ``first`` to ``last``.
+
+        If an update rate is set, the change is emitted with the next
+        flush. See :meth:`TreeModel.set_update_rate`.
+        While updates are held, the change is emitted on :meth:`TreeModel.release_updates`.
+
+        :param item: the item that changed
+        :type item: :class:`TreeItem`
+        :param first: the first column that changed
+        :type first: :class:`int`
+        :param last: the last column that changed. If None, use ``first``.
+        :type last: :class:`int` | None
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if last is None:
+            last = first
+        if not self._update_timer.interval() and not self._aggregates and not self._held:
+            self._record_data([(item, first, last)])
+            topleft = self.index_of_item(item, first)
+            if topleft.isValid():
+                self.dataChanged.emit(topleft, self.index_of_item(item, last))
+            return
+        self.items_data_changed([(item, first, last)])
+
+    def items_data_changed(self, changes):
+        """Notify the views that the data of several items changed
+
+        Changes of items with the same parent are coalesced into one
+        :data:`QtCore.QAbstractItemModel.dataChanged` signal.
+        If an update rate is set, the changes are emitted with the next flush.
+        See :meth:`TreeModel.set_update_rate`.
+
+        :param changes: tuples of an item, the first and the last column that changed
+        :type changes: iterable of tuple
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if self._aggregates or self._journal is not None:
+            changes = list(changes)
+            self._record_data(changes)
+        if self._aggregates:
+            changes.extend(self._aggregate_changes(changes))
+        self._queue_changes(changes)
+
+    def journal(self, ):
+        """Return the journal of the changes of the hierarchy
+
+        The journal gets created when it is requested the first time.
+        Changes are only recorded while the journal has readers.
+        Derived changes, e.g. of aggregates, are not recorded.
+
+        :returns: the journal
+        :rtype: :class:`ChangeJournal`
+        :raises: None
+        """
+        if self._journal is None:
+            self._journal = ChangeJournal()
+        return self._journal
+
+    def _record(self, kind, parentitem, first, last, items):
+        """Append a structural change to the journal if it has readers
+
+        :param kind: the kind of change. See :class:`ChangeRecord`.
+        :type kind: :class:`str`
+        :param parentitem: the parent of the items
+        :type parentitem: :class:`TreeItem`
+        :param first: the first row
+        :type first: :class:`int`
+        :param last: the last row
+        :type last: :class:`int`
+        :param items: the changed items
+        :type items: list of :class:`TreeItem`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        journal = self._journal
+        if journal is not None and journal.active:
+            journal.record(kind, parentitem.item_id(), first, last, [item.item_id() for item in items])
+
+    def _record_data(self, changes):
+        """Append data changes to the journal if it has readers
+
+        :param changes: tuples of an item, the first and the last column that changed
+        :type changes: list of tuple
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        journal = self._journal
+        if journal is None or not journal.active:
+            return
+        for item, first, last in changes:
+            parent = item._parent
+            journal.record('data', parent.item_id() if parent is not None else None,
+                           first, last, [item.item_id()])
+
+    def _queue_changes(self, changes):
+        """Accumulate the changes and flush them now or start the update timer
+
+        :param changes: tuples of an item, the first and the last column that changed
+        :type changes: iterable of tuple
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        dirty = self._dirty
+        for item, first, last in changes:
+            cols = dirty.get(item)
+            if cols is not None:
+                first = min(first, cols[0])
+                last = max(last, cols[1])
+            dirty[item] = (first, last)
+        if self._held:
+            return
+        if not self._update_timer.interval():
+            self.flush_updates()
+        elif dirty and not self._update_timer.isActive():
+            self._update_timer.start()
+
+    def flush_updates(self, ):
+        """Emit all accumulated data changes now
+
+        The changed items are grouped by their parent. For every parent one
+        :data:`QtCore.QAbstractItemModel.dataChanged` signal is emitted,
+        that spans all changed rows and columns. Items that were removed
+        from the model in the meantime are skipped.
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._update_timer.stop()
+        dirty = self._dirty
+        self._dirty = {}
+        groups = {}
+        for item, columns in dirty.items():
+            parent = item._parent
+            if parent is not None:
+                groups.setdefault(parent, []).append((item, columns))
+        for parent, changes in groups.items():
+            if self not in parent.get_models():
+                continue
+            parentindex = self.index_of_item(parent)
+            if parent is not self._root and not parentindex.isValid():
+                continue
+            if len(changes) == 1:
+                rows = [parent.childItems.index(changes[0][0])]
+            else:
+                # one pass over the siblings instead of one search per changed item
+                rowmap = dict((child, row) for row, child in enumerate(parent.childItems))
+                rows = [rowmap[item] for item, columns in changes]
+            first = min(columns[0] for item, columns in changes)
+            last = max(columns[1] for item, columns in changes)
+            self.dataChanged.emit(self.index(min(rows), first, parentindex),
+                                  self.index(max(rows), last, parentindex))
+
+    def node_budget(self, ):
+        """Return the maximum number of items that should stay loaded
+
+        :returns: the budget or 0 if there is no limit
+        :rtype: :class:`int`
+        :raises: None
+        """
+        return self._node_budget
+
+    def set_node_budget(self, budget):
+        """Limit the number of loaded items in a lazily loaded tree
+
+        Items whose children were loaded with :meth:`TreeModel.fetchMore` are
+        tracked in a least recently used order. When the model holds more
+        items than the budget, the children of the least recently used
+        items get removed with :meth:`TreeItem.unload_children`, so
+        they can be fetched again later. Only item data that supports
+        :meth:`ItemData.can_unload` is unloaded.
+
+        Expanded items are never unloaded. Connect the expanded and collapsed signals
+        of the views to :meth:`TreeModel.index_expanded` and :meth:`TreeModel.index_collapsed`.
+
+        :param budget: the maximum number of items or 0 for no limit
+        :type budget: :class:`int`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._node_budget = max(0, budget)
+        if not self._node_budget:
+            self._loaded.clear()
+            return
+        self._node_count = self._root.subtree_size()
+        self.enforce_node_budget()
+
+    def node_count(self, ):
+        """Return the number of items in the model including the root
+
+        The count is only maintained while a node budget is set.
+
+        :returns: the number of items
+        :rtype: :class:`int`
+        :raises: None
+        """
+        return self._node_count
+
+    def index_expanded(self, index):
+        """Mark the item of the index as in use, so it does not get unloaded
+
+        Connect this to :data:`QtGui.QTreeView.expanded`.
+
+        :param index: the expanded index
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        item = self.item_of_index(index) if index.isValid() else None
+        if item is not None:
+            self._expanded.add(item)
+            if item in self._loaded:
+                del self._loaded[item]
+                self._loaded[item] = None
+
+    def index_collapsed(self, index):
+        """Mark the item of the index as recently used but collapsed, so it can be unloaded
+
+        Connect this to :data:`QtGui.QTreeView.collapsed`.
+
+        :param index: the collapsed index
+        :type index: :class:`QtCore.QModelIndex`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        item = self.item_of_index(index) if index.isValid() else None
+        if item is not None:
+            self._expanded.discard(item)
+            if item in self._loaded:
+                del self._loaded[item]
+                self._loaded[item] = None
+            self.enforce_node_budget()
+
+    def enforce_node_budget(self, ):
+        """Unload the children of the least recently used items until the budget is met
+
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._budget_timer.stop()
+        if not self._node_budget:
+            return
+        for item in list(self._loaded):
+            if self._node_count <= self._node_budget:
+                break
+            if item not in self._loaded:
+                # unloaded together with an ancestor
+                continue
+            if item in self._expanded:
+                continue
+            if self not in item.get_models():
+                del self._loaded[item]
+                continue
+            if item.unload_children():
+                self._loaded.pop(item, None)
+
+    def _items_added(self, items):
+        """Count the added items and schedule unloading if the budget is exceeded
+
+        :param items: the inserted items with their children
+        :type items: list of :class:`TreeItem`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if self._order is not None:
+            self._order.inserted(items[0]._parent, items)
+        if self._aggregates:
+            changed = {}
+            for column, aggregate in self._aggregates.items():
+                ancestors = []
+                for item in items:
+                    aggregate.build(item)
+                    aggregate.propagate(item._parent, None, aggregate.values[item], ancestors)
+                changed[column] = ancestors
+            self._emit_aggregates(changed)
+        if not self._node_budget:
+            return
+        self._node_count += sum(item.subtree_size() for item in items)
+        if self._node_count > self._node_budget and not self._budget_timer.isActive():
+            self._budget_timer.start()
+
+    def _items_removed(self, parent, items):
+        """Count the removed items, forget about them and update the aggregates of the parent
+
+        :param parent: the item that the items were removed from
+        :type parent: :class:`TreeItem`
+        :param items: the removed items with their children
+        :type items: list of :class:`TreeItem`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if self._order is not None:
+            self._order.removed(parent, items)
+        if self._aggregates:
+            changed = {}
+            for column, aggregate in self._aggregates.items():
+                ancestors = []
+                for item in items:
+                    old = aggregate.values.get(item)
+                    stack = [item]
+                    while stack:
+                        i = stack.pop()
+                        aggregate.values.pop(i, None)
+                        stack.extend(i.childItems)
+                    aggregate.propagate(parent, old, None, ancestors)
+                changed[column] = ancestors
+            self._emit_aggregates(changed)
+        if not self._node_budget:
+            return
+        stack = list(items)
+        while stack:
+            item = stack.pop()
+            self._node_count -= 1
+            self._loaded.pop(item, None)
+            self._expanded.discard(item)
+            stack.extend(item.childItems)
+
+    def set_aggregate(self, column, kind, sourcecolumn=None, role=QtCore.Qt.DisplayRole):
+        """Show an aggregate of the whole subtree of every item in the given column
+
+        The kinds are:
+
+          :count: the number of items under an item
+          :sum: the sum of the values of an item and all items under it
+          :min: the minimum of the values of an item and all items under it
+          :max: the maximum of the values of an item and all items under it
+
+        The values are queried from the :class:`ItemData` with the source column and role.
+        None is ignored and sums ignore all values that are not numbers. The aggregates are computed once and then maintained incrementally:
+        when items get inserted or removed or :meth:`TreeModel.item_data_changed`
+        is called for the source column, only the ancestors are updated and
+        :data:`QtCore.QAbstractItemModel.dataChanged` is emitted for their aggregate cells.
+        The aggregate replaces the data of the column for :data:`QtCore.Qt.DisplayRole`.
+
+        :param column: the column to show the aggregate in
+        :type column: :class:`int`
+        :param kind: ``'count'``, ``'sum'``, ``'min'`` or ``'max'``
+        :type kind: :class:`str`
+        :param sourcecolumn: the column with the values. If None, use column.
+        :type sourcecolumn: :class:`int` | None
+        :param role: the role to query the values with
+        :type role: :data:`QtCore.Qt.ItemDataRole`
+        :returns: None
+        :rtype: None
+        :raises: :class:`ValueError` if the kind is unknown
+        """
+        aggregate = _Aggregate(self, kind, column if sourcecolumn is None else sourcecolumn, role)
+        aggregate.build(self._root)
+        self._aggregates[column] = aggregate
+        self._emit_column_changed(column)
+
+    def remove_aggregate(self, column):
+        """Stop showing an aggregate in the given column
+
+        :param column: the column of the aggregate
+        :type column: :class:`int`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        if self._aggregates.pop(column, None) is not None:
+            self._emit_column_changed(column)
+
+    def aggregate(self, item, column):
+        """Return the aggregate of the given item in the given column
+
+        :param item: the item
+        :type item: :class:`TreeItem`
+        :param column: the column of the aggregate
+        :type column: :class:`int`
+        :returns: the aggregate
+        :raises: :class:`KeyError` if there is no aggregate for the column
+        """
+        return self._aggregates[column].display(item)
+
+    def _emit_column_changed(self, column):
+        """Notify the views that the given column changed for all items
+
+        :param column: the column
+        :type column: :class:`int`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        changes = []
+        stack = list(self._root.childItems)
+        while stack:
+            item = stack.pop()
+            changes.append((item, column, column))
+            stack.extend(item.childItems)
+        self._queue_changes(changes)
+
+    def _aggregate_changes(self, changes):
+        """Update the aggregates for changed data and return the changes of the aggregate cells
+
+        :param changes: tuples of an item, the first and the last column that changed
+        :type changes: list of tuple
+        :returns: tuples of an item and the aggregate column twice
+        :rtype: list of tuple
+        :raises: None
+        """
+        result = []
+        for column, aggregate in self._aggregates.items():
+            if aggregate.kind == 'count':
+                continue
+            source = aggregate.sourcecolumn
+            values = aggregate.values
+            changed = []
+            for item, first, last in changes:
+                if not first <= source <= last or item not in values:
+                    continue
+                old = values[item]
+                new = aggregate.compute(item)
+                if old == new:
+                    continue
+                values[item] = new
+                changed.append(item)
+                aggregate.propagate(item._parent, old, new, changed)
+            result.extend((item, column, column) for item in changed)
+        return result
+
+    def _emit_aggregates(self, changed):
+        """Notify the views about changed aggregates
+
+        :param changed: the aggregate column mapped to the changed items
+        :type changed: :class:`dict`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        changes = []
+        for column, items in changed.items():
+            changes.extend((item, column, column) for item in items)
+        if changes:
+            self._queue_changes(changes)
+
+    def set_order_index(self, enabled):
+        """Maintain an index for converting between items and their position in the fully expanded tree
+
+        The position is the row an item would have if the whole tree was expanded and flattened,
+        in depth-first order without the root. With the index, :meth:`TreeModel.item_at_position`
+        and :meth:`TreeModel.position_of_item` take time proportional to the depth of the item times
+        the logarithm of the number of siblings instead of a traversal.
+        Inserting and removing items updates the index.
+
+        :param enabled: True to build and maintain the index, False to drop it
+        :type enabled: :class:`bool`
+        :returns: None
+        :rtype: None
+        :raises: None
+        """
+        self._order = _OrderIndex(self._root) if enabled else None
+
+    def has_order_index(self, ):
+        """Return True if the order index is maintained
+
+        See :meth:`TreeModel.set_order_index`.
+
+        :returns: True, if there is an order index
+        :rtype: :class:`bool`
+        :raises: None
+        """
+        return self._order is not None
+
+    def position_of_item(self, item):
+        """Return the position of the item in the fully expanded tree
+
+        See :meth:`TreeModel.set_order_index`. Without the index, the tree is traversed.
+
+        :param item: an item of this model, but not the root
+        :type item: :class:`TreeItem`
+        :returns: the position
+        :rtype: :class:`int`
+        :raises: :class:`ValueError` if the item is not in the model
+        """
+        if item is self._root or self not in item.get_models():
+            raise ValueError("The item is not in the model.")
+        if self._order is not None:
+            return self._order.position(item)
+        position = 0
+        stack = list(reversed(self._root.childItems))
+        while stack:
+            i = stack.pop()
+            if i is item:
+                return position
+            position += 1
+            stack.extend(reversed(i.childItems))
+
+    def item_at_position(self, position):
+        """Return the item at the given position in the fully expanded tree
+
+        See :meth:`TreeModel.set_order_index`. Without the index, the tree is traversed.
+
+        :param position: the position
+        :type position: :class:`int`
+        :returns: the item
+        :rtype: :class:`TreeItem`
+        :raises: :class:`IndexError` if the position is out of range
+        """
+        if self._order is not None:
+            return self._order.item(position)
+        if position >= 0:
+            count = 0
+            stack = list(reversed(self._root.childItems))
+            while stack:
+                item = stack.pop()
+                if count == position:
+                    return item
+                count += 1
+                stack.extend(reversed(item.childItems))
+        raise IndexError("Position %s out of range." % position)
+
+    def preorder(self, prune=None):
+        """Iterate over all items except the root in depth-first pre-order
+
+        Top level items have depth 0. See :meth:`TreeItem.preorder`.
+
+        :param prune: a function that gets an item and returns True to skip it
+                      and all its descendants
+        :type prune: callable | None
+        :returns: tuples of an item and its depth
+        :rtype: generator
+        :raises: None
+        """
+        return _preorder(self._root.childItems, 0, prune)
+
+    def postorder(self, prune=None):
+        """Iterate over all items except the root in depth-first post-order
+
+        Top level items have depth 0. See :meth:`TreeItem.postorder`.
+
+        :param prune: a function that gets an item and returns True to skip it
+                      and all its descendants
+        :type prune: callable | None
+        :returns: tuples of an item and its depth
+        :rtype: generator
+        :raises: None
+        """
+        return _postorder(self._root.childItems, 0, prune)
+
+    def breadth_first(self, prune=None):
+        """Iterate over all items except the root level by level
+
+        Top level items have depth 0. See :meth:`TreeItem.breadth_first`.
+
+        :param prune: a function that gets an item and returns True to skip it
+                      and all its descendants
+        :type prune: callable | None
+        :returns: tuples of an item and its depth
+        :rtype: generator
+        :raises: None
+        """
+        return _breadth_first(self._root.childItems, 0, prune)
+
+    def leaves(self, prune=None):
+        """Iterate over all items without children in depth-first order
+
+        Top level items have depth 0. See :meth:`TreeItem.leaves`.
+
+        :param prune: a function that gets an item and returns True to skip it
+                      and all its descendants
+        :type prune: callable | None
+        :returns: tuples of an item and its depth
+        :rtype: generator
+        :raises: None
+        """
+        return _leaves(self._root.childItems, 0, prune)
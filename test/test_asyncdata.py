@@ -0,0 +1,115 @@
+import pytest
+from PySide import QtCore
+
+import easymodel
+
+DR = QtCore.Qt.DisplayRole
+
+
+class SquareItemData(easymodel.AsyncItemData):
+    """Computes the square of a number asynchronously in column 1"""
+
+    def __init__(self, number, dispatcher):
+        super(SquareItemData, self).__init__(dispatcher)
+        self.number = number
+        self.computed = 0
+
+    def column_count(self):
+        return 2
+
+    def is_async(self, column, role):
+        return column == 1 and role == DR
+
+    def sync_data(self, column, role):
+        if column == 0 and role == DR:
+            return self.number
+
+    def compute(self, column, role):
+        self.computed += 1
+        if self.number is None:
+            raise ValueError('no number')
+        return self.number ** 2
+
+    def placeholder(self, column, role):
+        return 'wait'
+
+
+@pytest.fixture(scope='function')
+def async_model(qtbot):
+    dispatcher = easymodel.AsyncDataDispatcher(pool=QtCore.QThreadPool(), interval=10)
+    root = easymodel.TreeItem(easymodel.ListItemData(['Number', 'Square']))
+    model = easymodel.TreeModel(root)
+    for i in range(5):
+        easymodel.TreeItem(SquareItemData(i, dispatcher), root)
+    return model, dispatcher
+
+
+def test_asyncdata_placeholder_and_batch(qtbot, async_model):
+    model, dispatcher = async_model
+    changed = []
+    model.dataChanged.connect(lambda tl, br: changed.append((tl.row(), br.row())))
+    assert model.index(2, 0).data() == 2
+    assert [model.index(i, 1).data() for i in range(5)] == ['wait'] * 5
+    # asking again does not queue the computation again
+    assert model.index(3, 1).data() == 'wait'
+    dispatcher.wait()
+    qtbot.waitUntil(lambda: bool(changed), timeout=5000)
+    assert changed == [(0, 4)]
+    assert [model.index(i, 1).data() for i in range(5)] == [0, 1, 4, 9, 16]
+    assert all(model.root.child(i).itemdata().computed == 1 for i in range(5))
+
+
+def test_asyncdata_invalidate(qtbot, async_model):
+    model, dispatcher = async_model
+    item = model.root.child(3)
+    assert model.index(3, 1).data() == 'wait'
+    item.itemdata().invalidate()
+    item.itemdata().number = 10
+    dispatcher.wait()
+    dispatcher.deliver()
+    assert model.index(3, 1).data() == 'wait'
+    dispatcher.wait()
+    qtbot.waitUntil(lambda: model.index(3, 1).data() == 100, timeout=5000)
+
+
+def test_asyncdata_failure_retries(qtbot, async_model, caplog):
+    model, dispatcher = async_model
+    data = model.root.child(0).itemdata()
+    number = data.number
+    data.number = None
+    index = model.index(0, 1)
+    assert index.data() == 'wait'
+    dispatcher.wait()
+    dispatcher.deliver()
+    assert 'no number' in caplog.text
+    assert data.computed == 1
+    # the failure is not cached, the next request computes again
+    data.number = number
+    assert index.data() == 'wait'
+    dispatcher.wait()
+    dispatcher.deliver()
+    assert data.computed == 2
+    assert index.data() == 0
+
+
+def test_asyncdata_clone(qtbot, async_model):
+    model, dispatcher = async_model
+    clone = model.root.clone()
+    clonemodel = easymodel.TreeModel(clone)
+    changed = []
+    clonemodel.dataChanged.connect(lambda tl, br: changed.append(tl.row()))
+    original = model.root.child(2).itemdata()
+    data = clone.child(2).itemdata()
+    assert data is not original
+    assert data.treeitem() is clone.child(2)
+    assert original.treeitem() is model.root.child(2)
+    assert clonemodel.index(2, 1).data() == 'wait'
+    dispatcher.wait()
+    qtbot.waitUntil(lambda: bool(changed), timeout=5000)
+    assert changed == [2]
+    assert clonemodel.index(2, 1).data() == 4
+    assert original.computed == 0
+
+
+def test_asyncdata_compute_is_abstract():
+    assert easymodel.AsyncItemData.compute.__isabstractmethod__
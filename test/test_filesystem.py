@@ -0,0 +1,93 @@
+import os
+
+import pytest
+from PySide import QtCore
+
+import easymodel
+
+DR = QtCore.Qt.DisplayRole
+
+
+@pytest.fixture(scope='function')
+def fstree(tmpdir):
+    """Directory with the subdirectories ``b`` and ``a`` and the files ``c.txt`` and ``a.txt``.
+    ``a`` contains ``x.bin`` with 5 bytes."""
+    tmpdir.mkdir('b')
+    tmpdir.mkdir('a').join('x.bin').write('12345')
+    tmpdir.join('c.txt').write('c')
+    tmpdir.join('a.txt').write('aa')
+    return tmpdir
+
+
+@pytest.fixture(scope='function')
+def fsmodel(fstree):
+    data = easymodel.FileItemData(str(fstree), headers=['Name', 'Size', 'Modified'],
+                                  loader=easymodel.TreeLoader(), batchsize=2)
+    return easymodel.TreeModel(easymodel.TreeItem(data))
+
+
+def wait_for_listing(qtbot, m, index):
+    item = m.item_of_index(index)
+    assert m.canFetchMore(index)
+    m.fetchMore(index)
+    assert not m.canFetchMore(index)
+    job = item.itemdata()._job
+    if job is not None:
+        with qtbot.waitSignal(job.finished, timeout=5000):
+            pass
+
+
+def test_filesystem_lazy_listing(qtbot, fsmodel):
+    m = fsmodel
+    root = QtCore.QModelIndex()
+    assert m.hasChildren(root)
+    assert m.rowCount(root) == 0
+    inserted = []
+    m.rowsInserted.connect(lambda p, first, last: inserted.append((first, last)))
+    wait_for_listing(qtbot, m, root)
+    assert inserted == [(0, 1), (2, 3)]
+    assert [m.index(i, 0).data() for i in range(4)] == ['a', 'b', 'a.txt', 'c.txt']
+    assert m.index(2, 1).data() == 2
+    assert m.index(0, 1).data() is None
+    assert m.index(2, 2).data()
+    assert m.headerData(1, QtCore.Qt.Horizontal, DR) == 'Size'
+    assert m.hasChildren(m.index(0, 0))
+    assert not m.hasChildren(m.index(2, 0))
+    a = m.index(0, 0)
+    assert m.rowCount(a) == 0
+    wait_for_listing(qtbot, m, a)
+    assert m.index(0, 0, a).data() == 'x.bin'
+    assert m.index(0, 1, a).data() == 5
+    assert m.index(0, 0, a).data(easymodel.INTERNAL_OBJ_ROLE) == os.path.join(str(m.index(0, 0).data(easymodel.INTERNAL_OBJ_ROLE)), 'x.bin')
+
+
+def test_filesystem_cancel(qtbot, fsmodel):
+    m = fsmodel
+    root = QtCore.QModelIndex()
+    m.fetchMore(root)
+    job = m.root.itemdata()._job
+    m.root.itemdata().cancel()
+    with qtbot.waitSignal(job.finished, timeout=5000):
+        pass
+    assert m.rowCount(root) == 0
+    assert m.canFetchMore(root)
+
+
+def test_filesystem_listing_error(qtbot, fsmodel, fstree):
+    m = fsmodel
+    root = QtCore.QModelIndex()
+    wait_for_listing(qtbot, m, root)
+    b = m.index(1, 0)
+    fstree.join('b').remove()
+    failed = []
+    m.fetchMore(b)
+    job = m.item_of_index(b).itemdata()._job
+    job.failed.connect(failed.append)
+    with qtbot.waitSignal(job.finished, timeout=5000):
+        pass
+    error = m.item_of_index(b).itemdata().error()
+    assert isinstance(error, OSError)
+    assert failed == [error]
+    assert b.data(QtCore.Qt.ToolTipRole) == str(error)
+    assert m.rowCount(b) == 0
+    assert not m.canFetchMore(b)
@@ -0,0 +1,141 @@
+import random
+
+import pytest
+from PySide import QtCore
+
+import easymodel
+
+DR = QtCore.Qt.DisplayRole
+
+
+@pytest.fixture(scope='function')
+def tree():
+    root = easymodel.TreeItem.from_nested((['name'], [
+        (['a'], [(['a1'], [(['a11'], [])]), (['a2'], [])]),
+        (['b'], [(['b1'], [])]),
+        (['c'], [])]))
+    return easymodel.TreeModel(root)
+
+
+def rows(flat):
+    return [(flat.index(i, 0).data(), flat.index(i, 0).data(easymodel.DEPTH_ROLE))
+            for i in range(flat.rowCount())]
+
+
+def find(flat, name):
+    for i in range(flat.rowCount()):
+        if flat.index(i, 0).data() == name:
+            return flat.index(i, 0)
+
+
+def test_flat_expand_collapse(tree):
+    flat = easymodel.FlatTreeModel(tree)
+    assert rows(flat) == [('a', 0), ('b', 0), ('c', 0)]
+    signals = []
+    flat.rowsInserted.connect(lambda p, first, last: signals.append(('insert', first, last)))
+    flat.rowsRemoved.connect(lambda p, first, last: signals.append(('remove', first, last)))
+    flat.toggle(find(flat, 'a'))
+    assert rows(flat) == [('a', 0), ('a1', 1), ('a2', 1), ('b', 0), ('c', 0)]
+    assert find(flat, 'a').data(easymodel.EXPANDED_ROLE)
+    assert find(flat, 'a1').data(easymodel.HAS_CHILDREN_ROLE)
+    assert not find(flat, 'a2').data(easymodel.HAS_CHILDREN_ROLE)
+    flat.set_expanded(find(flat, 'a1'), True)
+    assert rows(flat) == [('a', 0), ('a1', 1), ('a11', 2), ('a2', 1), ('b', 0), ('c', 0)]
+    flat.set_expanded(find(flat, 'a'), False)
+    assert rows(flat) == [('a', 0), ('b', 0), ('c', 0)]
+    assert signals == [('insert', 1, 2), ('insert', 2, 2), ('remove', 1, 3)]
+    # the expanded state of a1 is kept
+    flat.set_expanded(find(flat, 'a'), True)
+    assert rows(flat) == [('a', 0), ('a1', 1), ('a11', 2), ('a2', 1), ('b', 0), ('c', 0)]
+    assert flat.map_to_source(find(flat, 'a11')) == tree.index(0, 0, tree.index(0, 0, tree.index(0, 0)))
+    assert flat.map_from_source(tree.index(1, 0)) == find(flat, 'b')
+    assert not flat.map_from_source(tree.index(0, 0, tree.index(1, 0))).isValid()
+
+
+def test_flat_source_changes(tree):
+    flat = easymodel.FlatTreeModel(tree)
+    flat.set_expanded(find(flat, 'a'), True)
+    flat.set_expanded(find(flat, 'a1'), True)
+    a, b, c = tree.root.childItems
+    signals = []
+    flat.rowsInserted.connect(lambda p, first, last: signals.append(('insert', first, last)))
+    flat.rowsRemoved.connect(lambda p, first, last: signals.append(('remove', first, last)))
+    easymodel.TreeItem(easymodel.ListItemData(['a3']), a)
+    easymodel.TreeItem(easymodel.ListItemData(['b2']), b)
+    assert signals == [('insert', 4, 4)]
+    assert rows(flat) == [('a', 0), ('a1', 1), ('a11', 2), ('a2', 1), ('a3', 1), ('b', 0), ('c', 0)]
+    a.remove_child(a.child(0))
+    assert signals[-1] == ('remove', 1, 2)
+    assert rows(flat) == [('a', 0), ('a2', 1), ('a3', 1), ('b', 0), ('c', 0)]
+    changed = []
+    flat.dataChanged.connect(lambda tl, br: changed.append((tl.row(), br.row())))
+    a.child(1).set_data(0, 'x', QtCore.Qt.EditRole)
+    b.child(0).set_data(0, 'y', QtCore.Qt.EditRole)
+    # only a3 is visible
+    assert changed == [(2, 2)]
+    tree.root.child(2).itemdata()._list[0] = 'z'
+    tree.item_data_changed(c, 0)
+    assert changed[-1] == (4, 4)
+    assert find(flat, 'z').row() == 4
+    tree.set_root(easymodel.TreeItem.from_nested((['name'], [(['n'], [(['n1'], [])])])))
+    assert rows(flat) == [('n', 0)]
+
+
+def test_flat_random(tree, qtmodeltester):
+    rand = random.Random(7)
+    flat = easymodel.FlatTreeModel(tree)
+    qtmodeltester.check(flat)
+    for i in range(100):
+        op = rand.random()
+        if op < 0.4 and flat.rowCount():
+            flat.toggle(flat.index(rand.randrange(flat.rowCount()), 0))
+        elif op < 0.6:
+            items = [tree.root]
+            stack = list(tree.root.childItems)
+            while stack:
+                item = stack.pop()
+                items.append(item)
+                stack.extend(item.childItems)
+            easymodel.TreeItem(easymodel.ListItemData(['n%s' % i]), rand.choice(items))
+        elif op < 0.8:
+            parents = [item for item in flat._rows + [tree.root] if item.childItems]
+            if parents:
+                parent = rand.choice(parents)
+                count = len(parent.childItems)
+                tree.move_item(rand.randrange(count), rand.randrange(count + 1), tree.index_of_item(parent))
+        else:
+            stack = list(tree.root.childItems)
+            items = []
+            while stack:
+                item = stack.pop()
+                items.append(item)
+                stack.extend(item.childItems)
+            if items:
+                victim = rand.choice(items)
+                victim.parent().remove_child(victim)
+        expected = easymodel.FlatTreeModel(tree)
+        expected._expanded = flat._expanded
+        expected.rebuild()
+        assert flat._rows == expected._rows
+        assert flat._depths == expected._depths
+        assert all(flat._row_of(item) == row for row, item in enumerate(flat._rows))
+    qtmodeltester.check(flat)
+
+
+def test_flat_source_moves(tree):
+    flat = easymodel.FlatTreeModel(tree)
+    flat.set_expanded(find(flat, 'a'), True)
+    flat.set_expanded(find(flat, 'a1'), True)
+    signals = []
+    flat.rowsMoved.connect(lambda p, first, last, d, row: signals.append(('move', first, last, row)))
+    flat.modelReset.connect(lambda: signals.append('reset'))
+    tree.move_item(0, 3, QtCore.QModelIndex())
+    assert rows(flat) == [('b', 0), ('c', 0), ('a', 0), ('a1', 1), ('a11', 2), ('a2', 1)]
+    assert signals == [('move', 0, 3, 6)]
+    tree.move_item(1, 0, tree.index(2, 0))
+    assert rows(flat) == [('b', 0), ('c', 0), ('a', 0), ('a2', 1), ('a1', 1), ('a11', 2)]
+    assert signals[-1] == ('move', 5, 5, 3)
+    assert find(flat, 'a11').row() == 5
+    # moves of hidden items do not change the rows
+    tree.move_item(0, 0, tree.index(0, 0))
+    assert len(signals) == 2
@@ -0,0 +1,81 @@
+import gc
+
+import pytest
+from PySide import QtCore
+
+import easymodel
+
+DR = QtCore.Qt.DisplayRole
+
+
+@pytest.fixture(scope='function')
+def tree():
+    root = easymodel.TreeItem.from_nested((['name'], [
+        (['a'], [(['a1'], []), (['a2'], [])]),
+        (['b'], [])]))
+    return easymodel.TreeModel(root)
+
+
+def test_journal_records(tree):
+    root = tree.root
+    a, b = root.childItems
+    journal = tree.journal()
+    assert journal is tree.journal()
+    # nothing is recorded without readers
+    b.set_data(0, 'x', DR)
+    assert len(journal) == 0
+    reader = journal.reader()
+    c = easymodel.TreeItem(easymodel.ListItemData(['c']))
+    a.add_child(c)
+    a.remove_child(a.child(0))
+    a._move_child(1, 0)
+    c.set_data(0, 'y', DR)
+    records = reader.read()
+    assert [r.sequence for r in records] == [1, 2, 3, 4]
+    assert [(r.kind, r.parentid, r.first, r.last) for r in records] == [
+        ('insert', a.item_id(), 2, 2),
+        ('remove', a.item_id(), 0, 0),
+        ('move', a.item_id(), 1, 0),
+        ('data', a.item_id(), 0, 0)]
+    assert [r.itemids for r in records[::2]] == [[c.item_id()], [c.item_id()]]
+    assert tree.item_for_id(records[0].itemids[0]) is c
+    assert reader.read() == []
+    # throttled data changes are recorded right away
+    tree.set_update_rate(10)
+    b.set_data(0, 'z', DR)
+    assert [(r.kind, r.itemids) for r in reader.read()] == [('data', [b.item_id()])]
+    newroot = easymodel.TreeItem.from_nested((['name'], []))
+    tree.set_root(newroot)
+    record = reader.read()[0]
+    assert (record.kind, record.parentid, record.itemids) == ('reset', newroot.item_id(), [])
+
+
+def test_journal_compact(tree):
+    a = tree.root.child(0)
+    journal = tree.journal()
+    fast = journal.reader()
+    slow = journal.reader()
+    for i in range(5):
+        a.set_data(0, i, DR)
+    assert slow.pending() == 5
+    assert len(fast.read(limit=2)) == 2
+    assert [r.sequence for r in fast.read()] == [3, 4, 5]
+    # the slow reader still needs all of them
+    assert len(journal) == 5
+    assert [r.sequence for r in slow.read(limit=3)] == [1, 2, 3]
+    assert len(journal) == 2
+    with pytest.raises(ValueError):
+        journal.read(0)
+    assert [r.sequence for r in journal.read(3)] == [4, 5]
+    slow.close()
+    assert len(journal) == 0
+    # dropped readers do not keep records
+    a.set_data(0, 'x', DR)
+    del fast
+    gc.collect()
+    assert not journal.active
+    a.set_data(0, 'y', DR)
+    reader = journal.reader()
+    a.set_data(0, 'z', DR)
+    assert [r.sequence for r in reader.read()] == [7]
+    assert len(journal) == 0
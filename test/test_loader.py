@@ -0,0 +1,75 @@
+import pytest
+from PySide import QtCore
+
+import easymodel
+
+
+@pytest.fixture(scope='function')
+def model():
+    root = easymodel.TreeItem(easymodel.ListItemData(['Column0']))
+    return easymodel.TreeModel(root)
+
+
+def build_nested(job):
+    items = []
+    for i in range(3):
+        item = easymodel.TreeItem(easymodel.ListItemData(['item%s' % i]))
+        easymodel.TreeItem(easymodel.ListItemData(['child%s' % i]), item)
+        items.append(item)
+        job.report_progress(i + 1, 3)
+    return items
+
+
+def build_batches(job):
+    for i in range(3):
+        yield [easymodel.TreeItem(easymodel.ListItemData(['batch%s' % i]))]
+
+
+def test_loader_load(qtbot, model):
+    loader = easymodel.TreeLoader()
+    inserted = []
+    model.rowsInserted.connect(lambda p, first, last: inserted.append((first, last)))
+    job = loader.load(model.root, build_nested)
+    assert job.is_running()
+    with qtbot.waitSignal(job.finished, timeout=5000):
+        pass
+    assert not job.is_running()
+    assert inserted == [(0, 2)]
+    assert model.index(2, 0).data() == 'item2'
+    assert model.index(0, 0, model.index(1, 0)).data() == 'child1'
+    assert loader.jobs == []
+
+
+def test_loader_batches_and_progress(qtbot, model):
+    loader = easymodel.TreeLoader()
+    job = loader.load(model.root, build_batches)
+    with qtbot.waitSignal(job.finished, timeout=5000):
+        pass
+    assert [model.index(i, 0).data() for i in range(3)] == ['batch0', 'batch1', 'batch2']
+
+    progress = []
+    job = loader.load(model.root, build_nested)
+    job.progress.connect(lambda done, total: progress.append((done, total)))
+    with qtbot.waitSignal(job.finished, timeout=5000):
+        pass
+    assert progress == [(1, 3), (2, 3), (3, 3)]
+
+
+def test_loader_cancel(qtbot, model):
+    loader = easymodel.TreeLoader()
+    job = loader.load(model.root, build_batches)
+    loader.cancel(model.root)
+    assert job.is_cancelled()
+    with qtbot.waitSignal(job.finished, timeout=5000):
+        pass
+    assert model.rowCount(QtCore.QModelIndex()) == 0
+
+
+def test_loader_failed(qtbot, model):
+    def fail(job):
+        raise ValueError('broken')
+    loader = easymodel.TreeLoader()
+    job = loader.load(model.root, fail)
+    with qtbot.waitSignal(job.failed, timeout=5000) as blocker:
+        pass
+    assert isinstance(blocker.args[0], ValueError)
@@ -0,0 +1,64 @@
+import pytest
+from PySide import QtCore, QtGui
+
+import easymodel
+
+DR = QtCore.Qt.DisplayRole
+
+
+class LazyItemData(easymodel.ItemData):
+    """Item data that records the batches it was prefetched in"""
+
+    batches = []
+
+    def __init__(self, number):
+        self.number = number
+        self.loaded = False
+
+    @classmethod
+    def prefetch(cls, itemdatas):
+        cls.batches.append([d.number for d in itemdatas])
+        for d in itemdatas:
+            d.loaded = True
+
+    def data(self, column, role):
+        if role == DR:
+            return self.number if self.loaded else None
+
+    def column_count(self):
+        return 1
+
+
+@pytest.fixture(scope='function')
+def lazy_model():
+    del LazyItemData.batches[:]
+    root = easymodel.TreeItem(easymodel.ListItemData(['Number']))
+    for i in range(100):
+        easymodel.TreeItem(LazyItemData(i), root)
+    easymodel.TreeItem(easymodel.ListItemData(['other']), root.child(0))
+    return easymodel.TreeModel(root)
+
+
+def test_model_prefetch(lazy_model):
+    m = lazy_model
+    first = m.index(0, 0)
+    m.prefetch([first, m.index(0, 0, first), m.index(3, 0), m.index(3, 1), QtCore.QModelIndex()])
+    assert LazyItemData.batches == [[0, 3]]
+    assert m.index(3, 0).data() == 3
+
+
+@pytest.mark.parametrize("viewclass", [QtGui.QTreeView, QtGui.QListView])
+def test_view_prefetcher(qtbot, lazy_model, viewclass):
+    view = viewclass()
+    qtbot.addWidget(view)
+    view.resize(200, 200)
+    view.setModel(lazy_model)
+    prefetcher = easymodel.ViewPrefetcher(view, lookahead=5)
+    view.show()
+    qtbot.waitUntil(lambda: len(LazyItemData.batches) > 0)
+    batch = LazyItemData.batches[0]
+    assert batch[0] == 0
+    assert 5 < len(batch) < 100
+    indexes = prefetcher.visible_indexes()
+    assert indexes[0] == lazy_model.index(0, 0)
+    assert len(indexes) == len(batch)
@@ -0,0 +1,85 @@
+from concurrent import futures
+
+import pytest
+
+import easymodel
+
+
+def square(payload):
+    return payload[0] ** 2
+
+
+@pytest.fixture(scope='function')
+def number_model():
+    spec = (['Number', 'Square'], [([i, None], [([i * 10, None], [])]) for i in range(10)])
+    return easymodel.TreeModel(easymodel.TreeItem.from_nested(spec))
+
+
+def test_column_computation(qtbot, number_model):
+    m = number_model
+    changed = []
+    m.dataChanged.connect(lambda tl, br: changed.append((tl, br)))
+    computation = easymodel.ColumnComputation(m, square, 1, chunksize=4)
+    progress = []
+    computation.progress.connect(lambda done, total: progress.append((done, total)))
+    with qtbot.waitSignal(computation.finished, timeout=10000):
+        computation.start()
+    assert [m.index(i, 1).data() for i in range(10)] == [i ** 2 for i in range(10)]
+    assert m.index(0, 1, m.index(3, 0)).data() == 900
+    assert progress[-1] == (20, 20)
+    assert len(progress) == 5
+    assert len(changed) < 20
+    assert not computation.is_running()
+
+
+def test_column_computation_accept_and_cancel(qtbot, number_model):
+    m = number_model
+    executor = futures.ThreadPoolExecutor(1)
+    computation = easymodel.ColumnComputation(m, square, 1, chunksize=1, executor=executor,
+                                              accept=lambda item: item.parent() is m.root)
+    with qtbot.waitSignal(computation.finished, timeout=10000):
+        computation.start()
+        computation.cancel()
+    assert computation.is_cancelled()
+    assert [m.index(i, 1).data() for i in range(10)] == [None] * 10
+
+    computation = easymodel.ColumnComputation(m, square, 1, executor=executor,
+                                              accept=lambda item: item.parent() is m.root)
+    with qtbot.waitSignal(computation.finished, timeout=10000):
+        computation.start()
+    assert m.index(9, 1).data() == 81
+    assert m.index(0, 1, m.index(3, 0)).data() is None
+    executor.shutdown()
+
+
+def test_column_computation_restart(qtbot, number_model):
+    m = number_model
+    executor = futures.ThreadPoolExecutor(1)
+    computation = easymodel.ColumnComputation(m, square, 1, chunksize=1, executor=executor,
+                                              accept=lambda item: item.parent() is m.root)
+    with qtbot.waitSignal(computation.finished, timeout=10000):
+        computation.start()
+        computation.cancel()
+    assert computation.is_cancelled()
+    with qtbot.waitSignal(computation.finished, timeout=10000):
+        computation.start()
+    assert not computation.is_cancelled()
+    assert [m.index(i, 1).data() for i in range(10)] == [i ** 2 for i in range(10)]
+    executor.shutdown()
+
+
+def test_column_computation_journal(qtbot, number_model):
+    m = number_model
+    reader = m.journal().reader()
+    changed = []
+    m.dataChanged.connect(lambda tl, br: changed.append((tl.row(), br.row())))
+    executor = futures.ThreadPoolExecutor(1)
+    computation = easymodel.ColumnComputation(m, square, 1, chunksize=10, executor=executor,
+                                              accept=lambda item: item.parent() is m.root)
+    with qtbot.waitSignal(computation.finished, timeout=10000):
+        computation.start()
+    records = reader.read()
+    assert len(records) == 10
+    assert all(r.kind == 'data' for r in records)
+    assert changed == [(0, 9)]
+    executor.shutdown()
@@ -0,0 +1,118 @@
+import multiprocessing
+import socket
+import threading
+
+import pytest
+from PySide import QtCore
+
+import easymodel
+
+DR = QtCore.Qt.DisplayRole
+
+
+@pytest.fixture(scope='function')
+def root():
+    return easymodel.TreeItem.from_nested((['Name', 'Value'], [
+        (['a', 1], [(['a%s' % i, i], []) for i in range(10)]),
+        (['b', 2], [(['b1', 3], [])]),
+        (['c', 4], [])]))
+
+
+@pytest.fixture(scope='function')
+def pipe_model(root):
+    server = easymodel.TreeServer(root)
+    client, conn = multiprocessing.Pipe()
+    thread = threading.Thread(target=server.handle, args=(conn,))
+    thread.daemon = True
+    thread.start()
+    model = easymodel.RemoteTreeModel(client, pagesize=4, cachesize=8)
+    yield server, model
+    model.close()
+    thread.join(5)
+
+
+def test_remote_browse(root, pipe_model):
+    server, model = pipe_model
+    assert model.rowCount() == 3
+    assert model.columnCount() == 2
+    assert model.headerData(1, QtCore.Qt.Horizontal, DR) == 'Value'
+    a = model.index(0, 0)
+    assert a.data() == 'a'
+    assert model.index(0, 1).data() == 1
+    assert model.rowCount(a) == 10
+    assert [model.index(i, 0, a).data() for i in range(10)] == ['a%s' % i for i in range(10)]
+    a7 = model.index(7, 0, a)
+    assert model.parent(a7) == a
+    assert not model.parent(a).isValid()
+    # ids are stable
+    assert server.item_of_id(a7.internalId()) is root.child(0).child(7)
+    assert server.id_of_item(root.child(0).child(7)) == a7.internalId()
+    # evicted items are loaded again
+    for i in range(3):
+        model.index(i, 0)
+        model.index(0, 0, model.index(1, 0))
+    assert model.parent(a7) == a
+    assert a7.data() == 'a7'
+    assert model.data(a7, QtCore.Qt.ToolTipRole) is None
+
+
+def test_remote_batched_prefetch(pipe_model):
+    server, model = pipe_model
+    a = model.index(0, 0)
+    indexes = [model.index(i, 0, a) for i in range(2, 8)]
+    model.refresh()
+    requests = []
+    request = model.request
+
+    def record(calls):
+        requests.append([c[0] for c in calls])
+        return request(calls)
+    model.request = record
+    # one round trip for all missing items
+    model.prefetch(indexes)
+    assert requests == [['node'] * 6]
+    assert [i.data() for i in indexes] == ['a%s' % i for i in range(2, 8)]
+    assert len(requests) == 1
+    # and one for the missing pages
+    model.prefetch(indexes)
+    assert requests[1:] == [['page', 'page']]
+    model.prefetch(indexes)
+    assert len(requests) == 2
+
+
+def test_remote_server_error(pipe_model):
+    server, model = pipe_model
+
+    class Unpicklable(object):
+        def __reduce__(self):
+            raise TypeError('not picklable')
+    server.header = lambda roles: Unpicklable()
+    with pytest.raises(ValueError):
+        model.request([('nope',)])
+    with pytest.raises(RuntimeError):
+        model.request([('header', [DR])])
+    # the connection is still open
+    assert len(model.request([('page', 0, 0, 4, [DR])])[0]) == 3
+
+
+def test_remote_server_socket(root, tmpdir):
+    if not hasattr(socket, 'AF_UNIX'):
+        pytest.skip('Unix sockets are not available.')
+    server = easymodel.TreeServer(root, address=str(tmpdir.join('tree.sock')), family='AF_UNIX')
+    server.start()
+    try:
+        models = [easymodel.RemoteTreeModel(server.address) for i in range(2)]
+        b = models[0].index(1, 0)
+        assert models[0].index(0, 0, b).data() == 'b1'
+        with server.lock:
+            root.child(1).add_child(easymodel.TreeItem(easymodel.ListItemData(['b2', 5])))
+        b = models[1].index(1, 0)
+        assert models[1].rowCount(b) == 2
+        assert models[1].index(1, 1, b).data() == 5
+        assert models[0].rowCount(models[0].index(1, 0)) == 1
+        models[0].refresh()
+        assert models[0].rowCount(models[0].index(1, 0)) == 2
+        for model in models:
+            model.close()
+    finally:
+        server.close()
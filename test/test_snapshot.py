@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import io
+import struct
+
+import pytest
+from PySide import QtCore
+
+import easymodel
+
+
+class PairItemData(easymodel.ListItemData):
+    """Item data that stores its list in reverse"""
+
+    def serialize(self):
+        return list(reversed(self._list))
+
+    @classmethod
+    def deserialize(cls, values):
+        return cls(list(reversed(values)))
+
+
+def _dump(item):
+    data = item.itemdata()
+    return (type(data).__name__ if data else None,
+            data.internal_data() if data else None,
+            [_dump(c) for c in item.childItems])
+
+
+def test_snapshot_roundtrip(tmpdir):
+    root = easymodel.TreeItem(easymodel.ListItemData(['name', 'value']))
+    a = easymodel.TreeItem(easymodel.ListItemData([u'\xe4', 2 ** 70]), root)
+    easymodel.TreeItem(easymodel.ListItemData([None, True, False]), a)
+    b = easymodel.TreeItem(PairItemData([1.5, b'\x00\xff']), root)
+    easymodel.TreeItem(None, b)
+    easymodel.TreeItem(easymodel.ListItemData([]), root)
+    path = str(tmpdir.join('tree.snap'))
+    easymodel.save_snapshot(root, path)
+    loaded = easymodel.load_snapshot(path)
+    assert _dump(loaded) == _dump(root)
+    assert loaded.child(1).child(0).parent() is loaded.child(1)
+    assert isinstance(loaded.child(1).itemdata(), PairItemData)
+    assert type(loaded.child(0).itemdata().internal_data()[1]) is type(2 ** 70)
+    m = easymodel.TreeModel(loaded)
+    assert m.headerData(1, QtCore.Qt.Horizontal, QtCore.Qt.DisplayRole) == 'value'
+
+
+def test_snapshot_large_and_file_objects():
+    root = easymodel.TreeItem.from_paths([(('n%s' % i,), ['n%s' % i, i]) for i in range(2000)])
+    buf = io.BytesIO()
+    easymodel.save_snapshot(root, buf)
+    buf.seek(0)
+    loaded = easymodel.load_snapshot(buf)
+    assert _dump(loaded) == _dump(root)
+
+
+def test_snapshot_errors():
+    root = easymodel.TreeItem(easymodel.ListItemData([object()]))
+    with pytest.raises(TypeError):
+        easymodel.save_snapshot(root, io.BytesIO())
+    with pytest.raises(ValueError):
+        easymodel.load_snapshot(io.BytesIO(b'not a snapshot at all, really not'))
+
+
+def test_snapshot_model(tmpdir, qtmodeltester):
+    root = easymodel.TreeItem.from_nested((['name', 'value'], [
+        (['a', 1], [(['a1', 2.5], [(['a11', None], [])]), (['a2', True], [])]),
+        ([u'\xe4', b'x'], [])]))
+    path = str(tmpdir.join('tree.snap'))
+    easymodel.save_snapshot(root, path)
+    m = easymodel.SnapshotModel(path)
+    reference = easymodel.TreeModel(root)
+    qtmodeltester.check(m)
+    assert m.columnCount() == 2
+    assert m.headerData(1, QtCore.Qt.Horizontal, QtCore.Qt.DisplayRole) == 'value'
+
+    def compare(index, refindex):
+        assert m.rowCount(index) == reference.rowCount(refindex)
+        for row in range(m.rowCount(index)):
+            for column in range(2):
+                child = m.index(row, column, index)
+                refchild = reference.index(row, column, refindex)
+                assert child.data() == refchild.data()
+                assert child.parent() == index
+            compare(m.index(row, 0, index), reference.index(row, 0, refindex))
+
+    compare(QtCore.QModelIndex(), QtCore.QModelIndex())
+    a1 = m.index(0, 0, m.index(0, 0))
+    assert a1.data(easymodel.INTERNAL_OBJ_ROLE) == ['a1', 2.5]
+    buf = m.cell_buffer(m.index(0, 1))
+    assert bytes(buf)[1:] == struct.pack('<q', 1)
+    assert m.cell_buffer(m.index(0, 5)) is None
+    del buf
+    m.close()
+
+
+def test_snapshot_model_copied_sections(tmpdir, monkeypatch):
+    # python 2 and big-endian platforms copy the sections instead of casting views
+    monkeypatch.setattr(easymodel.snapshot, '_CAST', False)
+    root = easymodel.TreeItem.from_nested((['name', 'value'], [
+        (['a', 1], [(['a1', 2], [])]), (['b', 3], [])]))
+    path = str(tmpdir.join('tree.snap'))
+    easymodel.save_snapshot(root, path)
+    m = easymodel.SnapshotModel(path)
+    assert m.rowCount() == 2
+    a = m.index(0, 0)
+    assert m.index(0, 1, a).data() == 2
+    assert m.index(1, 1).data() == 3
+    assert bytes(m.cell_buffer(m.index(1, 1)))[1:] == struct.pack('<q', 3)
+    m.close()
+
+
+def test_snapshot_view():
+    data = b'0123456789'
+    assert bytes(easymodel.snapshot._view(data, 2, 5)) == b'234'
+
+
+def test_snapshot_model_invalid(tmpdir):
+    path = tmpdir.join('broken.snap')
+    path.write_binary(b'x' * 100)
+    with pytest.raises(ValueError):
+        easymodel.SnapshotModel(str(path))
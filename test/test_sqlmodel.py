@@ -0,0 +1,87 @@
+import sqlite3
+
+import pytest
+from PySide import QtCore
+
+import easymodel
+
+DR = QtCore.Qt.DisplayRole
+
+
+@pytest.fixture(scope='function')
+def connection():
+    """In memory database with 25 top level rows. Every row has 3 children."""
+    con = sqlite3.connect(':memory:')
+    con.execute('CREATE TABLE nodes (id INTEGER PRIMARY KEY, parent_id INTEGER, name TEXT, size INTEGER)')
+    con.execute('CREATE INDEX nodes_parent ON nodes (parent_id, id)')
+    nextid = 1
+    for i in range(25):
+        topid = nextid
+        con.execute('INSERT INTO nodes VALUES (?, NULL, ?, ?)', (topid, 'top%s' % i, i))
+        nextid += 1
+        for j in range(3):
+            con.execute('INSERT INTO nodes VALUES (?, ?, ?, ?)', (nextid, topid, 'child%s_%s' % (i, j), j))
+            nextid += 1
+    return con
+
+
+@pytest.fixture(scope='function')
+def sqlmodel(connection):
+    return easymodel.SqlTreeModel(connection, 'nodes', ['name', 'size'],
+                                  headers=['Name', 'Size'], pagesize=4, cachesize=16)
+
+
+def test_sqlmodel_structure(sqlmodel):
+    m = sqlmodel
+    root = QtCore.QModelIndex()
+    assert m.rowCount(root) == 25
+    assert m.columnCount(root) == 2
+    assert [m.index(i, 0).data() for i in range(25)] == ['top%s' % i for i in range(25)]
+    top = m.index(13, 0)
+    assert m.rowCount(top) == 3
+    child = m.index(2, 1, top)
+    assert child.data() == 2
+    assert m.index(2, 0, top).data() == 'child13_2'
+    assert m.parent(child) == top
+    assert m.parent(top) == root
+    assert m.rowCount(child) == 0
+    assert not m.index(3, 0, top).isValid()
+    assert m.headerData(1, QtCore.Qt.Horizontal, DR) == 'Size'
+    assert m.id_of_index(top) == 13 * 4 + 1
+
+
+def test_sqlmodel_cache_eviction(sqlmodel):
+    m = sqlmodel
+    child = m.index(1, 0, m.index(20, 0))
+    for i in range(25):
+        m.index(i, 0, m.index(i, 0)).data()
+    assert len(m._nodes) <= 16
+    # the evicted row is loaded again
+    assert child.data() == 'child20_1'
+    assert m.parent(child).row() == 20
+
+
+def test_sqlmodel_refresh(sqlmodel, connection):
+    m = sqlmodel
+    assert m.rowCount(QtCore.QModelIndex()) == 25
+    connection.execute("INSERT INTO nodes VALUES (1000, NULL, 'new', 0)")
+    resets = []
+    m.modelReset.connect(lambda: resets.append(True))
+    m.refresh()
+    assert resets == [True]
+    assert m.rowCount(QtCore.QModelIndex()) == 26
+    assert m.index(25, 0).data() == 'new'
+
+
+def test_sqlmodel_deleted_row(sqlmodel, connection):
+    m = sqlmodel
+    top = m.index(20, 0)
+    child = m.index(1, 0, top)
+    # evict the cached rows, then delete them
+    for i in range(25):
+        m.index(i, 0, m.index(i, 0)).data()
+    assert m.id_of_index(child) not in m._nodes
+    connection.execute('DELETE FROM nodes WHERE id = ? OR parent_id = ?', (m.id_of_index(top),) * 2)
+    assert child.data() is None
+    assert not m.parent(child).isValid()
+    assert m.rowCount(child) == 0
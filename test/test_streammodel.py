@@ -0,0 +1,55 @@
+import pytest
+from PySide import QtCore
+
+import easymodel
+
+DR = QtCore.Qt.DisplayRole
+
+
+@pytest.fixture(scope='function')
+def stream():
+    return easymodel.StreamModel(easymodel.ListItemData(['Level', 'Message']), capacity=5)
+
+
+def rows(m):
+    return [m.index(i, 1).data() for i in range(m.rowCount())]
+
+
+def test_stream_append_and_evict(stream):
+    m = stream
+    signals = []
+    m.rowsInserted.connect(lambda p, first, last: signals.append(('insert', first, last)))
+    m.rowsRemoved.connect(lambda p, first, last: signals.append(('remove', first, last)))
+    for i in range(3):
+        m.append(easymodel.ListItemData(['info', 'msg%s' % i]))
+    assert m.rowCount() == 0
+    m.flush()
+    assert signals == [('insert', 0, 2)]
+    assert rows(m) == ['msg0', 'msg1', 'msg2']
+    m.extend([easymodel.ListItemData(['info', 'msg%s' % i]) for i in range(3, 7)])
+    m.flush()
+    assert signals[1:] == [('remove', 0, 1), ('insert', 1, 4)]
+    assert rows(m) == ['msg2', 'msg3', 'msg4', 'msg5', 'msg6']
+    assert m.index(0, 0).data(easymodel.INTERNAL_OBJ_ROLE) == ['info', 'msg2']
+    assert m.headerData(1, QtCore.Qt.Horizontal, DR) == 'Message'
+    # more rows than the capacity in one batch
+    m.extend([easymodel.ListItemData(['info', 'big%s' % i]) for i in range(12)])
+    m.flush()
+    assert rows(m) == ['big%s' % i for i in range(7, 12)]
+    m.clear()
+    assert m.rowCount() == 0
+    with pytest.raises(IndexError):
+        m.itemdata(0)
+
+
+def test_stream_interval(qtbot):
+    m = easymodel.StreamModel(easymodel.ListItemData(['Message']), capacity=3, interval=10)
+    with qtbot.waitSignal(m.rowsInserted, timeout=5000):
+        m.append(easymodel.ListItemData(['a']))
+        m.append(easymodel.ListItemData(['b']))
+    assert m.rowCount() == 2
+
+
+def test_stream_invalid_capacity():
+    with pytest.raises(ValueError):
+        easymodel.StreamModel(easymodel.ListItemData(['Message']), capacity=0)
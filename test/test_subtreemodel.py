@@ -0,0 +1,106 @@
+import gc
+
+import pytest
+from PySide import QtCore
+
+import easymodel
+
+DR = QtCore.Qt.DisplayRole
+
+
+@pytest.fixture(scope='function')
+def tree():
+    root = easymodel.TreeItem.from_nested((['name'], [
+        (['a'], [(['a1'], [(['a11'], [])]), (['a2'], [])]),
+        (['b'], [(['b1'], [])])]))
+    return easymodel.TreeModel(root)
+
+
+def names(model, parent=None):
+    parent = parent or QtCore.QModelIndex()
+    return [model.index(i, 0, parent).data() for i in range(model.rowCount(parent))]
+
+
+def test_subtree_structure(tree):
+    a = tree.root.child(0)
+    sub = easymodel.SubtreeModel(tree, a)
+    assert sub.item is a
+    assert names(sub) == ['a1', 'a2']
+    a1 = sub.index(0, 0)
+    assert names(sub, a1) == ['a11']
+    assert not sub.parent(a1).isValid()
+    assert sub.parent(sub.index(0, 0, a1)) == a1
+    assert sub.headerData(0, QtCore.Qt.Horizontal, DR) == 'name'
+    assert sub.columnCount() == 1
+    assert sub.map_to_source(a1) == tree.index(0, 0, tree.index(0, 0))
+    assert sub.map_from_source(tree.index(0, 0, tree.index(0, 0))) == a1
+    assert not sub.map_from_source(tree.index(1, 0)).isValid()
+    assert not sub.map_from_source(tree.index(0, 0)).isValid()
+    assert sub.index_of_item(sub.item_of_index(a1).child(0)) == sub.index(0, 0, a1)
+    assert not sub.index_of_item(tree.root.child(1)).isValid()
+    changed = []
+    tree.dataChanged.connect(lambda tl, br: changed.append(tl.data()))
+    assert sub.setData(sub.index(1, 0), 'x', DR)
+    assert changed == ['x']
+    whole = easymodel.SubtreeModel(tree)
+    assert names(whole) == ['a', 'b']
+    whole.set_item(tree.root.child(1))
+    assert names(whole) == ['b1']
+
+
+def test_subtree_source_changes(tree):
+    a, b = tree.root.childItems
+    sub = easymodel.SubtreeModel(tree, a)
+    signals = []
+    sub.rowsInserted.connect(lambda p, first, last: signals.append(('insert', p.data(), first, last)))
+    sub.rowsRemoved.connect(lambda p, first, last: signals.append(('remove', p.data(), first, last)))
+    sub.rowsMoved.connect(lambda *args: signals.append(('move',)))
+    sub.dataChanged.connect(lambda tl, br: signals.append(('data', tl.data())))
+    sub.modelReset.connect(lambda: signals.append(('reset',)))
+    # changes outside of the subtree are not forwarded
+    b.add_child(easymodel.TreeItem(easymodel.ListItemData(['b2'])))
+    b.child(0).set_data(0, 'bx', DR)
+    assert signals == []
+    a1 = a.child(0)
+    a1.add_child(easymodel.TreeItem(easymodel.ListItemData(['a12'])))
+    a.add_child(easymodel.TreeItem(easymodel.ListItemData(['a3'])))
+    a1.child(1).set_data(0, 'ax', DR)
+    a._move_child(2, 0)
+    a1.remove_child(a1.child(0))
+    assert signals == [('insert', 'a1', 1, 1), ('insert', None, 2, 2), ('data', 'ax'),
+                       ('move',), ('remove', 'a1', 0, 0)]
+    assert names(sub) == ['a3', 'a1', 'a2']
+    assert names(sub, sub.index(1, 0)) == ['ax']
+    # removing the item empties the model
+    del signals[:]
+    tree.root.remove_child(a)
+    assert signals == [('reset',)]
+    assert sub.item is None
+    assert sub.rowCount() == 0
+    a.add_child(easymodel.TreeItem(easymodel.ListItemData(['a4'])))
+    assert signals == [('reset',)]
+
+
+def test_subtree_source_reset(tree):
+    b = tree.root.child(1)
+    sub = easymodel.SubtreeModel(tree, b)
+    tree.set_root(easymodel.TreeItem.from_nested((['name'], [])))
+    assert sub.item is None
+    assert sub.rowCount() == 0
+    sub.set_item(None)
+    assert sub.item is tree.root
+
+
+def test_subtree_stale_index(tree):
+    a = tree.root.child(0)
+    sub = easymodel.SubtreeModel(tree, a)
+    index = sub.index(1, 0)
+    a.remove_child(a.child(1))
+    gc.collect()
+    assert sub.item_of_index(index) is None
+    assert sub.data(index) is None
+    assert sub.flags(index) == QtCore.Qt.NoItemFlags
+    assert not sub.setData(index, 'x', DR)
+    assert not sub.parent(index).isValid()
+    assert sub.columnCount(index) == 0
+    assert sub.rowCount(index) == 0
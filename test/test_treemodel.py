@@ -1,3 +1,6 @@
+import gc
+import threading
+
 import pytest
 from PySide import QtCore
 
@@ -332,7 +335,7 @@ def test_model_index(stub_model, stub_model_indexes):
     m, root, c1, c2, c3, c4, c5 = stub_model
     ptrs = [c1, c1, c2, c2, c3, c4, c5, None]
     for i, ptr in zip(stub_model_indexes, ptrs):
-        assert i.internalPointer() is ptr
+        assert m.item_for_id(i.internalId()) is ptr
     assert not m.index(10, 0, QtCore.QModelIndex()).isValid()
 
 
@@ -443,15 +446,15 @@ def test_model_insertrow(stubitemdata1, stub_model, stub_model_indexes):
     m = stub_model[0]
     rows = (0, 0, 2)
     parent = stub_model_indexes[0]
-    parentitem = parent.internalPointer()
+    parentitem = m.item_of_index(parent)
     for r in rows:
         i = easymodel.TreeItem(stubitemdata1())
         inserted = m.insertRow(r, i, parent)
         assert inserted is True
         assert i._model is m
         assert i._parent is parentitem
-        assert parent.internalPointer().childItems[r] is i
-        assert m.index(r, 0, parent).internalPointer() is i
+        assert m.item_of_index(parent).childItems[r] is i
+        assert m.item_of_index(m.index(r, 0, parent)) is i
 
     newidata = stubitemdata1()
     newi = newidata.to_item(data=newidata)
@@ -498,3 +501,740 @@ def test_model_remove(stub_model, stub_model_indexes):
     assert c1._parent is None
     assert c1.get_model() is None
     assert root.childItems == []
+
+
+@pytest.fixture(scope='function')
+def list_model():
+    """Tree model with list item data. Returns (m, root, a, b, c)
+
+    :m: the model
+    :root: TreeItem(ListItemData(['h1', 'h2']))
+    :a: TreeItem(ListItemData(['a1', 'a2']), root)
+    :b: TreeItem(ListItemData(['b1', 'b2']), root)
+    :c: TreeItem(ListItemData(['c1', 'c2']), a)
+    """
+    root = easymodel.TreeItem(easymodel.ListItemData(['h1', 'h2']))
+    m = easymodel.TreeModel(root)
+    a = easymodel.TreeItem(easymodel.ListItemData(['a1', 'a2']), root)
+    b = easymodel.TreeItem(easymodel.ListItemData(['b1', 'b2']), root)
+    c = easymodel.TreeItem(easymodel.ListItemData(['c1', 'c2']), a)
+    return (m, root, a, b, c)
+
+
+def test_model_update_throttle(list_model):
+    m, root, a, b, c = list_model
+    emitted = []
+    m.dataChanged.connect(lambda tl, br: emitted.append((tl, br)))
+    m.set_update_rate(30)
+    assert m.update_rate() > 0
+    a.set_data(0, 'x', DR)
+    b.set_data(1, 'y', DR)
+    a.set_data(0, 'z', DR)
+    c.set_data(0, 'w', DR)
+    assert emitted == []
+    m.flush_updates()
+    assert len(emitted) == 2
+    ranges = dict((m.item_of_index(tl), (m.item_of_index(br), tl.column(), br.column()))
+                  for tl, br in emitted)
+    assert ranges[a] == (b, 0, 1)
+    assert ranges[c] == (c, 0, 0)
+    assert m.data(m.index_of_item(a)) == 'z'
+    del emitted[:]
+    a.set_data(0, 'v', DR)
+    m.set_update_rate(0)
+    assert len(emitted) == 1
+    assert m.update_rate() == 0
+    a.set_data(0, 'u', DR)
+    assert len(emitted) == 2
+
+
+def test_model_hold_updates(list_model):
+    m, root, a, b, c = list_model
+    emitted = []
+    m.dataChanged.connect(lambda tl, br: emitted.append((tl.row(), br.row())))
+    m.hold_updates()
+    m.hold_updates()
+    a.set_data(0, 'x', DR)
+    b.set_data(1, 'y', DR)
+    m.release_updates()
+    assert emitted == []
+    m.release_updates()
+    assert emitted == [(0, 1)]
+    a.set_data(0, 'z', DR)
+    assert len(emitted) == 2
+
+
+@pytest.mark.parametrize("old,new,signals", [
+    ('abcd', 'abcd', {}),
+    ('abcd', 'dabc', {'rowsMoved': 1}),
+    ('abcd', 'bcda', {'rowsMoved': 1}),
+    ('abcd', 'dcba', {'rowsMoved': 3}),
+    ('abcd', 'ad', {'rowsRemoved': 1}),
+    ('abcd', 'b', {'rowsRemoved': 2}),
+    ('abcd', 'axybcd', {'rowsInserted': 1}),
+    ('abcd', 'xbyd', {'rowsRemoved': 2, 'rowsInserted': 2}),
+    ('', 'abc', {'rowsInserted': 1}),
+    ('abc', '', {'rowsRemoved': 1}),
+    ('abcd', 'cxa', {'rowsRemoved': 2, 'rowsMoved': 1, 'rowsInserted': 1}),
+])
+def test_treeitem_replace_children(old, new, signals):
+    root = easymodel.TreeItem(easymodel.ListItemData(['h1', 'h2']))
+    m = easymodel.TreeModel(root)
+    items = dict((k, easymodel.TreeItem(easymodel.ListItemData([k, 0]), root)) for k in old)
+    grandchildren = dict((k, easymodel.TreeItem(easymodel.ListItemData([k + k, 0]), i))
+                         for k, i in items.items())
+    emitted = dict((n, 0) for n in ('rowsInserted', 'rowsRemoved', 'rowsMoved', 'dataChanged'))
+
+    def count(name):
+        def inc(*args):
+            emitted[name] += 1
+        return inc
+    for name in emitted:
+        getattr(m, name).connect(count(name))
+
+    newitems = [easymodel.TreeItem(easymodel.ListItemData([k, 1])) for k in new]
+    root.replace_children(newitems, key=lambda i: i.internal_data()[0])
+    assert [m.index(r, 0).data() for r in range(m.rowCount(QtCore.QModelIndex()))] == list(new)
+    assert [m.index(r, 1).data() for r in range(len(new))] == [1] * len(new)
+    for r, k in enumerate(new):
+        child = root.child(r)
+        assert child.parent() is root
+        assert child.get_model() is m
+        if k in old:
+            assert child is items[k]
+            assert child.child(0) is grandchildren[k]
+        else:
+            assert child is newitems[r]
+    for k in set(old) - set(new):
+        assert items[k].parent() is None
+        assert items[k].get_model() is None
+    kept = [k in old for k in new]
+    changed = len([r for r, k in enumerate(kept) if k and (r == 0 or not kept[r - 1])])
+    expected = dict(signals, dataChanged=changed)
+    assert dict((k, v) for k, v in emitted.items() if v) == dict((k, v) for k, v in expected.items() if v)
+
+
+def test_treeitem_replace_children_detached():
+    root = easymodel.TreeItem(None)
+    a = easymodel.TreeItem(easymodel.ListItemData(['a']), root)
+    b = easymodel.TreeItem(easymodel.ListItemData(['b']), root)
+    newb = easymodel.TreeItem(b.itemdata())
+    c = easymodel.TreeItem(easymodel.ListItemData(['c']))
+    root.replace_children([c, newb])
+    assert root.childItems == [c, b]
+    assert c.parent() is root
+    assert a.parent() is None
+
+
+def test_treeitem_replace_children_default_key():
+    root = easymodel.TreeItem(easymodel.ListItemData(['h']))
+    m = easymodel.TreeModel(root)
+    names = ['n%s' % i for i in range(50)]
+    items = dict((k, easymodel.TreeItem(easymodel.ListItemData([k]), root)) for k in names)
+    emitted = []
+    m.rowsInserted.connect(lambda *args: emitted.append('insert'))
+    m.rowsRemoved.connect(lambda *args: emitted.append('remove'))
+    # freshly built items match by their display data
+    new = list(reversed(names))
+    root.replace_children([easymodel.TreeItem(easymodel.ListItemData([k])) for k in new])
+    assert emitted == []
+    assert root.childItems == [items[k] for k in new]
+    assert [m.index(r, 0).data() for r in range(len(new))] == new
+
+
+def _nested_items(spec, parent=None):
+    """Create items from nested tuples ``(name, [children])``"""
+    name, children = spec
+    item = easymodel.TreeItem(easymodel.ListItemData([name]), parent)
+    for c in children:
+        _nested_items(c, item)
+    return item
+
+
+def _nested_names(item):
+    return (item.internal_data()[0], [_nested_names(c) for c in item.childItems])
+
+
+def test_treeitem_reconcile():
+    old = ('root', [('a', [('a1', []), ('a2', [('a21', [])])]),
+                    ('b', [('b1', [])]),
+                    ('c', [])])
+    new = ('ROOT', [('c', [('c1', [])]),
+                    ('a', [('a2', []), ('a3', [])]),
+                    ('d', [('d1', [])])])
+    root = _nested_items(old)
+    m = easymodel.TreeModel(root)
+    a, b, c = root.childItems
+    a2 = a.child(1)
+    removed = []
+    m.rowsRemoved.connect(lambda p, first, last: removed.append(last - first + 1))
+    headers = []
+    m.headerDataChanged.connect(lambda *args: headers.append(args))
+    root.reconcile(_nested_items(new), key=lambda i: i.internal_data()[0])
+    assert _nested_names(root) == new
+    assert root.childItems[0] is c
+    assert root.childItems[1] is a
+    assert a.childItems[0] is a2
+    assert b.parent() is None
+    assert sum(removed) == 3  # b, a1, a21
+    assert m.headerData(0, QtCore.Qt.Horizontal, DR) == 'ROOT'
+    assert len(headers) == 1
+    assert m.index(0, 0, m.index(2, 0)).data() == 'd1'
+
+
+def test_treeitem_reconcile_child():
+    root = _nested_items(('root', [('a', [('a1', [])]), ('b', [])]))
+    m = easymodel.TreeModel(root)
+    a = root.child(0)
+    reader = m.journal().reader()
+    changed = []
+    headers = []
+    m.dataChanged.connect(lambda tl, br: changed.append((tl.data(), tl.row(), br.row())))
+    m.headerDataChanged.connect(lambda *args: headers.append(args))
+    a.reconcile(_nested_items(('A2', [('a1', [])])), key=lambda i: i.internal_data()[0])
+    assert m.index(0, 0).data() == 'A2'
+    assert ('A2', 0, 0) in changed
+    assert headers == []
+    records = [r for r in reader.read() if r.kind == 'data']
+    assert a.item_id() in [r.itemids[0] for r in records]
+
+
+def test_treeitem_from_nested():
+    spec = (['h'], [(['a'], [(['a1'], []), (['a2'], [])]), (['b'], [])])
+    root = easymodel.TreeItem.from_nested(spec)
+    assert root.internal_data() == ['h']
+    assert [c.internal_data() for c in root.childItems] == [['a'], ['b']]
+    a = root.child(0)
+    assert [c.internal_data() for c in a.childItems] == [['a1'], ['a2']]
+    assert a.child(1).parent() is a
+    assert a.get_model() is None
+
+    # deep hierarchies do not hit the recursion limit
+    deep = (['leaf'], [])
+    for i in range(5000):
+        deep = ([i], [deep])
+    item = easymodel.TreeItem.from_nested(deep)
+    depth = 0
+    while item.childItems:
+        item = item.child(0)
+        depth += 1
+    assert depth == 5000
+
+
+def test_treeitem_from_paths():
+    rows = [((), ['h1']), (('a',), ['a']), (('a', 'x'), ['ax']), (('b',), ['b']), (('a', 'y'), ['ay'])]
+    root = easymodel.TreeItem.from_paths(rows)
+    assert root.internal_data() == ['h1']
+    assert [c.internal_data() for c in root.childItems] == [['a'], ['b']]
+    assert [c.internal_data() for c in root.child(0).childItems] == [['ax'], ['ay']]
+    with pytest.raises(ValueError):
+        easymodel.TreeItem.from_paths([(('a', 'b'), ['ab'])])
+
+
+def test_treeitem_add_children(list_model):
+    m, root, a, b, c = list_model
+    inserted = []
+    m.rowsInserted.connect(lambda p, first, last: inserted.append((first, last)))
+    new = easymodel.TreeItem.from_nested((None, [(['x'], [(['x1'], [])]), (['y'], [])]))
+    a.add_children(new.childItems)
+    assert inserted == [(1, 2)]
+    assert [i.internal_data() for i in a.childItems] == [['c1', 'c2'], ['x'], ['y']]
+    assert a.child(1).child(0).get_model() is m
+    assert m.index(0, 0, m.index(1, 0, m.index_of_item(a))).data() == 'x1'
+
+
+def test_model_set_root(list_model):
+    m, root, a, b, c = list_model
+    resets = []
+    m.modelReset.connect(lambda: resets.append(True))
+    newroot = easymodel.TreeItem.from_nested((['n1', 'n2', 'n3'], [(['x'], [(['x1'], [])])]))
+    assert m.set_root(newroot) is root
+    assert resets == [True]
+    assert m.root is newroot
+    assert newroot.child(0).child(0).get_model() is m
+    assert root.get_model() is None
+    assert c.get_model() is None
+    assert c.to_index() is None
+    assert m.rowCount(QtCore.QModelIndex()) == 1
+    assert m.columnCount(QtCore.QModelIndex()) == 1
+    assert m.headerData(2, QtCore.Qt.Horizontal, DR) == 'n3'
+    # the old hierarchy can still be changed without touching the model
+    inserted = []
+    m.rowsInserted.connect(lambda *args: inserted.append(args))
+    easymodel.TreeItem(easymodel.ListItemData(['d']), root)
+    assert inserted == []
+    assert root.child_count() == 3
+
+
+class LazyItemData(easymodel.ListItemData):
+    """List item data that fetches n children named after itself"""
+
+    def __init__(self, name, n=3):
+        super(LazyItemData, self).__init__([name])
+        self.n = n
+        self.fetched = False
+
+    def can_fetch_more(self, item):
+        return not self.fetched
+
+    def fetch_more(self, item):
+        self.fetched = True
+        name = self.internal_data()[0]
+        item.add_children([easymodel.TreeItem(LazyItemData('%s%s' % (name, i), self.n))
+                           for i in range(self.n)])
+
+    def can_unload(self, item):
+        return self.fetched
+
+    def unload(self, item):
+        self.fetched = False
+
+
+def test_model_node_budget():
+    root = easymodel.TreeItem(easymodel.ListItemData(['h']))
+    m = easymodel.TreeModel(root)
+    a = easymodel.TreeItem(LazyItemData('a'), root)
+    b = easymodel.TreeItem(LazyItemData('b'), root)
+    m.set_node_budget(8)
+    assert m.node_budget() == 8
+    assert m.node_count() == 3
+    aindex = m.index_of_item(a)
+    bindex = m.index_of_item(b)
+    assert m.canFetchMore(aindex)
+    m.fetchMore(aindex)
+    m.index_expanded(aindex)
+    m.fetchMore(bindex)
+    m.index_expanded(bindex)
+    assert m.node_count() == 9
+    m.enforce_node_budget()
+    # both are expanded, nothing gets unloaded
+    assert m.node_count() == 9
+    removed = []
+    m.rowsRemoved.connect(lambda p, first, last: removed.append((m.item_of_index(p), first, last)))
+    m.index_collapsed(bindex)
+    assert removed == [(b, 0, 2)]
+    assert m.node_count() == 6
+    assert b.child_count() == 0
+    assert m.canFetchMore(bindex)
+    m.fetchMore(bindex)
+    assert b.child_count() == 3
+    m.index_expanded(bindex)
+    m.index_collapsed(aindex)
+    # a is the only collapsed one
+    assert removed[-1] == (a, 0, 2)
+    assert m.node_count() == 6
+    m.set_node_budget(0)
+    m.fetchMore(aindex)
+    assert m.node_count() == 6
+    assert a.child_count() == 3
+
+
+def test_model_node_budget_nested():
+    root = easymodel.TreeItem(easymodel.ListItemData(['h']))
+    m = easymodel.TreeModel(root)
+    a = easymodel.TreeItem(LazyItemData('a'), root)
+    b = easymodel.TreeItem(LazyItemData('b'), root)
+    m.set_node_budget(100)
+    m.fetchMore(m.index_of_item(a))
+    m.fetchMore(m.index_of_item(a.child(0)))
+    m.fetchMore(m.index_of_item(b))
+    assert m.node_count() == 12
+    # unloading a also unloads the fetched a0 that comes later in the order
+    m.set_node_budget(3)
+    assert a.child_count() == 0
+    assert b.child_count() == 0
+    assert m.node_count() == 3
+    assert m.canFetchMore(m.index_of_item(a))
+
+
+def test_model_aggregates():
+    root = easymodel.TreeItem.from_nested((['name', 'size', 'count', 'max'], [
+        (['a', None, None, None], [(['a1', 3, None, None], []), (['a2', 5, None, None], [(['a21', 1, None, None], [])])]),
+        (['b', 7, None, None], [])]))
+    m = easymodel.TreeModel(root)
+    a, b = root.childItems
+    a1, a2 = a.childItems
+    a21 = a2.child(0)
+    m.set_aggregate(1, 'sum')
+    m.set_aggregate(2, 'count')
+    m.set_aggregate(3, 'max', sourcecolumn=1)
+    aindex = m.index_of_item(a)
+    assert m.data(m.index(0, 1, QtCore.QModelIndex())) == 9
+    assert m.data(m.index(0, 2, QtCore.QModelIndex())) == 3
+    assert m.aggregate(a, 3) == 5
+    assert m.aggregate(a2, 1) == 6
+    assert m.aggregate(b, 2) == 0
+    assert a1.data(1, DR) == 3
+    changed = []
+
+    def covered(item, column):
+        return any(c[0] is item and c[1] <= column <= c[2] for c in changed)
+
+    m.dataChanged.connect(lambda tl, br: changed.append((m.item_of_index(tl), tl.column(), br.column())))
+    a21.set_data(1, 10, QtCore.Qt.EditRole)
+    assert m.aggregate(a, 1) == 18
+    assert m.aggregate(a, 3) == 10
+    assert covered(a, 1) and covered(a, 3) and covered(a2, 1)
+    assert not covered(b, 1)
+    del changed[:]
+    a2.remove_child(a21)
+    assert m.aggregate(a, 1) == 8
+    assert m.aggregate(a, 2) == 2
+    assert m.aggregate(a, 3) == 5
+    assert set(c[0] for c in changed) == set([a, a2])
+    easymodel.TreeItem(easymodel.ListItemData(['a3', 20, None, None]), a)
+    assert m.aggregate(a, 1) == 28
+    assert m.aggregate(a, 2) == 3
+    assert m.aggregate(a, 3) == 20
+    m.remove_aggregate(3)
+    assert m.data(m.index(0, 3, aindex)) is None
+    with pytest.raises(ValueError):
+        m.set_aggregate(1, 'median')
+
+
+def test_model_aggregate_sum_values():
+    root = easymodel.TreeItem.from_nested((['name', 'size'], [
+        (['a', 'unknown'], [(['a1', 0.1], []), (['a2', 0.2], [(['a21', 0.3], [])])])]))
+    m = easymodel.TreeModel(root)
+    a = root.child(0)
+    a1, a2 = a.childItems
+    m.set_aggregate(1, 'sum')
+    assert m.aggregate(a, 1) == 0.1 + (0.2 + 0.3)
+    a2.set_data(1, 'text', QtCore.Qt.EditRole)
+    assert m.aggregate(a2, 1) == 0.3
+    for value in (0.7, 0.1, 1e17, 0.3):
+        a1.set_data(1, value, QtCore.Qt.EditRole)
+    # the total is recomputed from the children, so rounding errors do not accumulate
+    assert m.aggregate(a, 1) == 0.3 + 0.3
+    a2.child(0).set_data(1, 'x', QtCore.Qt.EditRole)
+    assert m.aggregate(a, 1) == 0.3
+    assert m.aggregate(a2, 1) == 0
+
+
+def _preorder(root):
+    items = []
+    stack = list(reversed(root.childItems))
+    while stack:
+        item = stack.pop()
+        items.append(item)
+        stack.extend(reversed(item.childItems))
+    return items
+
+
+def test_model_order_index():
+    import random
+    rand = random.Random(4)
+    root = easymodel.TreeItem(easymodel.ListItemData(['h']))
+    m = easymodel.TreeModel(root)
+    items = [root]
+    for i in range(200):
+        items.append(easymodel.TreeItem(easymodel.ListItemData([str(i)]), rand.choice(items)))
+    expected = _preorder(root)
+    assert [m.item_at_position(i) for i in range(len(expected))] == expected
+    m.set_order_index(True)
+    assert m.has_order_index()
+
+    def check():
+        flat = _preorder(root)
+        for position, item in enumerate(flat):
+            assert m.item_at_position(position) is item
+            assert m.position_of_item(item) == position
+        with pytest.raises(IndexError):
+            m.item_at_position(len(flat))
+
+    check()
+    for i in range(30):
+        parent = rand.choice(_preorder(root) + [root])
+        easymodel.TreeItem(easymodel.ListItemData(['n%s' % i]), parent)
+        victim = rand.choice(_preorder(root))
+        victim.parent().remove_child(victim)
+        check()
+    parent = max(_preorder(root) + [root], key=lambda i: i.child_count())
+    parent._move_child(0, parent.child_count())
+    check()
+    m.set_root(easymodel.TreeItem.from_nested((['h'], [(['x'], [(['y'], [])])])))
+    assert m.position_of_item(m.root.child(0).child(0)) == 1
+    m.set_order_index(False)
+    assert m.position_of_item(m.root.child(0).child(0)) == 1
+    with pytest.raises(ValueError):
+        m.position_of_item(m.root)
+
+
+def _names(pairs):
+    return [(item.internal_data()[0], depth) for item, depth in pairs]
+
+
+def test_treeitem_traversal():
+    root = easymodel.TreeItem.from_nested((['r'], [
+        (['a'], [(['a1'], [(['a11'], [])]), (['a2'], [])]),
+        (['b'], [(['b1'], [])])]))
+    assert _names(root.preorder()) == [('r', 0), ('a', 1), ('a1', 2), ('a11', 3), ('a2', 2),
+                                       ('b', 1), ('b1', 2)]
+    assert _names(root.postorder()) == [('a11', 3), ('a1', 2), ('a2', 2), ('a', 1),
+                                        ('b1', 2), ('b', 1), ('r', 0)]
+    assert _names(root.breadth_first()) == [('r', 0), ('a', 1), ('b', 1), ('a1', 2), ('a2', 2),
+                                            ('b1', 2), ('a11', 3)]
+    assert _names(root.leaves()) == [('a11', 3), ('a2', 2), ('b1', 2)]
+    visited = []
+
+    def prune(item):
+        visited.append(item.internal_data()[0])
+        return item.internal_data()[0] == 'a1'
+
+    assert _names(root.preorder(prune)) == [('r', 0), ('a', 1), ('a2', 2), ('b', 1), ('b1', 2)]
+    assert 'a11' not in visited
+    assert _names(root.postorder(prune)) == [('a2', 2), ('a', 1), ('b1', 2), ('b', 1), ('r', 0)]
+    assert _names(root.breadth_first(prune)) == [('r', 0), ('a', 1), ('b', 1), ('a2', 2), ('b1', 2)]
+    assert _names(root.leaves(prune)) == [('a2', 2), ('b1', 2)]
+    a11 = root.child(0).child(0).child(0)
+    assert _names(a11.ancestors()) == [('a1', 1), ('a', 2), ('r', 3)]
+    assert _names(a11.ancestors(lambda i: i is root)) == [('a1', 1), ('a', 2)]
+    m = easymodel.TreeModel(root)
+    assert _names(m.preorder())[:2] == [('a', 0), ('a1', 1)]
+    assert _names(m.postorder())[-1] == ('b', 0)
+    assert _names(m.breadth_first())[:2] == [('a', 0), ('b', 0)]
+    assert _names(m.leaves()) == [('a11', 2), ('a2', 1), ('b1', 1)]
+
+
+def test_treeitem_traversal_deep():
+    root = easymodel.TreeItem(None)
+    item = root
+    for i in range(5000):
+        item = easymodel.TreeItem(None, item)
+    assert sum(1 for _ in root.preorder()) == 5001
+    assert next(root.postorder())[1] == 5000
+    assert list(root.leaves()) == [(item, 5000)]
+    assert sum(1 for _ in item.ancestors()) == 5000
+
+
+def test_treeitem_clone():
+    root = easymodel.TreeItem.from_nested((['h'], [
+        (['a'], [(['a1'], [(['a11'], [])]), (['a2'], [])]),
+        (['b'], [(['b1'], [])])]))
+    before = _nested_names(root)
+    clone = root.clone()
+    assert clone.itemdata() is root.itemdata()
+    assert clone._children is None
+    assert _nested_names(clone) == before
+    # only what was accessed gets copied
+    other = root.clone()
+    other.child(0).child(0).set_data(0, 'x', DR)
+    assert other.child(1)._children is None
+    assert other.child(1).itemdata() is root.child(1).itemdata()
+    assert root.child(0).child(0).data(0, DR) == 'a1'
+    assert other.child(0).child(0).data(0, DR) == 'x'
+    # changing the original does not change lazy clones
+    lazy = root.clone()
+    a11 = root.child(0).child(0).child(0)
+    a11.set_data(0, 'y', DR)
+    easymodel.TreeItem(easymodel.ListItemData(['b2']), root.child(1))
+    root.child(0).remove_child(root.child(0).child(1))
+    assert _nested_names(lazy) == before
+    assert _nested_names(clone) == before
+    assert a11.data(0, DR) == 'y'
+    # changing the clone does not change the original
+    current = _nested_names(root)
+    clone.child(0).add_child(easymodel.TreeItem(easymodel.ListItemData(['a3'])))
+    clone.child(1)._move_child(0, 1)
+    m = easymodel.TreeModel(clone)
+    clone.child(0).child(0).set_data(0, 'z', DR)
+    assert m.index(0, 0, m.index(0, 0)).data() == 'z'
+    assert _nested_names(root) == current
+    assert clone.child(0).child(2).parent() is clone.child(0)
+
+
+def test_treeitem_clone_keeps_original_data():
+    root = easymodel.TreeItem.from_nested((['h'], [(['a'], [(['a1'], [])]), (['b'], [])]))
+    a = root.child(0)
+    data = a.itemdata()
+    clone = root.clone()
+    assert clone.child(0).itemdata() is data
+    cloneclone = clone.clone()
+    assert cloneclone.child(0).itemdata() is data
+    a.set_data(0, 'x', DR)
+    a.set_data(0, 'y', DR)
+    # the original keeps its item data, the clones got copies
+    assert a.itemdata() is data
+    assert clone.child(0).itemdata() is not data
+    assert cloneclone.child(0).itemdata() is not clone.child(0).itemdata()
+    assert clone.child(0).data(0, DR) == cloneclone.child(0).data(0, DR) == 'a'
+    clone.child(0).set_data(0, 'z', DR)
+    assert cloneclone.child(0).data(0, DR) == 'a'
+    assert a.data(0, DR) == 'y'
+    # only hierarchies with clones look for them
+    other = easymodel.TreeItem.from_nested((['h'], [(['c'], [])]))
+    other.child(0).set_data(0, 'x', DR)
+    assert not other._hasclones
+    assert root._hasclones
+    # a detached item remembers that it might have clones
+    a.set_parent(None)
+    assert a._hasclones
+    a.set_data(0, 'w', DR)
+    assert clone.child(0).data(0, DR) == 'z'
+
+
+def test_treeitem_clone_lazy_reads():
+    root = easymodel.TreeItem.from_nested((['h'], [
+        (['a'], [(['a%s' % i], []) for i in range(100)]),
+        (['b'], [(['b1'], [])])]))
+    clone = root.clone()
+    m = easymodel.TreeModel(clone)
+    assert clone.subtree_size() == root.subtree_size() == 104
+    assert m.rowCount(QtCore.QModelIndex()) == 2
+    a = m.index(0, 0)
+    assert m.rowCount(a) == 100
+    index = m.index(50, 0, a)
+    assert index.data() == 'a50'
+    assert m.parent(index) == a
+    assert m.item_of_index(index).row() == 50
+    assert m.index_of_item(m.item_of_index(index)) == index
+    # only the requested items were cloned, the column count reads the first child
+    assert clone._lazy and sorted(clone._requested) == [0]
+    assert clone.child(0)._lazy and sorted(clone.child(0)._requested) == [0, 50]
+    # changes keep the requested clones
+    requested = clone.child(0).child(50)
+    requested.set_data(0, 'x', DR)
+    root.child(0).child(50).set_data(0, 'y', DR)
+    clone.child(0).remove_child(clone.child(0).child(0))
+    assert clone.child(0).child(49) is requested
+    assert requested.data(0, DR) == 'x'
+    assert clone.subtree_size() == 103
+    assert root.subtree_size() == 104
+
+
+def test_model_shared_root(list_model):
+    m, root, a, b, c = list_model
+    m2 = easymodel.TreeModel(root)
+    assert root.get_models() == [m, m2]
+    assert c.get_model() is m
+    assert m2.item_of_index(m2.index(0, 0, m2.index(0, 0))) is c
+    inserted = {m: [], m2: []}
+    removed = {m: [], m2: []}
+    changed = {m: [], m2: []}
+
+    def record(model):
+        model.rowsInserted.connect(lambda p, first, last: inserted[model].append((p.data(), first)))
+        model.rowsRemoved.connect(lambda p, first, last: removed[model].append((p.data(), first)))
+        model.dataChanged.connect(lambda tl, br: changed[model].append(tl.data()))
+    record(m)
+    record(m2)
+    d = easymodel.TreeItem(easymodel.ListItemData(['d1', 'd2']))
+    a.add_child(d)
+    assert inserted[m] == inserted[m2] == [('a1', 1)]
+    assert m.rowCount(m.index(0, 0)) == m2.rowCount(m2.index(0, 0)) == 2
+    a.remove_child(c)
+    assert removed[m] == removed[m2] == [('a1', 0)]
+    assert m2.item_of_index(m2.index(0, 0, m2.index(0, 0))) is d
+    d.set_data(0, 'x', DR)
+    assert changed[m] == changed[m2] == ['x']
+    # the items are not copied, both models show the same ones
+    assert m.item_of_index(m.index(1, 0)) is m2.item_of_index(m2.index(1, 0)) is b
+    # a new root only detaches the model that gets it
+    m.set_root(easymodel.TreeItem(easymodel.ListItemData(['n'])))
+    assert root.get_models() == [m2]
+    d.set_data(0, 'y', DR)
+    assert changed[m] == ['x']
+    assert changed[m2] == ['x', 'y']
+
+
+def test_model_reparented_root(list_model):
+    m, root, a, b, c = list_model
+    other = easymodel.TreeItem(easymodel.ListItemData(['o']))
+    m2 = easymodel.TreeModel(other)
+    assert c.get_model() is m
+    assert other.get_model() is m2
+    # a former root belongs to the models of its new root
+    b.add_child(other)
+    assert other.get_models() == [m]
+    assert m.index_of_item(other) == m.index(0, 0, m.index(1, 0))
+    # and does not get its old models back when it is detached again
+    b.remove_child(other)
+    assert other.get_models() == []
+    # cached roots follow moved subtrees
+    a.remove_child(c)
+    assert c.get_model() is None
+    other.add_child(c)
+    assert c.get_models() == []
+    m2.set_root(other)
+    assert c.get_model() is m2
+    # only roots can have models
+    with pytest.raises(ValueError):
+        c.set_model(m)
+    with pytest.raises(ValueError):
+        c.add_model(m)
+    with pytest.raises(ValueError):
+        easymodel.TreeModel(c)
+    with pytest.raises(ValueError):
+        m.set_root(c)
+    assert c.get_models() == [m2]
+    assert m.root is root
+
+
+def test_treeitem_reparent_threads():
+    from easymodel import treemodel
+    roots = [easymodel.TreeItem(easymodel.ListItemData([str(i)])) for i in range(4)]
+
+    def work(root):
+        for i in range(500):
+            child = easymodel.TreeItem(easymodel.ListItemData(['c']), root)
+            root.remove_child(child)
+
+    before = treemodel._hierarchy_version
+    threads = [threading.Thread(target=work, args=(root,)) for root in roots]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert treemodel._hierarchy_version == before + 4 * 500 * 2
+
+
+def test_treeitem_ids(list_model):
+    m, root, a, b, c = list_model
+    index = m.index_of_item(c)
+    assert index.internalId() == c.item_id()
+    assert c.item_id() == c.item_id()
+    assert len(set([root.item_id(), a.item_id(), b.item_id(), c.item_id()])) == 4
+    assert easymodel.TreeItem.item_for_id(c.item_id()) is c
+    assert m.item_for_id(a.item_id()) is a
+    assert m.item_of_index(index) is c
+    assert m.item_of_index(QtCore.QModelIndex()) is root
+    assert m.index_for_id(c.item_id(), 1) == m.index(0, 1, m.index(0, 0))
+    assert not m.index_for_id(root.item_id()).isValid()
+    # the ids do not keep the items alive and are not reused
+    d = easymodel.TreeItem(easymodel.ListItemData(['d']))
+    dataid = d.item_id()
+    del d
+    gc.collect()
+    assert m.item_for_id(dataid) is None
+    assert not m.index_for_id(dataid).isValid()
+    assert easymodel.TreeItem(easymodel.ListItemData(['e'])).item_id() > dataid
+
+
+def test_treemodel_stale_indexes(list_model):
+    m, root, a, b, c = list_model
+    other = easymodel.TreeItem(easymodel.ListItemData(['o']))
+    child = easymodel.TreeItem(easymodel.ListItemData(['oc']), other)
+    # items of other hierarchies do not get an index
+    assert not m.index_for_id(child.item_id()).isValid()
+    assert m.index_for_id(b.item_id()) == m.index(1, 0)
+    # indexes of items that do not exist anymore are handled gracefully
+    d = easymodel.TreeItem(easymodel.ListItemData(['d']), b)
+    index = m.index_of_item(d)
+    persistent = QtCore.QPersistentModelIndex(index)
+    b.remove_child(d)
+    assert not persistent.isValid()
+    stale = m.createIndex(0, 0, d.item_id())
+    del d, index
+    gc.collect()
+    assert m.item_of_index(stale) is None
+    assert not m.parent(stale).isValid()
+    assert not m.index(0, 0, stale).isValid()
+    assert m.rowCount(stale) == 0
+    assert m.columnCount(stale) == 0
+    assert m.data(stale) is None
+    assert not m.setData(stale, 'x')
+    assert m.flags(stale) == QtCore.Qt.NoItemFlags
+    assert not m.hasChildren(stale)
+    assert not m.insertRow(0, easymodel.TreeItem(easymodel.ListItemData(['n'])), stale)
+    m.prefetch([stale])
+    m.index_expanded(stale)